@@ -1,29 +1,74 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
+from contextlib import AsyncExitStack, asynccontextmanager
+import asyncio
+import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 
-from models.issue import IssueAnalysisRequest, IssueAnalysisResponse, GitHubIssue
+from models.issue import (
+    IssueAnalysisRequest, IssueAnalysisResponse, GitHubIssue,
+    BatchIssueAnalysisRequest, BatchIssueAnalysisItem, BatchIssueAnalysisResponse
+)
 from models.prd import PRDDocument
+from models.job import JobSubmitResponse, JobStatusResponse
 from services.github_service import GitHubService, GitHubTool
-from services.codebase_analyzer import CodebaseAnalyzer, CodebaseTool
+from services.rate_limiter import GitHubRateLimitError
+from services.codebase_analyzer import CodebaseAnalyzer, CodebaseTool, UPSONIC_AVAILABLE as ANALYZER_AGENT_AVAILABLE
 from services.prd_generator import PRDGenerator, PRDTool
+from services.http_client import create_github_client
+from services.config import env_int, env_flag
+from services.job_queue import JobQueue, JobQueueFullError
+from services.repo_registry import RepoRegistry
+from services.pipeline import PipelineExecutor, StepCallback
+from services.duplicate_index import DuplicateIssueIndex, DuplicateMatch
 
 # Load environment variables
 load_dotenv()
 print(f"Environment loaded - OPENAI_API_KEY: {'SET' if os.getenv('OPENAI_API_KEY') else 'NOT SET'}")
 print(f"GITHUB_TOKEN: {'SET' if os.getenv('GITHUB_TOKEN') else 'NOT SET'}")
 
+# Batch endpoint limits
+BATCH_MAX_URLS = env_int("ANALYZE_BATCH_MAX_URLS", 500)
+BATCH_CONCURRENCY = env_int("ANALYZE_BATCH_CONCURRENCY", 4)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources for the lifetime of the application"""
+    # One pooled keep-alive client for every GitHub call
+    http_client = create_github_client(rate_limiter=github_service.rate_limiter)
+    github_service.client = http_client
+    if github_tool:
+        github_tool.client = http_client
+
+    # Background workers for /jobs
+    await job_queue.start()
+
+    try:
+        yield
+    finally:
+        # Stop the index refreshers of resident repositories
+        await repo_registry.stop()
+        await job_queue.stop()
+        await prd_generator.stop()
+        github_service.client = None
+        if github_tool:
+            github_tool.client = None
+        await http_client.aclose()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Issue to PRD Generator",
     description="Convert GitHub issues to comprehensive Product Requirement Documents using AI analysis",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -40,18 +85,41 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Initialize services
 github_service = GitHubService()
-codebase_analyzer = CodebaseAnalyzer()
+# Analyzers per repository checkout, loaded on first use
+repo_registry = RepoRegistry.from_env()
 prd_generator = PRDGenerator()
 
+# Near-duplicate issues reuse the stored analysis of the issue they duplicate
+duplicate_index = None
+if env_flag("DUPLICATE_INDEX_ENABLED", True):
+    try:
+        duplicate_index = DuplicateIssueIndex()
+    except Exception as e:
+        print(f"Duplicate issue index unavailable: {str(e)}")
+DUPLICATE_REUSE_ANALYSIS = env_flag("DUPLICATE_REUSE_ANALYSIS", True)
+
+
+
+async def run_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler: run the full pipeline and return the serialized response"""
+    try:
+        response = await run_issue_pipeline(payload["github_url"], payload.get("fetch_mode"))
+    except HTTPException as e:
+        raise RuntimeError(f"{e.status_code}: {e.detail}")
+    return response.model_dump()
+
+
+job_queue = JobQueue(run_job)
+
 # Create tool instances for direct use
 try:
     github_tool = GitHubTool()
-    codebase_tool = CodebaseTool()
+    codebase_tool = CodebaseTool(repo_registry.default_path)
     prd_tool = PRDTool()
 
     # Upsonic is available if services have agents (they will have models if properly configured)
     UPSONIC_AVAILABLE = (
-        codebase_analyzer.agent is not None and
+        ANALYZER_AGENT_AVAILABLE and
         prd_generator.agent is not None
     )
 
@@ -79,8 +147,14 @@ async def health_check():
         "status": "healthy",
         "services": {
             "github_api": "connected" if github_service.token else "not_configured",
-            "codebase_analyzer": "initialized" if codebase_analyzer.agent else "fallback_mode",
-            "prd_generator": "initialized" if prd_generator.agent else "template_mode",
+            "github_cache": github_service.cache.stats() if github_service.cache else {"enabled": False},
+            "github_rate_limiter": github_service.rate_limiter.stats(),
+            "jobs": job_queue.stats(),
+            "codebase_index": repo_registry.stats(),
+            "duplicate_index": duplicate_index.stats() if duplicate_index else {"enabled": False},
+            "codebase_analyzer": "initialized" if ANALYZER_AGENT_AVAILABLE else "fallback_mode",
+            "prd_generator": prd_generator.stats(),
+            "llm_cache": prd_generator.llm_cache.stats() if prd_generator.llm_cache else {"enabled": False},
             "tools": {
                 "github_tool": "available" if github_tool else "unavailable",
                 "codebase_tool": "available" if codebase_tool else "unavailable",
@@ -95,6 +169,258 @@ async def health_check():
     }
 
 
+async def fetch_issue_step(github_url: str, fetch_mode: Optional[str] = None) -> GitHubIssue:
+    """Step 1: Fetch issue from GitHub, mapping failures to HTTP errors"""
+    try:
+        issue = await github_service.fetch_issue(
+            github_url,
+            max_comments=CodebaseAnalyzer.CONTEXT_COMMENT_LIMIT,
+            mode=fetch_mode
+        )
+        print(f"Successfully fetched issue: {issue.title}")
+        return issue
+    except GitHubRateLimitError as e:
+        print(f"GitHub rate limit exceeded: {str(e)}")
+        headers = {"Retry-After": str(int(e.retry_after))} if e.retry_after else None
+        raise HTTPException(
+            status_code=429,
+            detail=f"GitHub rate limit exceeded: {str(e)}",
+            headers=headers
+        )
+    except Exception as e:
+        print(f"Failed to fetch GitHub issue: {str(e)}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to fetch GitHub issue: {str(e)}"
+        )
+
+
+async def resolve_analyzer_step(github_url: str, leases: AsyncExitStack,
+                                analyzer: Optional[CodebaseAnalyzer] = None) -> CodebaseAnalyzer:
+    """Analyzer for the issue's repository
+
+    The analyzer is leased until `leases` exits, so an eviction meanwhile
+    does not close it. Batches pass in the analyzer they leased once for the
+    whole repository.
+    """
+    if analyzer is not None:
+        return analyzer
+    try:
+        owner, repo, _ = github_service.parse_github_url(github_url)
+    except ValueError:
+        # The fetch step reports the invalid URL
+        owner = repo = None
+    return await leases.enter_async_context(repo_registry.lease(owner, repo))
+
+
+def issue_key(github_url: str) -> Optional[Tuple[str, str]]:
+    """(owner/repo#number, owner/repo) for an issue URL, lowercased"""
+    try:
+        owner, repo, issue_number = github_service.parse_github_url(github_url)
+    except ValueError:
+        return None
+    repo_key = f"{owner.lower()}/{repo.lower()}"
+    return f"{repo_key}#{issue_number}", repo_key
+
+
+async def duplicate_step(issue: GitHubIssue, github_url: str) -> Optional[DuplicateMatch]:
+    """Earlier analyzed issue of the same repository with near-identical text"""
+    keys = issue_key(github_url)
+    if duplicate_index is None or keys is None:
+        return None
+    try:
+        # The issue's own earlier revision is not a duplicate of it
+        match = await asyncio.to_thread(duplicate_index.find, keys[1], issue, keys[0])
+    except Exception as e:
+        print(f"Duplicate lookup failed: {str(e)}")
+        return None
+    if match is not None:
+        print(f"Issue resembles {match.key} (similarity {match.similarity:.2f})")
+    return match
+
+
+def reuses_analysis(duplicate: Optional[DuplicateMatch]) -> bool:
+    return duplicate is not None and DUPLICATE_REUSE_ANALYSIS
+
+
+async def remember_step(issue: GitHubIssue, github_url: str, analysis_data: Dict[str, Any],
+                        duplicate: Optional[DuplicateMatch]) -> None:
+    """Store a fresh analysis so later near-duplicates can reuse it"""
+    keys = issue_key(github_url)
+    # Reused and fallback analyses are not worth storing again
+    if duplicate_index is None or keys is None or reuses_analysis(duplicate) \
+            or not analysis_data.get('relevant_files'):
+        return
+    try:
+        # A shallow copy, since the PRD step may still add keys while the thread serializes it
+        await asyncio.to_thread(duplicate_index.add, keys[0], keys[1], github_url, issue, dict(analysis_data))
+    except Exception as e:
+        print(f"Failed to store analysis in the duplicate index: {str(e)}")
+
+
+async def retrieval_step(issue: GitHubIssue, codebase_analyzer: CodebaseAnalyzer,
+                         duplicate: Optional[DuplicateMatch] = None) -> Optional[Dict[str, Any]]:
+    """Fused file ranking for the issue, ahead of the LLM analysis"""
+    if reuses_analysis(duplicate):
+        return duplicate.analysis_data.get('retrieval')
+    try:
+        return await codebase_analyzer.hybrid_retrieve(issue)
+    except Exception as e:
+        print(f"Hybrid retrieval failed: {str(e)}")
+        return None
+
+
+async def analyze_codebase_step(issue: GitHubIssue, codebase_analyzer: CodebaseAnalyzer,
+                                retrieval: Optional[Dict[str, Any]] = None,
+                                duplicate: Optional[DuplicateMatch] = None) -> Dict[str, Any]:
+    """Step 2: Analyze issue with the codebase of its repository, degrading to a minimal analysis
+
+    A near-duplicate of an analyzed issue reuses that analysis instead.
+    """
+    if reuses_analysis(duplicate):
+        print(f"Reusing the analysis of {duplicate.key}")
+        analysis_data = dict(duplicate.analysis_data)
+        analysis_data['duplicate_of'] = duplicate.summary(reused_analysis=True)
+        return analysis_data
+    try:
+        analysis_data = await codebase_analyzer.analyze_issue_with_codebase(issue, retrieval)
+        print(f"Completed codebase analysis. Found {len(analysis_data.get('relevant_files', []))} relevant files")
+        # Ensure keywords are included
+        if not analysis_data.get('issue_keywords'):
+            analysis_data['issue_keywords'] = codebase_analyzer.extract_keywords_from_issue(issue)
+        # Line ranges of the symbols the issue names, for file modifications; both
+        # lookups may load indexes and read files, so they run off the event loop
+        if 'symbol_locations' not in analysis_data:
+            analysis_data['symbol_locations'] = await asyncio.to_thread(
+                codebase_analyzer.locate_symbols, issue, analysis_data.get('relevant_files', [])
+            )
+        # Ranked excerpts of the relevant files for the PRD prompt
+        if 'code_snippets' not in analysis_data:
+            snippets = await asyncio.to_thread(
+                codebase_analyzer.extract_snippets, issue, analysis_data.get('relevant_files', [])
+            )
+            analysis_data['code_snippets'] = snippets['snippets']
+    except Exception as e:
+        print(f"Codebase analysis failed, using fallback: {str(e)}")
+        analysis_data = {
+            "analysis": "Automated analysis unavailable, manual review recommended",
+            "relevant_files": [],
+            "issue_keywords": codebase_analyzer.extract_keywords_from_issue(issue)
+        }
+    if duplicate is not None:
+        analysis_data['duplicate_of'] = duplicate.summary(reused_analysis=False)
+    return analysis_data
+
+
+async def prd_sections_step(issue: GitHubIssue) -> Dict[str, Any]:
+    """PRD sections that need only the issue, built while the codebase analysis runs"""
+    return prd_generator.generate_issue_sections(issue)
+
+
+async def generate_prd_step(issue: GitHubIssue, analysis_data: Dict[str, Any],
+                            sections: Optional[Dict[str, Any]] = None) -> PRDDocument:
+    """Step 3: Generate PRD document"""
+    try:
+        prd_document = await prd_generator.generate_prd(issue, analysis_data, sections)
+        print(f"Successfully generated PRD: {prd_document.title}")
+        return prd_document
+    except Exception as e:
+        print(f"PRD generation failed: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate PRD document: {str(e)}"
+        )
+
+
+def build_analysis_response(issue: GitHubIssue, analysis_data: Dict[str, Any],
+                            prd_document: PRDDocument,
+                            pipeline: Optional[Dict[str, Any]] = None) -> IssueAnalysisResponse:
+    """Step 4: Prepare response"""
+    return IssueAnalysisResponse(
+        issue=issue.to_simplified_dict(),
+        related_files=analysis_data.get('relevant_files', []),
+        analysis_summary=analysis_data.get('analysis', 'No analysis available'),
+        prd_document=prd_document.to_markdown(),
+        issue_keywords=analysis_data.get('issue_keywords', []),
+        semantic_concepts=analysis_data.get('semantic_concepts', []),
+        retrieval=analysis_data.get('retrieval', {}),
+        pipeline=pipeline or {},
+        duplicate_of=analysis_data.get('duplicate_of'),
+        prompt_tokens=analysis_data.get('prompt_tokens') or {},
+        degraded=prd_document.degraded
+    )
+
+
+def analyzer_preloadable(github_url: str) -> bool:
+    """Whether the issue's repository may be loaded before GitHub has confirmed the issue"""
+    try:
+        owner, repo, _ = github_service.parse_github_url(github_url)
+    except ValueError:
+        return False
+    return repo_registry.preloadable(owner, repo)
+
+
+def build_issue_pipeline(github_url: str, leases: AsyncExitStack, fetch_mode: Optional[str] = None,
+                         analyzer: Optional[CodebaseAnalyzer] = None) -> PipelineExecutor:
+    """Dependency DAG of the pipeline steps for one issue
+
+    issue and analyzer start together; duplicate (the near-duplicate lookup)
+    needs the issue, retrieval needs all three, analysis needs retrieval,
+    and prd needs analysis and prd_sections. Loading the repository's
+    analyzer overlaps the issue fetch, and the issue-only PRD sections are
+    built while retrieval and analysis run. A near-duplicate hit skips
+    retrieval and the LLM analysis.
+
+    Only repositories that are resident or configured overlap the fetch;
+    any other analyzer waits for the issue, so a URL GitHub rejects never
+    loads or builds indexes.
+    """
+    pipeline = PipelineExecutor()
+    pipeline.add("issue", lambda: fetch_issue_step(github_url, fetch_mode))
+    if analyzer is not None or analyzer_preloadable(github_url):
+        pipeline.add("analyzer", lambda: resolve_analyzer_step(github_url, leases, analyzer))
+    else:
+        pipeline.add("analyzer", lambda issue: resolve_analyzer_step(github_url, leases), "issue")
+    pipeline.add("prd_sections", prd_sections_step, "issue")
+    pipeline.add("duplicate", lambda issue: duplicate_step(issue, github_url), "issue")
+    pipeline.add(
+        "retrieval",
+        lambda issue, analyzer, duplicate: retrieval_step(issue, analyzer, duplicate),
+        "issue", "analyzer", "duplicate"
+    )
+    pipeline.add(
+        "analysis",
+        lambda issue, analyzer, retrieval, duplicate: analyze_codebase_step(issue, analyzer, retrieval, duplicate),
+        "issue", "analyzer", "retrieval", "duplicate"
+    )
+    pipeline.add(
+        "remember",
+        lambda issue, analysis, duplicate: remember_step(issue, github_url, analysis, duplicate),
+        "issue", "analysis", "duplicate"
+    )
+    pipeline.add(
+        "prd",
+        lambda issue, analysis, prd_sections: generate_prd_step(issue, analysis, prd_sections),
+        "issue", "analysis", "prd_sections"
+    )
+    return pipeline
+
+
+async def run_issue_pipeline(github_url: str, fetch_mode: Optional[str] = None,
+                             on_step: Optional[StepCallback] = None,
+                             analyzer: Optional[CodebaseAnalyzer] = None) -> IssueAnalysisResponse:
+    """Run the fetch, codebase analysis and PRD generation DAG for one issue"""
+    print(f"Starting analysis for GitHub issue: {github_url}")
+
+    async with AsyncExitStack() as leases:
+        results, trace = await build_issue_pipeline(github_url, leases, fetch_mode, analyzer).run(on_step)
+    response = build_analysis_response(results["issue"], results["analysis"], results["prd"], trace)
+
+    print(f"Analysis completed successfully in {trace['total_ms']}ms "
+          f"(critical path: {' -> '.join(trace['critical_path'])}, {trace['critical_path_ms']}ms)")
+    return response
+
+
 @app.post("/analyze-issue", response_model=IssueAnalysisResponse)
 async def analyze_issue(request: IssueAnalysisRequest):
     """
@@ -107,57 +433,7 @@ async def analyze_issue(request: IssueAnalysisRequest):
         Complete analysis including issue data, related files, and PRD document
     """
     try:
-        print(f"Starting analysis for GitHub issue: {request.github_url}")
-        
-        # Step 1: Fetch issue from GitHub
-        try:
-            issue = await github_service.fetch_issue(request.github_url)
-            print(f"Successfully fetched issue: {issue.title}")
-        except Exception as e:
-            print(f"Failed to fetch GitHub issue: {str(e)}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Failed to fetch GitHub issue: {str(e)}"
-            )
-        
-        # Step 2: Analyze issue with codebase
-        try:
-            analysis_data = await codebase_analyzer.analyze_issue_with_codebase(issue)
-            print(f"Completed codebase analysis. Found {len(analysis_data.get('relevant_files', []))} relevant files")
-            # Ensure keywords are included
-            if not analysis_data.get('issue_keywords'):
-                analysis_data['issue_keywords'] = codebase_analyzer.extract_keywords_from_issue(issue)
-        except Exception as e:
-            print(f"Codebase analysis failed, using fallback: {str(e)}")
-            analysis_data = {
-                "analysis": "Automated analysis unavailable, manual review recommended",
-                "relevant_files": [],
-                "issue_keywords": codebase_analyzer.extract_keywords_from_issue(issue)
-            }
-        
-        # Step 3: Generate PRD document
-        try:
-            prd_document = await prd_generator.generate_prd(issue, analysis_data)
-            print(f"Successfully generated PRD: {prd_document.title}")
-        except Exception as e:
-            print(f"PRD generation failed: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to generate PRD document: {str(e)}"
-            )
-        
-        # Step 4: Prepare response
-        response = IssueAnalysisResponse(
-            issue=issue.to_simplified_dict(),
-            related_files=analysis_data.get('relevant_files', []),
-            analysis_summary=analysis_data.get('analysis', 'No analysis available'),
-            prd_document=prd_document.to_markdown(),
-            issue_keywords=analysis_data.get('issue_keywords', []),
-            semantic_concepts=analysis_data.get('semantic_concepts', [])
-        )
-        
-        print("Analysis completed successfully")
-        return response
+        return await run_issue_pipeline(request.github_url, request.fetch_mode)
         
     except HTTPException:
         raise
@@ -169,6 +445,219 @@ async def analyze_issue(request: IssueAnalysisRequest):
         )
 
 
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def step_events(step: str, result: Any) -> List[str]:
+    """SSE events for a finished pipeline step"""
+    if step == "issue":
+        return [format_sse("issue", {"stage": "issue_fetched", "issue": result.to_simplified_dict()})]
+    if step == "duplicate" and result is not None:
+        return [format_sse("duplicate", {
+            "stage": "duplicate_found",
+            **result.summary(reused_analysis=reuses_analysis(result))
+        })]
+    if step == "retrieval" and result is not None:
+        return [format_sse("retrieval", {"stage": "files_retrieved", **result})]
+    if step == "analysis":
+        return [format_sse("analysis", {
+            "stage": "files_ranked",
+            "related_files": result.get('relevant_files', []),
+            "analysis_summary": result.get('analysis', 'No analysis available'),
+            "issue_keywords": result.get('issue_keywords', []),
+            "semantic_concepts": result.get('semantic_concepts', [])
+        })]
+    if step == "prd":
+        return [
+            format_sse("prd_section", {"section": section, "markdown": markdown})
+            for section, markdown in result.iter_markdown_sections()
+        ]
+    return []
+
+
+async def stream_issue_pipeline(github_url: str, fetch_mode: Optional[str] = None) -> AsyncIterator[str]:
+    """Run the pipeline, emitting SSE events as each step completes"""
+    finished = object()
+    events: asyncio.Queue = asyncio.Queue()
+    run = None
+    try:
+        yield format_sse("stage", {"stage": "started", "github_url": github_url})
+
+        run = asyncio.create_task(run_issue_pipeline(
+            github_url, fetch_mode, on_step=lambda step, result: events.put_nowait((step, result))
+        ))
+        run.add_done_callback(lambda _: events.put_nowait(finished))
+        while (item := await events.get()) is not finished:
+            for event in step_events(*item):
+                yield event
+
+        response = await run
+        yield format_sse("done", response.model_dump())
+        print("Streaming analysis completed successfully")
+
+    except HTTPException as e:
+        yield format_sse("pipeline_error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        print(f"Unexpected error in streaming analysis: {str(e)}")
+        yield format_sse("pipeline_error", {"status_code": 500, "detail": f"Internal server error: {str(e)}"})
+    finally:
+        # A disconnected client stops the pipeline
+        if run is not None and not run.done():
+            run.cancel()
+
+
+@app.get("/analyze-issue/stream")
+async def analyze_issue_stream(github_url: str, fetch_mode: Optional[str] = None):
+    """
+    Stream pipeline progress and the PRD as Server-Sent Events
+
+    Events: `stage`, `issue`, `duplicate` (a likely duplicate, if found),
+    `retrieval` (fused file ranking, as soon as it is ready), `analysis`, one `prd_section` per PRD section, then `done`
+    with the full response and pipeline timings (or `pipeline_error`).
+    """
+    if fetch_mode not in (None, "rest", "graphql"):
+        raise HTTPException(status_code=422, detail="fetch_mode must be 'rest' or 'graphql'")
+
+    return StreamingResponse(
+        stream_issue_pipeline(github_url, fetch_mode),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/analyze-issues", response_model=BatchIssueAnalysisResponse)
+async def analyze_issues(request: BatchIssueAnalysisRequest):
+    """
+    Analyze many GitHub issues in one call
+
+    URLs are deduplicated and grouped by repository, then run through the same
+    pipeline as /analyze-issue with bounded concurrency. Each resident or
+    configured repository's analyzer is leased once for the batch and shared
+    by its issues (other repositories load after their first issue is
+    fetched), and
+    groups are dispatched one after another: the next repository's issues
+    start only once every issue of the current one has a slot, and its
+    analyzer loads while they run. Each item reports its own result or
+    error, so one failure does not sink the batch.
+    """
+    if len(request.github_urls) > BATCH_MAX_URLS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.github_urls)} URLs (max {BATCH_MAX_URLS})"
+        )
+
+    # Dedupe on owner/repo/number and group by repository
+    items: Dict[str, BatchIssueAnalysisItem] = {}
+    groups: Dict[str, List[str]] = {}
+    group_repos: Dict[str, Tuple[str, str]] = {}
+    duplicates = 0
+    for github_url in request.github_urls:
+        url = github_url.strip()
+        try:
+            owner, repo, issue_number = github_service.parse_github_url(url)
+        except ValueError as e:
+            items.setdefault(url, BatchIssueAnalysisItem(
+                github_url=url, status="error", status_code=400, error=str(e)
+            ))
+            continue
+
+        repo_key = f"{owner.lower()}/{repo.lower()}"
+        key = f"{repo_key}#{issue_number}"
+        if key in items:
+            duplicates += 1
+            continue
+        items[key] = BatchIssueAnalysisItem(github_url=url, status="pending")
+        groups.setdefault(repo_key, []).append(key)
+        group_repos.setdefault(repo_key, (owner, repo))
+
+    concurrency = min(request.max_concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_item(key: str, analyzer: Optional[CodebaseAnalyzer]):
+        item = items[key]
+        try:
+            item.result = await run_issue_pipeline(item.github_url, request.fetch_mode, analyzer=analyzer)
+            item.status = "ok"
+        except HTTPException as e:
+            item.status, item.status_code, item.error = "error", e.status_code, str(e.detail)
+        except Exception as e:
+            print(f"Batch item {item.github_url} failed: {str(e)}")
+            item.status, item.status_code, item.error = "error", 500, str(e)
+        finally:
+            semaphore.release()
+
+    print(f"Starting batch analysis: {sum(len(keys) for keys in groups.values())} issues across {len(groups)} repositories")
+    tasks = []
+    try:
+        # Analyzers stay leased until every issue of the batch is done
+        async with AsyncExitStack() as leases:
+            for repo_key, keys in groups.items():
+                owner, repo = group_repos[repo_key]
+                analyzer = None
+                # Other repos are loaded by their issues' pipelines once GitHub confirms them
+                if repo_registry.preloadable(owner, repo):
+                    try:
+                        analyzer = await leases.enter_async_context(repo_registry.lease(owner, repo))
+                    except Exception as e:
+                        # Each issue resolves it again and reports its own error
+                        print(f"Failed to load the codebase of {repo_key}: {str(e)}")
+                for key in keys:
+                    await semaphore.acquire()
+                    tasks.append(asyncio.create_task(run_item(key, analyzer)))
+            await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    results = list(items.values())
+    succeeded = sum(1 for item in results if item.status == "ok")
+    return BatchIssueAnalysisResponse(
+        results=results,
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        duplicates_removed=duplicates
+    )
+
+
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: IssueAnalysisRequest):
+    """
+    Queue an issue analysis and return a job ID immediately
+
+    Poll GET /jobs/{job_id} for status and the final analysis result.
+    """
+    try:
+        github_service.parse_github_url(request.github_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        job = await job_queue.submit(request.model_dump())
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    print(f"Queued job {job['job_id']} for {request.github_url}")
+    return JobSubmitResponse(job_id=job["job_id"], status=job["status"])
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """Return the status, and once finished the result, of a queued job"""
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    return JobStatusResponse(
+        job_id=job["job_id"],
+        status=job["status"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        result=job["result"],
+        error=job["error"]
+    )
 
 
 @app.exception_handler(Exception)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 
 class GitHubUser(BaseModel):
@@ -46,6 +46,8 @@ class GitHubIssue(BaseModel):
 
 class IssueAnalysisRequest(BaseModel):
     github_url: str
+    # Overrides GITHUB_FETCH_MODE for this request
+    fetch_mode: Optional[Literal["rest", "graphql"]] = None
 
 
 class IssueAnalysisResponse(BaseModel):
@@ -55,3 +57,36 @@ class IssueAnalysisResponse(BaseModel):
     prd_document: str
     issue_keywords: List[str] = []
     semantic_concepts: List[str] = []
+    # Fused retrieval ranking, per-retriever latency and file verification
+    retrieval: Dict[str, Any] = {}
+    # Per-step timings and critical path of the pipeline DAG
+    pipeline: Dict[str, Any] = {}
+    # The PRD is the template fallback, not the LLM-written one
+    degraded: bool = False
+    # Earlier analyzed issue this one is a likely duplicate of
+    duplicate_of: Optional[Dict[str, Any]] = None
+    # Per-section token counts of the analysis and PRD prompts
+    prompt_tokens: Dict[str, Any] = {}
+
+
+class BatchIssueAnalysisRequest(BaseModel):
+    github_urls: List[str]
+    fetch_mode: Optional[Literal["rest", "graphql"]] = None
+    # Capped by ANALYZE_BATCH_CONCURRENCY on the server
+    max_concurrency: Optional[int] = None
+
+
+class BatchIssueAnalysisItem(BaseModel):
+    github_url: str
+    status: Literal["pending", "ok", "error"]
+    result: Optional[IssueAnalysisResponse] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BatchIssueAnalysisResponse(BaseModel):
+    results: List[BatchIssueAnalysisItem]
+    total: int
+    succeeded: int
+    failed: int
+    duplicates_removed: int = 0
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional, Literal
+from models.issue import IssueAnalysisResponse
+
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+    created_at: float
+    updated_at: float
+    result: Optional[IssueAnalysisResponse] = None
+    error: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 
 
 class TechnicalRequirement(BaseModel):
@@ -8,10 +8,18 @@ class TechnicalRequirement(BaseModel):
     category: str  # "Backend", "Frontend", "Database", etc.
 
 
+class LineRange(BaseModel):
+    symbol: str
+    kind: str  # "class", "function", "method"
+    start_line: int
+    end_line: int
+
+
 class FileModification(BaseModel):
     file_path: str
     reason: str
     suggested_changes: str
+    line_ranges: List[LineRange] = []
 
 
 class UseCase(BaseModel):
@@ -28,42 +36,49 @@ class PRDDocument(BaseModel):
     file_modifications: List[FileModification]
     constraints: List[str]
     original_issue_json: Optional[Dict[str, Any]] = None
+    # Template PRD served because the LLM PRD failed or missed its latency budget
+    degraded: bool = False
     
-    def to_markdown(self) -> str:
-        """Convert PRD to markdown format"""
-        md_content = f"""# {self.title}
-
-## Overview
-{self.overview}
+    def iter_markdown_sections(self) -> Iterator[Tuple[str, str]]:
+        """Yield (section name, markdown) pairs in document order"""
+        yield "title", f"# {self.title}\n\n"
+        yield "overview", f"## Overview\n{self.overview}\n\n"
+        yield "problem_statement", f"## Problem Statement\n{self.problem_statement}\n\n"
 
-## Problem Statement
-{self.problem_statement}
-
-## Use Cases
-"""
+        md_content = "## Use Cases\n"
         for i, use_case in enumerate(self.use_cases, 1):
             md_content += f"\n### {i}. {use_case.title}\n{use_case.description}\n\n**Acceptance Criteria:**\n"
             for criterion in use_case.acceptance_criteria:
                 md_content += f"- {criterion}\n"
             md_content += "\n"
+        yield "use_cases", md_content
 
-        md_content += "\n## Suggested File Modifications\n"
+        md_content = "\n## Suggested File Modifications\n"
         for file_mod in self.file_modifications:
             md_content += f"\n### {file_mod.file_path}\n**Reason:** {file_mod.reason}\n\n**Suggested Changes:**\n{file_mod.suggested_changes}\n\n"
+            if file_mod.line_ranges:
+                md_content += "**Locations:**\n"
+                for line_range in file_mod.line_ranges:
+                    md_content += f"- `{line_range.symbol}` ({line_range.kind}, lines {line_range.start_line}-{line_range.end_line})\n"
+                md_content += "\n"
+        yield "file_modifications", md_content
 
         if self.constraints:
-            md_content += "## Constraints\n"
+            md_content = "## Constraints\n"
             for constraint in self.constraints:
                 md_content += f"- {constraint}\n"
             md_content += "\n"
+            yield "constraints", md_content
 
         if self.original_issue_json:
             import json
-            md_content += f"""## Original GitHub Issue
+            yield "original_issue", f"""## Original GitHub Issue
 ```json
 {json.dumps(self.original_issue_json, indent=2)}
 ```
 
 """
 
-        return md_content
+    def to_markdown(self) -> str:
+        """Convert PRD to markdown format"""
+        return "".join(markdown for _, markdown in self.iter_markdown_sections())
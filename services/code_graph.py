@@ -0,0 +1,293 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from array import array
+from collections import deque
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+
+from services.config import env_int, env_float
+from services.codebase_index import CodebaseIndex, index_dir_for
+from services.symbol_index import SymbolIndex
+
+# Bump when the on-disk layout changes; older files are rebuilt
+CODE_GRAPH_FORMAT_VERSION = 1
+
+CODE_GRAPH_FILENAME = "code_graph.json.gz"
+
+# Edge kinds, stored as one byte per edge
+IMPORT_EDGE = 0
+CALL_EDGE = 1
+RELATIONS = {
+    (IMPORT_EDGE, True): "imports",
+    (IMPORT_EDGE, False): "imported_by",
+    (CALL_EDGE, True): "calls",
+    (CALL_EDGE, False): "called_by"
+}
+
+# Approximate call edges: a file mentioning a name defined elsewhere calls it.
+# Short, widely defined or widely mentioned names are too ambiguous to count.
+CALL_NAME_MIN_LENGTH = 4
+CALL_NAME_MAX_DEFINITIONS = 3
+CALL_NAME_MAX_MENTIONS = 50
+
+
+def module_suffixes(relative_path: str) -> List[str]:
+    """Dotted module names a file may be imported as, longest first
+
+    `src/upsonic/tools/__init__.py` -> src.upsonic.tools, upsonic.tools, tools
+    """
+    parts = relative_path[:-3].replace(os.sep, "/").split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return [".".join(parts[i:]) for i in range(len(parts)) if parts[i:]]
+
+
+def graph_fingerprint(symbol_index: SymbolIndex) -> str:
+    """Identifies the file contents a graph was built from"""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(symbol_index.files):
+        digest.update(f"{path}:{symbol_index.files[path]['hash']}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _csr(size: int, edges: Iterable[Tuple[int, int, int]]) -> Tuple[array, array, array]:
+    """Compressed sparse row arrays (indptr, indices, kinds) from (src, dst, kind) edges"""
+    rows: List[List[Tuple[int, int]]] = [[] for _ in range(size)]
+    for source, target, kind in edges:
+        rows[source].append((target, kind))
+
+    indptr, indices, kinds = array("i", [0]), array("i"), array("b")
+    for row in rows:
+        for target, kind in sorted(row):
+            indices.append(target)
+            kinds.append(kind)
+        indptr.append(len(indices))
+    return indptr, indices, kinds
+
+
+class CodeGraph:
+    """File-level import graph plus an approximate call graph, in CSR form
+
+    Import edges come from the AST symbol index; call edges link a file to
+    the file defining a (sufficiently specific) name it mentions. Forward and
+    reverse adjacency are kept as flat `array` buffers so neighborhood
+    expansion touches only the seed files' rows.
+    """
+
+    def __init__(self, paths: List[str], forward: Tuple[array, array, array],
+                 reverse: Tuple[array, array, array], fingerprint: str):
+        self.paths = paths
+        self.node_of = {path: node for node, path in enumerate(paths)}
+        self.indptr, self.indices, self.kinds = forward
+        self.rev_indptr, self.rev_indices, self.rev_kinds = reverse
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, text_index: CodebaseIndex, symbol_index: SymbolIndex) -> "CodeGraph":
+        started = time.perf_counter()
+        paths = sorted(symbol_index.files)
+        node_of = {path: node for node, path in enumerate(paths)}
+
+        modules: Dict[str, Tuple[int, int, str]] = {}
+        for path in paths:
+            for depth, name in enumerate(module_suffixes(path)):
+                candidate = (depth, len(path), path)
+                if name not in modules or candidate < modules[name]:
+                    modules[name] = candidate
+
+        edges = set()
+        for path in paths:
+            source = node_of[path]
+            for record in symbol_index.files[path]["imports"]:
+                target = cls._resolve_import(path, record, modules)
+                if target is not None and target != path:
+                    edges.add((source, node_of[target], IMPORT_EDGE))
+
+        for name, definitions in symbol_index.definitions.items():
+            definers = {symbol["path"] for symbol in definitions}
+            if len(name) < CALL_NAME_MIN_LENGTH or name.startswith("__") or len(definers) > CALL_NAME_MAX_DEFINITIONS:
+                continue
+            mentions = text_index.postings.get(name, {})
+            if len(mentions) > CALL_NAME_MAX_MENTIONS:
+                continue
+            for doc_id in mentions:
+                caller = text_index.documents[doc_id]
+                if caller is None or caller["path"] not in node_of:
+                    continue
+                for definer in definers:
+                    if definer != caller["path"]:
+                        edges.add((node_of[caller["path"]], node_of[definer], CALL_EDGE))
+
+        graph = cls(
+            paths,
+            _csr(len(paths), edges),
+            _csr(len(paths), ((target, source, kind) for source, target, kind in edges)),
+            graph_fingerprint(symbol_index)
+        )
+        print(f"Built code graph: {len(paths)} files, {len(edges)} edges "
+              f"in {time.perf_counter() - started:.2f}s")
+        return graph
+
+    @staticmethod
+    def _resolve_import(path: str, record: Dict[str, Any], modules: Dict[str, Tuple[int, int, str]]) -> Optional[str]:
+        module = record["module"]
+        level = len(module) - len(module.lstrip("."))
+        module = module[level:]
+        if level:
+            package = path.replace(os.sep, "/").split("/")[:-1]
+            if level > 1:
+                package = package[:-(level - 1)] if level - 1 <= len(package) else []
+            module = ".".join(part for part in package + [module] if part)
+
+        # `from package import submodule` imports the submodule's file
+        candidates = [f"{module}.{record['name']}"] if record.get("name") else []
+        candidates.append(module)
+        for candidate in candidates:
+            if candidate in modules:
+                return modules[candidate][2]
+        return None
+
+    def save(self, codebase_path: str, index_dir: Optional[str] = None) -> str:
+        """Write the graph atomically next to the other indexes and return the file path"""
+        index_dir = index_dir or index_dir_for(codebase_path)
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, CODE_GRAPH_FILENAME)
+
+        payload = {
+            "version": CODE_GRAPH_FORMAT_VERSION,
+            "fingerprint": self.fingerprint,
+            "paths": self.paths,
+            "forward": [list(self.indptr), list(self.indices), list(self.kinds)],
+            "reverse": [list(self.rev_indptr), list(self.rev_indices), list(self.rev_kinds)]
+        }
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, codebase_path: str, fingerprint: str, index_dir: Optional[str] = None) -> Optional["CodeGraph"]:
+        """Load a persisted graph, or None if it is missing, outdated or stale"""
+        path = os.path.join(index_dir or index_dir_for(codebase_path), CODE_GRAPH_FILENAME)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception as e:
+            print(f"Failed to load code graph {path}: {str(e)}")
+            return None
+
+        if payload.get("version") != CODE_GRAPH_FORMAT_VERSION or payload.get("fingerprint") != fingerprint:
+            return None
+
+        def arrays(data):
+            return array("i", data[0]), array("i", data[1]), array("b", data[2])
+
+        return cls(payload["paths"], arrays(payload["forward"]), arrays(payload["reverse"]), payload["fingerprint"])
+
+    @classmethod
+    def load_or_build(cls, codebase_path: str, text_index: CodebaseIndex, symbol_index: SymbolIndex,
+                      index_dir: Optional[str] = None) -> "CodeGraph":
+        graph = cls.load(codebase_path, graph_fingerprint(symbol_index), index_dir)
+        if graph is None:
+            graph = cls.build(text_index, symbol_index)
+            try:
+                graph.save(codebase_path, index_dir)
+            except Exception as e:
+                print(f"Failed to persist code graph: {str(e)}")
+        return graph
+
+    def neighbors(self, node: int) -> Iterator[Tuple[int, str]]:
+        """Adjacent files in either direction, with the relation from `node`'s side"""
+        for i in range(self.indptr[node], self.indptr[node + 1]):
+            yield self.indices[i], RELATIONS[(self.kinds[i], True)]
+        for i in range(self.rev_indptr[node], self.rev_indptr[node + 1]):
+            yield self.rev_indices[i], RELATIONS[(self.rev_kinds[i], False)]
+
+    def degree(self, node: int) -> int:
+        return (self.indptr[node + 1] - self.indptr[node]) + (self.rev_indptr[node + 1] - self.rev_indptr[node])
+
+    def expand_bfs(self, seeds: List[int], hops: int) -> Dict[int, Tuple[float, str]]:
+        """Files within `hops` edges of a seed, scored 1/distance"""
+        found: Dict[int, Tuple[float, str]] = {}
+        seen = set(seeds)
+        queue = deque((seed, 0) for seed in seeds)
+        while queue:
+            node, distance = queue.popleft()
+            if distance == hops:
+                continue
+            for neighbor, relation in self.neighbors(node):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    found[neighbor] = (1.0 / (distance + 1), relation)
+                    queue.append((neighbor, distance + 1))
+        return found
+
+    def expand_ppr(self, seeds: List[int], alpha: float, epsilon: float) -> Dict[int, Tuple[float, str]]:
+        """Approximate personalized PageRank around the seeds (local push)
+
+        Only nodes whose residual exceeds `epsilon * degree` are pushed, so the
+        work depends on the seeds' neighborhood rather than the graph size.
+        """
+        rank: Dict[int, float] = {}
+        residual = {seed: 1.0 / len(seeds) for seed in seeds}
+        relations: Dict[int, str] = {}
+        queue = deque(seeds)
+        queued = set(seeds)
+
+        while queue:
+            node = queue.popleft()
+            queued.discard(node)
+            mass = residual[node]
+            degree = self.degree(node)
+            rank[node] = rank.get(node, 0.0) + alpha * mass
+            residual[node] = 0.0
+            if not degree:
+                continue
+            share = (1 - alpha) * mass / degree
+            for neighbor, relation in self.neighbors(node):
+                relations.setdefault(neighbor, relation)
+                residual[neighbor] = residual.get(neighbor, 0.0) + share
+                if neighbor not in queued and residual[neighbor] > epsilon * max(self.degree(neighbor), 1):
+                    queued.add(neighbor)
+                    queue.append(neighbor)
+
+        seed_set = set(seeds)
+        return {node: (score, relations.get(node, "related")) for node, score in rank.items() if node not in seed_set}
+
+    def expand(self, seed_paths: Iterable[str], method: Optional[str] = None, hops: Optional[int] = None,
+               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Importers, imports, callers and callees close to the seed files, best first"""
+        method = method or os.getenv("CODE_GRAPH_EXPANSION", "ppr").lower()
+        hops = hops if hops is not None else env_int("CODE_GRAPH_HOPS", 2)
+        limit = limit if limit is not None else env_int("CODE_GRAPH_EXPAND_LIMIT", 10)
+
+        seeds = list(dict.fromkeys(self.node_of[path] for path in seed_paths if path in self.node_of))
+        if not seeds:
+            return []
+        if method == "bfs":
+            found = self.expand_bfs(seeds, hops)
+        else:
+            found = self.expand_ppr(
+                seeds,
+                alpha=env_float("CODE_GRAPH_PPR_ALPHA", 0.15),
+                epsilon=env_float("CODE_GRAPH_PPR_EPSILON", 1e-3)
+            )
+
+        ranked = sorted(found.items(), key=lambda item: (-item[1][0], self.paths[item[0]]))[:limit]
+        return [
+            {"path": self.paths[node], "score": round(score, 6), "relation": relation}
+            for node, (score, relation) in ranked
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.paths),
+            "edges": len(self.indices),
+            "import_edges": sum(1 for kind in self.kinds if kind == IMPORT_EDGE),
+            "call_edges": sum(1 for kind in self.kinds if kind == CALL_EDGE)
+        }
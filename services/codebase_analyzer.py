@@ -1,6 +1,24 @@
+import asyncio
 import os
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 from models.issue import GitHubIssue
+from services.codebase_index import CodebaseIndex, TEXT_INDEX_FILENAME, index_dir_for
+from services.ranking import BM25Ranker
+from services.symbol_index import SymbolIndex, SYMBOL_INDEX_FILENAME, extract_code_identifiers
+from services.parallel_scan import build_indexes
+from services.code_graph import CodeGraph, CODE_GRAPH_FILENAME, graph_fingerprint
+from services.vector_index import (
+    VectorIndex, HashingEmbedder, NUMPY_AVAILABLE, VECTOR_INDEX_DIRNAME, best_label, salient_terms
+)
+from services.retrieval import (
+    HybridRetriever, LEXICAL, SYMBOL, VECTOR, lexical_retriever, symbol_retriever, vector_retriever,
+    format_candidates
+)
+from services.snippets import SnippetExtractor, format_snippets
+from services.llm_cache import LLMResponseCache, DEFAULT_LLM_MODEL, get_llm_cache, run_task
+from services.prompt_builder import PromptBuilder, get_token_counter, issue_comment_items
+from services.config import env_int, env_float
 
 try:
     import upsonic
@@ -9,12 +27,33 @@ except ImportError:
     UPSONIC_AVAILABLE = False
     print("Upsonic not available, using fallback mode")
 
+# Checkout analyzed when no repository-specific one is configured (see CODEBASE_PATH)
+DEFAULT_CODEBASE_PATH = "/Users/dogukanakin/Desktop/upsonic-examples/Upsonic-master"
+
 # Custom Codebase Tool for Upsonic
 class CodebaseTool:
     """Custom tool for codebase analysis operations"""
 
-    def __init__(self, codebase_path: str = "/Users/dogukanakin/Desktop/upsonic-examples/Upsonic-master"):
+    def __init__(self, codebase_path: str = DEFAULT_CODEBASE_PATH):
         self.codebase_path = codebase_path
+        self.ranker: Optional[BM25Ranker] = None
+        self.symbols: Optional[SymbolIndex] = None
+        self.snippets: Optional[SnippetExtractor] = None
+        self._index_lock = threading.Lock()
+
+    def get_symbol_index(self) -> SymbolIndex:
+        """Return the AST symbol index, building and persisting it on first use"""
+        if self.symbols is None:
+            with self._index_lock:
+                if self.symbols is None:
+                    self.symbols = SymbolIndex.load_or_build(self.codebase_path)
+        return self.symbols
+
+    def get_ranker(self) -> BM25Ranker:
+        """BM25 ranker over the persisted codebase index, built on first use"""
+        if self.ranker is None:
+            self.ranker = BM25Ranker(CodebaseIndex.load_or_build(self.codebase_path))
+        return self.ranker
 
     def get_python_files(self) -> List[str]:
         """Get all Python files from the codebase"""
@@ -38,27 +77,35 @@ class CodebaseTool:
         except Exception as e:
             return f"Error loading file: {str(e)}"
 
+    def load_file_snippets(self, file_path: str, keywords: List[str]) -> str:
+        """Excerpts of a file around the keywords and the symbols they name, instead of the whole file"""
+        if self.snippets is None:
+            self.snippets = SnippetExtractor(self.codebase_path, self.get_ranker().index, self.get_symbol_index())
+        relative_path = os.path.relpath(file_path, self.codebase_path) if os.path.isabs(file_path) else file_path
+        result = self.snippets.extract([relative_path], keywords, names=keywords)
+        return format_snippets(result["snippets"]) or f"No matches for {', '.join(keywords)} in {relative_path}"
+
     async def analyze_codebase_semantic(self, issue_title: str, issue_body: str, codebase_files: List[str]) -> Dict[str, Any]:
         """Perform semantic analysis of codebase files based on issue"""
         relevant_files = []
         analysis_summary = f"Analyzing {len(codebase_files)} files for issue: {issue_title}"
 
-        # Simple keyword-based analysis for demo
         issue_keywords = self._extract_keywords_from_issue_text(issue_title + " " + (issue_body or ""))
 
-        for file_path in codebase_files[:15]:  # Limit analysis
-            try:
-                content = self.load_file_content(file_path)
-                file_relevance_score = self._calculate_file_relevance(content, issue_keywords)
-
-                if file_relevance_score > 0:
-                    relevant_files.append({
-                        "file_path": file_path,
-                        "relevance_score": file_relevance_score,
-                        "matched_keywords": [k for k in issue_keywords if k.lower() in content.lower()]
-                    })
-            except Exception as e:
-                continue
+        # BM25F ranking restricted to the requested files; the first call may build the index
+        ranker = await asyncio.to_thread(self.get_ranker)
+        requested = {os.path.relpath(path, self.codebase_path) for path in codebase_files}
+        candidates = [
+            doc_id for doc_id, doc in enumerate(ranker.index.documents)
+            if doc is not None and doc["path"] in requested
+        ]
+
+        for doc_id, score in ranker.rank(issue_keywords, limit=10, doc_ids=candidates):
+            relevant_files.append({
+                "file_path": os.path.join(self.codebase_path, ranker.index.path_of(doc_id)),
+                "relevance_score": round(score, 4),
+                "matched_keywords": ranker.matched_fields(doc_id, issue_keywords)
+            })
 
         # Sort by relevance score
         relevant_files.sort(key=lambda x: x["relevance_score"], reverse=True)
@@ -93,17 +140,6 @@ class CodebaseTool:
 
         return list(keywords)
 
-    def _calculate_file_relevance(self, content: str, keywords: List[str]) -> int:
-        """Calculate relevance score of a file based on keywords"""
-        score = 0
-        content_lower = content.lower()
-
-        for keyword in keywords:
-            if keyword in content_lower:
-                score += 1
-
-        return score
-
 # Apply Upsonic decorator if available
 if UPSONIC_AVAILABLE:
     CodebaseTool = upsonic.tool()(CodebaseTool)
@@ -112,11 +148,31 @@ if UPSONIC_AVAILABLE:
 
 
 class CodebaseAnalyzer:
-    def __init__(self, codebase_path: str = "/Users/dogukanakin/Desktop/upsonic-examples/Upsonic-master"):
+    # Only the first few comments are used as issue context
+    CONTEXT_COMMENT_LIMIT = 3
+    # Extra ranking score per symbol a file defines that the issue names
+    DEFINITION_BOOST = 5.0
+    # Suggested files are topped up to this many from the fused ranking
+    RELEVANT_FILES_LIMIT = 10
+
+    def __init__(self, codebase_path: str = DEFAULT_CODEBASE_PATH):
         self.codebase_path = codebase_path
         self.agent = None
         self.codebase_tool = None
+        # Prebuilt inverted index, loaded from disk at startup when available
+        self.index: Optional[CodebaseIndex] = CodebaseIndex.load(codebase_path)
+        self.symbols: Optional[SymbolIndex] = SymbolIndex.load(codebase_path)
+        self._index_lock = threading.Lock()
+        self._ranker: Optional[BM25Ranker] = None
+        # (graph, symbol index it was built from)
+        self._graph: Tuple[Optional[CodeGraph], Optional[SymbolIndex]] = (None, None)
+        self._vectors: Tuple[Optional[VectorIndex], Optional[SymbolIndex]] = (None, None)
+        self._snippets: Tuple[Optional[SnippetExtractor], Optional[CodebaseIndex]] = (None, None)
+        self.closed = False
+        self.model_name = DEFAULT_LLM_MODEL
         self.setup_agent()
+        # Repeat analyses of the same issue revision are answered without calling the model
+        self.llm_cache: Optional[LLMResponseCache] = get_llm_cache() if self.agent else None
 
     def setup_agent(self):
         """Initialize Upsonic agent for codebase analysis"""
@@ -131,7 +187,7 @@ class CodebaseAnalyzer:
             self.agent = upsonic.Agent()
 
             # Configure model provider for the agent
-            self.model = upsonic.models.ModelFactory.create('openai/gpt-4o-mini')
+            self.model = upsonic.models.ModelFactory.create(self.model_name)
 
             # Create codebase tool (decorated tools are auto-discovered)
             self.codebase_tool = CodebaseTool(self.codebase_path)
@@ -144,34 +200,265 @@ class CodebaseAnalyzer:
             self.model = None
             self.codebase_tool = CodebaseTool(self.codebase_path)
     
-    def load_codebase_knowledge(self):
-        """Load codebase files into Upsonic knowledge base"""
+    def load_codebase_knowledge(self, issue: GitHubIssue, files: Optional[List[str]] = None):
+        """Load excerpts of the files relevant to an issue into the Upsonic knowledge base
+
+        Only the ranked snippets around the issue's keywords and symbols are
+        added, within SNIPPET_KNOWLEDGE_TOKEN_BUDGET, rather than whole files.
+        """
+        if not self.agent:
+            return
         try:
-            # Get Python files from the codebase
-            python_files = self.get_python_files()
-            
-            for file_path in python_files[:50]:  # Limit to avoid rate limits
+            files = files if files is not None else self.fallback_file_discovery(issue)
+            result = self.extract_snippets(issue, files, token_budget=env_int("SNIPPET_KNOWLEDGE_TOKEN_BUDGET", 8000))
+
+            by_file: Dict[str, List[Dict[str, Any]]] = {}
+            for snippet in result["snippets"]:
+                by_file.setdefault(snippet["path"], []).append(snippet)
+
+            for relative_path, snippets in by_file.items():
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    relative_path = os.path.relpath(file_path, self.codebase_path)
-                    
-                    # Add to agent's knowledge base
-                    if self.agent and len(content.strip()) > 0:
-                        self.agent.add_knowledge(
-                            name=relative_path,
-                            content=content,
-                            content_type="code"
-                        )
-                        
+                    self.agent.add_knowledge(
+                        name=relative_path,
+                        content=format_snippets(snippets),
+                        content_type="code"
+                    )
                 except Exception as e:
-                    print(f"Error loading file {file_path}: {str(e)}")
+                    print(f"Error loading snippets of {relative_path}: {str(e)}")
                     continue
-                    
+
         except Exception as e:
             print(f"Error loading codebase knowledge: {str(e)}")
-    
+
+    def _ensure_indexes(self):
+        """Load both indexes, building missing ones in a single parallel scan"""
+        with self._index_lock:
+            if self.index is None:
+                self.index = CodebaseIndex.load(self.codebase_path)
+            if self.symbols is None:
+                self.symbols = SymbolIndex.load(self.codebase_path)
+            if self.index is not None and self.symbols is not None:
+                return
+
+            index, symbols, _ = build_indexes(
+                self.codebase_path, text=self.index is None, symbols=self.symbols is None
+            )
+            for built in (index, symbols):
+                if built is not None:
+                    try:
+                        built.save()
+                    except Exception as e:
+                        print(f"Failed to persist codebase index: {str(e)}")
+            if index is not None:
+                index = CodebaseIndex.load(self.codebase_path) or index
+            self.index = self.index or index
+            self.symbols = self.symbols or symbols
+
+    def get_index(self) -> CodebaseIndex:
+        """Return the codebase index, building and persisting it on first use"""
+        if self.index is None:
+            self._ensure_indexes()
+        return self.index
+
+    def get_symbol_index(self) -> SymbolIndex:
+        """Return the AST symbol index, building and persisting it on first use"""
+        if self.symbols is None:
+            self._ensure_indexes()
+        return self.symbols
+
+    def get_ranker(self) -> BM25Ranker:
+        """BM25 ranker for the current index, rebuilt whenever the index is swapped"""
+        index = self.get_index()
+        ranker = self._ranker
+        if ranker is None or ranker.index is not index:
+            ranker = BM25Ranker(index)
+            self._ranker = ranker
+        return ranker
+
+    def get_graph(self) -> CodeGraph:
+        """Import/call graph for the current indexes, rebuilt when they are swapped"""
+        symbols = self.get_symbol_index()
+        graph, built_from = self._graph
+        if graph is None or built_from is not symbols:
+            graph = CodeGraph.load_or_build(self.codebase_path, self.get_index(), symbols)
+            self._graph = (graph, symbols)
+        return graph
+
+    def get_vector_index(self) -> Optional[VectorIndex]:
+        """Chunk embedding index for the current symbols, or None without NumPy"""
+        if not NUMPY_AVAILABLE:
+            return None
+        symbols = self.get_symbol_index()
+        vectors, built_from = self._vectors
+        if vectors is None or built_from is not symbols:
+            vectors = VectorIndex.load_or_build(self.codebase_path, symbols, graph_fingerprint(symbols))
+            self._vectors = (vectors, symbols)
+        return vectors
+
+    def get_snippet_extractor(self) -> SnippetExtractor:
+        """Snippet extractor over the current indexes, rebuilt when the text index is swapped"""
+        index = self.get_index()
+        extractor, built_from = self._snippets
+        if extractor is None or built_from is not index or extractor.symbols is not self.symbols:
+            extractor = SnippetExtractor(self.codebase_path, index, self.get_symbol_index(),
+                                         counter=get_token_counter(self.model_name))
+            self._snippets = (extractor, index)
+        return extractor
+
+    def extract_snippets(self, issue: GitHubIssue, files: List[str],
+                         token_budget: Optional[int] = None) -> Dict[str, Any]:
+        """Ranked code excerpts of the given files around the issue's keywords and symbols"""
+        return self.get_snippet_extractor().extract(
+            files, self.extract_keywords_from_issue(issue), self.symbol_names(issue), token_budget=token_budget
+        )
+
+    def semantic_search(self, issue: GitHubIssue, k: int = 10) -> List[Dict[str, Any]]:
+        """Code chunks closest to the issue text by cosine similarity"""
+        vectors = self.get_vector_index()
+        if vectors is None:
+            return []
+        return vectors.search(f"{issue.title}\n{issue.body or ''}", k=k)
+
+    def get_retriever(self) -> HybridRetriever:
+        """Hybrid retriever over the current lexical, symbol and vector indexes"""
+        depth = env_int("HYBRID_RETRIEVER_DEPTH", 50)
+        retrievers = {
+            LEXICAL: lexical_retriever(self.get_ranker(), depth),
+            SYMBOL: symbol_retriever(self.get_symbol_index(), depth)
+        }
+        vectors = self.get_vector_index()
+        if vectors is not None:
+            retrievers[VECTOR] = vector_retriever(vectors, depth)
+        return HybridRetriever(retrievers)
+
+    def warm(self):
+        """Load or build every index a request needs, so no request builds them on the event loop"""
+        self.get_retriever()
+        self.get_snippet_extractor()
+
+    def loaded_index_paths(self) -> List[str]:
+        """Files and directories of the indexes currently loaded"""
+        index_dir = index_dir_for(self.codebase_path)
+        loaded = [
+            (self.index, TEXT_INDEX_FILENAME),
+            (self.symbols, SYMBOL_INDEX_FILENAME),
+            (self._graph[0], CODE_GRAPH_FILENAME),
+            (self._vectors[0], VECTOR_INDEX_DIRNAME)
+        ]
+        return [os.path.join(index_dir, name) for loaded_index, name in loaded if loaded_index is not None]
+
+    def codebase_fingerprint(self) -> Dict[str, str]:
+        """Checkout path and index revision, for cache keys of tasks whose tools read the codebase"""
+        return {"path": os.path.abspath(self.codebase_path), "index": self.get_index().fingerprint()}
+
+    def close(self):
+        """Release the loaded indexes, unmapping the text index file"""
+        with self._index_lock:
+            self.closed = True
+            index = self.index
+            self.index = None
+            self.symbols = None
+            self._ranker = None
+            self._graph = (None, None)
+            self._vectors = (None, None)
+            self._snippets = (None, None)
+        if index is not None:
+            index.close()
+
+    async def hybrid_retrieve(self, issue: GitHubIssue) -> Dict[str, Any]:
+        """Fused file ranking for the issue from all retrievers, queried concurrently"""
+        query = {
+            "text": f"{issue.title}\n{issue.body or ''}",
+            "keywords": self.extract_keywords_from_issue(issue),
+            "names": self.symbol_names(issue)
+        }
+        # Building the retriever may load or build indexes on first use
+        retriever = await asyncio.to_thread(self.get_retriever)
+        retrieval = await retriever.retrieve(query)
+        latency = ", ".join(f"{name} {ms}ms" for name, ms in retrieval["latency_ms"].items())
+        print(f"Hybrid retrieval ({retrieval['fusion']}): {len(retrieval['files'])} files; {latency}")
+        return retrieval
+
+    def verify_relevant_files(self, analysis_data: Dict[str, Any],
+                              retrieval: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Drop suggested files that do not exist and top up with the fused ranking"""
+        if retrieval is None:
+            return analysis_data
+        index = self.get_index()
+        files, report = HybridRetriever.verify(
+            analysis_data.get("relevant_files", []),
+            retrieval,
+            (doc["path"] for doc in index.documents if doc is not None),
+            self.codebase_path,
+            limit=self.RELEVANT_FILES_LIMIT
+        )
+        if report["rejected"]:
+            print(f"Rejected {len(report['rejected'])} suggested files not in the codebase: {report['rejected']}")
+
+        analysis_data["relevant_files"] = files
+        analysis_data["retrieval"] = {
+            "fusion": retrieval["fusion"],
+            "latency_ms": retrieval["latency_ms"],
+            "errors": retrieval["errors"],
+            "files": [
+                {"path": entry["path"], "score": entry["score"], "ranks": entry["ranks"]}
+                for entry in retrieval["files"][:self.RELEVANT_FILES_LIMIT]
+            ],
+            "verification": report
+        }
+        return analysis_data
+
+    def refresh_index(self) -> Dict[str, Any]:
+        """Re-index changed files and swap in the new index
+
+        Requests already running keep the index they started with; the new one
+        is published with a single reference assignment once it is complete.
+        """
+        if self.closed:
+            # Evicted from the registry while a refresh was scheduled
+            return {}
+        if self.index is None:
+            self._ensure_indexes()
+            return {"rebuilt": True, **self.index.stats()}
+
+        with self._index_lock:
+            refreshed, stats = self.index.refresh()
+            if refreshed is not self.index:
+                try:
+                    refreshed.save()
+                    # Serve the saved file memory-mapped, shared with other workers
+                    refreshed = CodebaseIndex.load(self.codebase_path) or refreshed
+                except Exception as e:
+                    print(f"Failed to persist codebase index: {str(e)}")
+                self.index = refreshed
+
+            if self.symbols is not None:
+                symbols = self.symbols.sync(refreshed)
+                if symbols is not self.symbols:
+                    try:
+                        symbols.save()
+                    except Exception as e:
+                        print(f"Failed to persist symbol index: {str(e)}")
+                    self.symbols = symbols
+            return stats
+
+    def symbol_names(self, issue: GitHubIssue) -> List[str]:
+        """Names the issue may refer to: its keywords plus identifiers in its text"""
+        names = self.extract_keywords_from_issue(issue)
+        names += extract_code_identifiers(f"{issue.title}\n{issue.body or ''}")
+        return list(dict.fromkeys(names))
+
+    def locate_symbols(self, issue: GitHubIssue, files: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Line ranges of the symbols named by the issue, per relevant file"""
+        symbols = self.get_symbol_index()
+        names = self.symbol_names(issue)
+        locations = {}
+        for file_path in files:
+            ranges = symbols.line_ranges(file_path, names)
+            if ranges:
+                locations[file_path] = ranges
+        return locations
+
     def get_python_files(self) -> List[str]:
         """Get all Python files from the codebase"""
         python_files = []
@@ -186,40 +473,39 @@ class CodebaseAnalyzer:
         
         return python_files
     
-    async def analyze_issue_with_codebase(self, issue: GitHubIssue) -> Dict[str, Any]:
-        """Analyze issue context against the codebase using Task-based workflow"""
+    async def analyze_issue_with_codebase(self, issue: GitHubIssue,
+                                          retrieval: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Analyze issue context against the codebase using Task-based workflow
+
+        The fused retrieval ranking seeds the prompt with candidate files and
+        is used afterwards to verify and complete the suggested files. Callers
+        that already ran hybrid_retrieve pass its result in.
+        """
+        if retrieval is None:
+            try:
+                retrieval = await self.hybrid_retrieve(issue)
+            except Exception as e:
+                print(f"Hybrid retrieval failed: {str(e)}")
+
+        analysis_data = await self._analyze_with_agent(issue, retrieval)
+        return await asyncio.to_thread(self.verify_relevant_files, analysis_data, retrieval)
+
+    async def _analyze_with_agent(self, issue: GitHubIssue, retrieval: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         try:
             if self.agent:
+                # Snippet extraction reads files and may load indexes, keep it off the event loop
+                description, prompt_report = await asyncio.to_thread(self.build_analysis_prompt, issue, retrieval)
+                print(f"Analysis prompt: {prompt_report['tokens']}/{prompt_report['budget']} tokens")
                 # Create Task-based analysis workflow
                 analysis_task = upsonic.Task(
-                    description=f"""Analyze GitHub issue '{issue.title}' against the Upsonic codebase for relevant files and context.
-
-Issue Details:
-- Title: {issue.title}
-- Description: {issue.body or 'No description'}
-- This appears to be about: {'response truncation/display issues' if 'response' in issue.title.lower() and ('truncat' in issue.title.lower() or 'long' in issue.title.lower()) else 'general issue'}
-
-Focus on finding files related to:
-1. Task response handling and formatting
-2. Agent response processing
-3. Display/logging utilities that might truncate output
-4. Response serialization/deserialization
-
-Return ONLY a valid JSON object with this exact structure:
-{{
-  "analysis": "Brief analysis of the issue and affected components",
-  "relevant_files": ["src/upsonic/tasks/tasks.py", "src/upsonic/agent/agent.py", "src/upsonic/utils/printing.py"],
-  "issue_keywords": ["response", "truncation", "display", "logging"],
-  "semantic_concepts": ["response_handling", "output_formatting"]
-}}
-
-CRITICAL: relevant_files must contain actual file paths from the codebase, not generic placeholders.""",
+                    description=description,
                     tools=["CodebaseTool"],
                     response_format=str
                 )
 
-                # Execute task with configured model
-                result = await self.agent.do_async(analysis_task, model=self.model)
+                # Execute task with configured model; its CodebaseTool reads this revision of the codebase
+                codebase = await asyncio.to_thread(self.codebase_fingerprint)
+                result = await run_task(self.agent, analysis_task, self.model, self.model_name, self.llm_cache, codebase)
 
                 # Parse the JSON response
                 import json
@@ -227,20 +513,69 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
                     parsed_result = json.loads(result)
                     return {
                         "analysis": parsed_result.get("analysis", f"AI-powered analysis completed. Result: {str(result)[:200]}..."),
-                        "relevant_files": parsed_result.get("relevant_files", [])[:10],  # Remove hardcoded defaults
+                        "relevant_files": parsed_result.get("relevant_files", [])[:self.RELEVANT_FILES_LIMIT],  # Remove hardcoded defaults
                         "issue_keywords": parsed_result.get("issue_keywords", []),
-                        "semantic_concepts": parsed_result.get("semantic_concepts", [])
+                        "semantic_concepts": parsed_result.get("semantic_concepts", []),
+                        "prompt_tokens": {"analysis": prompt_report}
                     }
                 except json.JSONDecodeError:
                     # If parsing fails, use fallback analysis instead of hardcoded defaults
-                    return self.enhanced_fallback_analysis(issue)
+                    return await asyncio.to_thread(self.enhanced_fallback_analysis, issue)
             else:
                 # Enhanced fallback analysis
-                return self.enhanced_fallback_analysis(issue)
+                return await asyncio.to_thread(self.enhanced_fallback_analysis, issue)
 
         except Exception as e:
             print(f"Error in task-based issue analysis: {str(e)}")
-            return self.enhanced_fallback_analysis(issue)
+            return await asyncio.to_thread(self.enhanced_fallback_analysis, issue)
+
+    def build_analysis_prompt(self, issue: GitHubIssue,
+                              retrieval: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """Analysis task description within PROMPT_TOKEN_BUDGET_ANALYSIS, and its per-section token report
+
+        The description is capped at half the budget; beyond that comments give
+        way first, then code excerpts, candidate files and the description.
+        """
+        counter = get_token_counter(self.model_name)
+        budget = env_int("PROMPT_TOKEN_BUDGET_ANALYSIS", 6000)
+        builder = PromptBuilder(budget, counter)
+        builder.add("task", f"Analyze GitHub issue '{issue.title}' against the Upsonic codebase for relevant files and context.", 0)
+        builder.add("issue", f"""Issue Details:
+- Title: {issue.title}
+- This appears to be about: {'response truncation/display issues' if 'response' in issue.title.lower() and ('truncat' in issue.title.lower() or 'long' in issue.title.lower()) else 'general issue'}""", 0)
+        builder.add("description", issue.body or "No description", 1, header="Description:\n",
+                    min_tokens=64, max_tokens=budget // 2)
+        builder.add("focus", """Focus on finding files related to:
+1. Task response handling and formatting
+2. Agent response processing
+3. Display/logging utilities that might truncate output
+4. Response serialization/deserialization""", 0)
+
+        if retrieval:
+            prompt_files = env_int("HYBRID_PROMPT_FILES", 8)
+            candidates = format_candidates(retrieval, prompt_files)
+            builder.add_items(
+                "candidates", candidates.split("\n") if candidates else [], 2,
+                header="Candidate files ranked by code search (verify these first):\n"
+            )
+            # Excerpts around the issue's keywords and symbols instead of whole files
+            excerpts = self.extract_snippets(issue, [entry["path"] for entry in retrieval["files"][:prompt_files]])
+            builder.add_items(
+                "code_excerpts", [format_snippets([snippet]) for snippet in excerpts["snippets"]], 3,
+                header="Relevant code excerpts:\n", separator="\n\n"
+            )
+
+        builder.add_items("comments", issue_comment_items(issue, counter, self.CONTEXT_COMMENT_LIMIT), 4, header="Comments:\n")
+        builder.add("output_format", """Return ONLY a valid JSON object with this exact structure:
+{
+  "analysis": "Brief analysis of the issue and affected components",
+  "relevant_files": ["src/upsonic/tasks/tasks.py", "src/upsonic/agent/agent.py", "src/upsonic/utils/printing.py"],
+  "issue_keywords": ["response", "truncation", "display", "logging"],
+  "semantic_concepts": ["response_handling", "output_formatting"]
+}
+
+CRITICAL: relevant_files must contain actual file paths from the codebase, not generic placeholders.""", 0)
+        return builder.render()
 
     async def semantic_issue_analysis(self, issue: GitHubIssue) -> str:
         """Use Upsonic agent to semantically understand the issue"""
@@ -275,7 +610,7 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
     async def semantic_file_discovery(self, issue: GitHubIssue, semantic_analysis: str) -> List[str]:
         """Discover relevant files based on semantic understanding"""
         if not self.agent:
-            return self.fallback_file_discovery(issue)
+            return await asyncio.to_thread(self.fallback_file_discovery, issue)
 
         # Extract key concepts from semantic analysis
         discovery_prompt = f"""
@@ -302,7 +637,7 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
             files = self.extract_file_paths_from_analysis(file_suggestions)
 
             # Add context-aware files based on semantic analysis
-            context_files = self.get_context_aware_files(semantic_analysis, issue)
+            context_files = await asyncio.to_thread(self.get_context_aware_files, semantic_analysis, issue)
 
             # Combine and deduplicate
             all_files = list(set(files + context_files))
@@ -311,51 +646,36 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
 
         except Exception as e:
             print(f"Error in file discovery: {str(e)}")
-            return self.fallback_file_discovery(issue)
+            return await asyncio.to_thread(self.fallback_file_discovery, issue)
+
+    # Domain terms that, when the semantic analysis mentions them, join the ranking query
+    CONTEXT_TERMS = [
+        'async', 'fastapi', 'hang', 'blocking', 'process', 'termination', 'servermanager', 'child',
+        'security', 'pickle', 'rce', 'deserialization', 'vulnerability', 'tool', 'function',
+        'standalone', 'decorator'
+    ]
 
     def get_context_aware_files(self, semantic_analysis: str, issue: GitHubIssue) -> List[str]:
-        """Get context-aware file suggestions based on semantic analysis"""
-        context_files = []
+        """Get context-aware file suggestions based on semantic analysis
 
+        The top keyword hits are expanded through the import/call graph to pull
+        in their importers, imports, callers and callees.
+        """
         analysis_lower = semantic_analysis.lower()
+        query = self.extract_keywords_from_issue(issue)
+        query += [term for term in self.CONTEXT_TERMS if term in analysis_lower and term not in query]
+
+        ranker = self.get_ranker()
+        seeds = [ranker.index.path_of(doc_id) for doc_id, _ in ranker.rank(query, limit=env_int("CODE_GRAPH_SEEDS", 5))]
+        neighbors = [entry["path"] for entry in self.get_graph().expand(seeds)]
 
-        # Async/FastAPI context
-        if any(term in analysis_lower for term in ['async', 'fastapi', 'hang', 'blocking']):
-            context_files.extend([
-                'src/upsonic/agent/agent.py',
-                'examples/fastapi_example.py',
-                'src/upsonic/server/__init__.py'
-            ])
-
-        # Process/ServerManager context
-        if any(term in analysis_lower for term in ['process', 'termination', 'servermanager', 'child']):
-            context_files.extend([
-                'src/upsonic/server/level_two/server/server.py',
-                'src/upsonic/server/__init__.py',
-                'src/upsonic/utils/__init__.py'
-            ])
-
-        # Security/Pickle context
-        if any(term in analysis_lower for term in ['security', 'pickle', 'rce', 'deserialization', 'vulnerability']):
-            context_files.extend([
-                'src/upsonic/safety_engine/__init__.py',
-                'src/upsonic/server/level_two/server/server.py',
-                'src/upsonic/tools_server/server/tools.py'
-            ])
-
-        # Tool/Function context
-        if any(term in analysis_lower for term in ['tool', 'function', 'standalone', 'decorator']):
-            context_files.extend([
-                'src/upsonic/tools/__init__.py',
-                'src/upsonic/tools/tool.py',
-                'src/upsonic/tools/processor.py'
-            ])
-
-        return context_files
+        return list(dict.fromkeys(seeds + neighbors))
 
     def score_and_rank_files(self, files: List[str], semantic_analysis: str, issue: GitHubIssue) -> List[str]:
         """Score and rank files based on relevance to the issue"""
         scored_files = []
+        keywords = self.extract_keywords_from_issue(issue)
+        definitions = self.get_symbol_index().definition_paths(self.symbol_names(issue))
 
         for file_path in files:
             score = 0
@@ -380,12 +700,16 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
                 reasons.append("tool-related functionality")
 
             # Keyword matching bonus
-            keywords = self.extract_keywords_from_issue(issue)
             for keyword in keywords:
                 if keyword in file_lower:
                     score += 1
                     reasons.append(f"keyword: {keyword}")
 
+            # Definition sites of symbols named in the issue
+            for qualname in definitions.get(file_path, []):
+                score += 3
+                reasons.append(f"defines: {qualname}")
+
             # Content relevance (check if file exists and sample content)
             if os.path.exists(os.path.join(self.codebase_path, file_path)):
                 try:
@@ -428,86 +752,39 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
         title_words = issue.title.lower().split()
         concepts.update(title_words)
 
-        # Extract from body
+        # Concepts named by the code most similar to the issue
         if issue.body:
-            body_lower = issue.body.lower()
-
-            # Technical concepts
-            if 'async' in body_lower or 'await' in body_lower:
-                concepts.update(['async', 'concurrency', 'fastapi'])
-
-            if 'process' in body_lower or 'servermanager' in body_lower:
-                concepts.update(['process_management', 'server', 'termination'])
-
-            if 'security' in body_lower or 'vulnerabilit' in body_lower:
-                concepts.update(['security', 'vulnerability', 'authentication'])
-
-            if 'tool' in body_lower or 'function' in body_lower:
-                concepts.update(['tool_system', 'functionality', 'integration'])
-
-            if 'api' in body_lower or 'endpoint' in body_lower:
-                concepts.update(['api', 'endpoint', 'integration'])
+            concepts.update(salient_terms(self.semantic_search(issue)))
 
         return list(concepts)
 
     def fallback_file_discovery(self, issue: GitHubIssue) -> List[str]:
         """Enhanced fallback file discovery with better heuristics"""
         keywords = self.extract_keywords_from_issue(issue)
+        ranker = self.get_ranker()
 
-        # Multi-level scoring system
-        file_scores = []
+        # Semantic relevance: related concepts even if exact keywords don't match
+        semantic_terms = {'security': 'safety'}
+        query = keywords + [related for keyword, related in semantic_terms.items() if keyword in keywords]
 
-        for file_path in self.get_python_files():
-            relative_path = os.path.relpath(file_path, self.codebase_path)
-            score = 0
-            matches = []
+        # BM25F over path, symbols, docstrings and body
+        scores = {ranker.index.path_of(doc_id): score for doc_id, score in ranker.rank(query)}
 
-            # 1. Path-based matching (high weight)
-            path_lower = relative_path.lower()
-            for keyword in keywords:
-                if keyword in path_lower:
-                    score += 5  # Higher weight for path matches
-                    matches.append(f"path:{keyword}")
+        # Definition sites of the symbols the issue names outrank mere mentions
+        definitions = self.get_symbol_index().definition_paths(self.symbol_names(issue))
+        for file_path, defined in definitions.items():
+            scores[file_path] = scores.get(file_path, 0.0) + self.DEFINITION_BOOST * len(defined)
 
-            # 2. Content-based matching (medium weight)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content_sample = ' '.join(f.readlines()[:30]).lower()
-
-                    for keyword in keywords:
-                        if keyword in content_sample:
-                            score += 2  # Medium weight for content matches
-                            if f"content:{keyword}" not in matches:
-                                matches.append(f"content:{keyword}")
-            except Exception:
-                continue
-
-            # 3. Semantic relevance (low weight)
-            # Check for related concepts even if exact keywords don't match
-            semantic_score = 0
-            if 'agent' in keywords and ('agent' in path_lower or 'agent' in content_sample):
-                semantic_score += 3
-            if 'server' in keywords and ('server' in path_lower or 'server' in content_sample):
-                semantic_score += 3
-            if 'security' in keywords and ('safety' in path_lower or 'security' in content_sample):
-                semantic_score += 3
-
-            score += semantic_score
-
-            if score > 0:
-                file_scores.append((relative_path, score, matches))
-
-        # Sort by score and return top files
-        file_scores.sort(key=lambda x: x[1], reverse=True)
+        file_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
 
         # Apply intelligent filtering
         filtered_files = []
-        for file_path, score, matches in file_scores:
+        for file_path, score in file_scores:
             # Prioritize core system files
             if any(keyword in file_path for keyword in ['__init__.py', 'agent.py', 'server', 'tools', 'safety']):
                 filtered_files.append(file_path)
 
-        return (filtered_files + [f for f, s, m in file_scores if f not in filtered_files])[:15]
+        return (filtered_files + [f for f, s in file_scores if f not in filtered_files])[:15]
 
     def enhanced_fallback_analysis(self, issue: GitHubIssue) -> Dict[str, Any]:
         """Enhanced fallback analysis with better intelligence"""
@@ -542,7 +819,7 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
         - Keywords identified: {', '.join(keywords[:10])}
 
         Analysis Method:
-        - Multi-level scoring (path: 5pts, content: 2pts, semantic: 3pts)
+        - BM25F ranking over file path, symbol names, docstrings and body
         - Context-aware filtering
         - Core system prioritization
 
@@ -574,34 +851,41 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
                 response_files.append(file_path)
 
         # Add any logging/display related files
-        logging_files = []
-        for file_path in self.get_python_files():
-            relative_path = os.path.relpath(file_path, self.codebase_path)
-            if any(keyword in relative_path.lower() for keyword in ['print', 'log', 'display', 'format']):
-                logging_files.append(relative_path)
+        index = self.get_index()
+        logging_doc_ids = set()
+        for keyword in ['print', 'log', 'display', 'format']:
+            logging_doc_ids |= index.path_matches(keyword)
+        logging_files = sorted(index.path_of(doc_id) for doc_id in logging_doc_ids)
 
         # Combine and prioritize core files
         all_files = response_files + logging_files[:5]  # Limit logging files
 
         return all_files[:10]  # Return top 10 files
 
+    # Prototype descriptions the issue text is compared against
+    TECHNICAL_DOMAINS = {
+        'security': 'security vulnerability vulnerabilities exploit rce pickle deserialization injection authentication safety policy',
+        'async_concurrency': 'async await asyncio fastapi concurrency event loop blocking hang forever coroutine do_async',
+        'process_management': 'process processes servermanager server termination terminate kill child subprocess shutdown cleanup',
+        'tool_system': 'tool tools toolkit decorator function functions standalone processor registration',
+        'api_integration': 'api endpoint endpoints request response http client integration openrouter pricing'
+    }
+
     def determine_technical_domain(self, issue: GitHubIssue) -> str:
-        """Determine the technical domain of the issue"""
-        body_lower = (issue.body or '').lower()
+        """Determine the technical domain of the issue
 
-        if 'security' in body_lower or 'vulnerabilit' in body_lower:
-            return 'security'
-        elif 'async' in body_lower or 'fastapi' in body_lower:
-            return 'async_concurrency'
-        elif 'process' in body_lower or 'servermanager' in body_lower:
-            return 'process_management'
-        elif 'tool' in body_lower or 'function' in body_lower:
-            return 'tool_system'
-        elif 'api' in body_lower or 'endpoint' in body_lower:
-            return 'api_integration'
-        else:
+        Issues whose closest domain description is less similar than
+        DOMAIN_MIN_SIMILARITY (cosine) are classified as 'general'.
+        """
+        text = issue.body or ''
+        if not NUMPY_AVAILABLE or not text.strip():
             return 'general'
 
+        vectors = self.get_vector_index()
+        embedder = vectors.embedder if vectors is not None else HashingEmbedder(512)
+        threshold = env_float("DOMAIN_MIN_SIMILARITY", 0.12)
+        return best_label(embedder, f"{issue.title}\n{text}", self.TECHNICAL_DOMAINS, threshold) or 'general'
+
     def assess_complexity(self, issue: GitHubIssue) -> str:
         """Assess the complexity level of the issue"""
         body_lower = (issue.body or '').lower()
@@ -615,22 +899,16 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
         else:
             return 'Low-Medium'
     
-    def create_issue_context(self, issue: GitHubIssue) -> str:
-        """Create context string from issue data"""
-        context = f"Title: {issue.title}\n"
-        
-        if issue.body:
-            context += f"Description: {issue.body}\n"
-        
+    def create_issue_context(self, issue: GitHubIssue, budget: Optional[int] = None) -> str:
+        """Create context string from issue data, within a token budget"""
+        counter = get_token_counter(self.model_name)
+        builder = PromptBuilder(budget if budget is not None else env_int("PROMPT_TOKEN_BUDGET_ANALYSIS", 6000), counter)
+        builder.add("title", f"Title: {issue.title}", 0)
+        builder.add("description", issue.body, 1, header="Description: ", min_tokens=64)
         if issue.labels:
-            labels = ", ".join([label.name for label in issue.labels])
-            context += f"Labels: {labels}\n"
-        
-        if issue.comments:
-            context += "Comments:\n"
-            for comment in issue.comments[:3]:  # Limit to first 3 comments
-                context += f"- {comment.user.login}: {comment.body[:200]}...\n"
-        
+            builder.add("labels", f"Labels: {', '.join([label.name for label in issue.labels])}", 0)
+        builder.add_items("comments", issue_comment_items(issue, counter, self.CONTEXT_COMMENT_LIMIT), 2, header="Comments:\n")
+        context, _ = builder.render()
         return context
     
     def extract_keywords_from_issue(self, issue: GitHubIssue) -> List[str]:
@@ -728,47 +1006,18 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
         """Fallback analysis when Upsonic agent is not available"""
         keywords = self.extract_keywords_from_issue(issue)
 
-        # Intelligent file matching with priority scoring
-        file_scores = []
-        python_files = self.get_python_files()
-
-        for file_path in python_files:
-            relative_path = os.path.relpath(file_path, self.codebase_path)
-            score = 0
-            matches = []
-
-            # Check file path relevance
-            path_lower = relative_path.lower()
-
-            for keyword in keywords:
-                if keyword in path_lower:
-                    score += 3  # High score for path matches
-                    matches.append(f"path:{keyword}")
-
-            # Check file content relevance (sample first 50 lines)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content_sample = ' '.join(f.readlines()[:50]).lower()
-
-                    for keyword in keywords:
-                        if keyword in content_sample:
-                            score += 1  # Lower score for content matches
-                            if f"path:{keyword}" not in matches:  # Don't duplicate path matches
-                                matches.append(f"content:{keyword}")
-            except Exception:
-                continue
-
-            if score > 0:
-                file_scores.append((relative_path, score, matches))
-
-        # Sort by score (highest first) and prioritize core files
-        file_scores.sort(key=lambda x: x[1], reverse=True)
+        # BM25F ranking over path, symbols, docstrings and body
+        ranker = self.get_ranker()
+        file_scores = [
+            (ranker.index.path_of(doc_id), score)
+            for doc_id, score in ranker.rank(keywords)
+        ]
 
         # Prioritize core files
         core_files = []
         other_files = []
 
-        for file_path, score, matches in file_scores:
+        for file_path, score in file_scores:
             if any(keyword in file_path for keyword in ['tool.py', '__init__.py', 'processor.py', 'task', 'agent']):
                 core_files.append(file_path)
             else:
@@ -785,8 +1034,7 @@ CRITICAL: relevant_files must contain actual file paths from the codebase, not g
         - Files matching keywords: {len(relevant_files)} files found
 
         Analysis Method:
-        - Path-based matching (score: 3 points)
-        - Content-based matching (score: 1 point)
+        - BM25F ranking over file path, symbol names, docstrings and body
         - Core files prioritized first
 
         Recommendation: Review core files first, then supporting files.
@@ -0,0 +1,631 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import re
+import time
+from collections.abc import Mapping, MutableMapping
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Tuple
+
+from services.config import env_int, env_flag
+from services.index_format import (
+    MappedIndexFile, PostingsOverlay, write_index_file, sorted_terms, LINES, IDS, COUNTS
+)
+
+# Bump when the on-disk layout changes; older files are rebuilt
+INDEX_FORMAT_VERSION = 5
+
+# Compact doc ids once this share of documents are tombstones
+COMPACT_TOMBSTONE_RATIO = 0.25
+
+TEXT_INDEX_FILENAME = "text_index.bin"
+# Written by format versions before the binary layout; removed on save
+LEGACY_TEXT_INDEX_FILENAME = "text_index.json.gz"
+
+# Directories skipped while walking the codebase (same as CodebaseTool)
+SKIP_DIRS = ['.git', '__pycache__', '.pytest_cache', 'node_modules', '.venv']
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+SYMBOL_PATTERN = re.compile(r"^\s*(?:async\s+)?(?:def|class)\s+([A-Za-z_]\w*)")
+DOCSTRING_QUOTES = ('"""', "'''")
+
+# Fields indexed besides the full body, used for BM25F weighting
+SYMBOL_FIELD = "symbols"
+DOCSTRING_FIELD = "docstrings"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase identifier tokens, plus the parts of snake_case identifiers"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part and part != token)
+    return tokens
+
+
+def index_dir_for(codebase_path: str) -> str:
+    """Directory holding the persisted indexes of one codebase"""
+    base_dir = os.getenv("CODEBASE_INDEX_DIR", ".cache/codebase_index")
+    absolute = os.path.abspath(codebase_path)
+    digest = hashlib.sha1(absolute.encode("utf-8")).hexdigest()[:10]
+    name = os.path.basename(absolute.rstrip(os.sep)) or "root"
+    return os.path.join(base_dir, f"{name}-{digest}")
+
+
+def walk_python_files(codebase_path: str) -> List[str]:
+    """Relative paths of all Python files in the codebase
+
+    Uses os.scandir directly so directory entries' cached type information
+    avoids a stat call per entry.
+    """
+    python_files = []
+    pending = [""]
+    while pending:
+        relative_dir = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(codebase_path, relative_dir))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                try:
+                    if entry.is_dir():
+                        if entry.name not in SKIP_DIRS:
+                            pending.append(relative_path)
+                    elif entry.name.endswith('.py') and not entry.name.startswith('.') and entry.is_file():
+                        python_files.append(relative_path)
+                except OSError:
+                    continue
+    python_files.sort()
+    return python_files
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def read_file(codebase_path: str, relative_path: str) -> Optional[Tuple[bytes, os.stat_result]]:
+    """Raw bytes and stat of one file, or None if it cannot be read"""
+    full_path = os.path.join(codebase_path, relative_path)
+    try:
+        stat = os.stat(full_path)
+        with open(full_path, 'rb') as f:
+            return f.read(), stat
+    except Exception:
+        return None
+
+
+def scan_file(codebase_path: str, relative_path: str) -> Optional[Dict[str, Any]]:
+    """Read and tokenize one file into its document record and term positions"""
+    source = read_file(codebase_path, relative_path)
+    if source is None:
+        return None
+    return scan_source(relative_path, *source)
+
+
+def scan_source(relative_path: str, raw: bytes, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+    """Tokenize file contents into the document record and term positions
+
+    Positions are 1-based line numbers, one entry per occurrence.
+    """
+    try:
+        content = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+    terms: Dict[str, List[int]] = {}
+    fields: Dict[str, Dict[str, int]] = {SYMBOL_FIELD: {}, DOCSTRING_FIELD: {}}
+    lengths = {"body": 0, SYMBOL_FIELD: 0, DOCSTRING_FIELD: 0}
+    open_quote = None
+
+    for line_number, line in enumerate(content.splitlines(), 1):
+        tokens = tokenize(line)
+        for token in tokens:
+            terms.setdefault(token, []).append(line_number)
+        lengths["body"] += len(tokens)
+
+        # Line-level field detection: definitions and triple-quoted blocks
+        field_tokens = []
+        symbol = SYMBOL_PATTERN.match(line)
+        if symbol:
+            field_tokens.append((SYMBOL_FIELD, tokenize(symbol.group(1))))
+
+        stripped = line.strip()
+        if open_quote is None:
+            for quote in DOCSTRING_QUOTES:
+                if stripped.startswith(quote):
+                    field_tokens.append((DOCSTRING_FIELD, tokens))
+                    if stripped.count(quote) == 1:
+                        open_quote = quote
+                    break
+        else:
+            field_tokens.append((DOCSTRING_FIELD, tokens))
+            if open_quote in stripped:
+                open_quote = None
+
+        for field, field_terms in field_tokens:
+            for token in field_terms:
+                fields[field][token] = fields[field].get(token, 0) + 1
+            lengths[field] += len(field_terms)
+
+    return {
+        "document": {
+            "path": relative_path,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "hash": content_hash(raw),
+            "lengths": lengths
+        },
+        "terms": terms,
+        "fields": fields
+    }
+
+
+def _without_docs(postings: Mapping, doc_ids: set, terms: Optional[Iterable[str]] = None) -> MutableMapping:
+    """Shallow copy of `postings` with `doc_ids` removed from the affected terms
+
+    Mapped tables become a copy-on-write overlay, and their per-document
+    term lists name the affected terms, so no other posting list is decoded.
+    In-memory tables are scanned unless the affected `terms` are given.
+    """
+    if isinstance(postings, dict):
+        result = dict(postings)
+    else:
+        result = PostingsOverlay(postings)
+        if terms is None:
+            terms = postings.terms_of(doc_ids)
+        for doc_id in doc_ids:
+            result.doc_terms[doc_id] = []
+    if not doc_ids:
+        return result
+    if terms is None:
+        terms = [term for term, docs in postings.items() if any(doc_id in docs for doc_id in doc_ids)]
+
+    for term in terms:
+        docs = postings.get(term)
+        if docs is None:
+            continue
+        if isinstance(docs, list):
+            kept = [doc_id for doc_id in docs if doc_id not in doc_ids]
+        else:
+            kept = {doc_id: value for doc_id, value in docs.items() if doc_id not in doc_ids}
+        if kept:
+            result[term] = kept
+        else:
+            del result[term]
+    return result
+
+
+def _add_doc(postings: MutableMapping, doc_id: int, values: Dict[str, Any]):
+    """Add one document's entries without mutating posting dicts shared with older indexes"""
+    for term, value in values.items():
+        docs = postings.get(term)
+        postings[term] = {**docs, doc_id: value} if docs else {doc_id: value}
+    if isinstance(postings, PostingsOverlay):
+        postings.doc_terms[doc_id] = list(values)
+
+
+class CodebaseIndex:
+    """Persistent inverted index over a codebase: token -> file -> line positions
+
+    Paths are indexed separately from contents so path and content matches can
+    be weighted differently. Keyword lookups match exact tokens and token
+    prefixes through a sorted term dictionary, so their cost depends on the
+    number of keywords rather than the size of the repository.
+
+    Instances are never mutated once built: `refresh` returns a new index, so
+    callers holding a reference always see a consistent snapshot.
+    """
+
+    def __init__(self, codebase_path: str, documents: List[Optional[Dict[str, Any]]],
+                 postings: Dict[str, Dict[int, List[int]]],
+                 path_postings: Dict[str, List[int]],
+                 field_postings: Optional[Dict[str, Dict[str, Dict[int, int]]]] = None,
+                 mapped: Optional[MappedIndexFile] = None):
+        self.codebase_path = codebase_path
+        # Removed files leave a None tombstone so other doc ids stay stable
+        self.documents = documents
+        self.postings = postings
+        self.path_postings = path_postings
+        # field -> term -> doc_id -> term frequency, for symbols and docstrings
+        self.field_postings = field_postings or {SYMBOL_FIELD: {}, DOCSTRING_FIELD: {}}
+        self._sorted_terms: Optional[Sequence[str]] = None
+        self._sorted_path_terms: Optional[Sequence[str]] = None
+        # The memory-mapped file the tables read from, if loaded from disk
+        self.mapped = mapped
+        self._fingerprint: Optional[str] = None
+
+    @classmethod
+    def from_scans(cls, codebase_path: str, scans: Iterable[Optional[Dict[str, Any]]]) -> "CodebaseIndex":
+        """Merge per-file scan results into one index"""
+        documents = []
+        postings: Dict[str, Dict[int, List[int]]] = {}
+        path_postings: Dict[str, List[int]] = {}
+        field_postings: Dict[str, Dict[str, Dict[int, int]]] = {SYMBOL_FIELD: {}, DOCSTRING_FIELD: {}}
+
+        for scan in scans:
+            if scan is None:
+                continue
+            doc_id = len(documents)
+            documents.append(scan["document"])
+            for term, lines in scan["terms"].items():
+                postings.setdefault(term, {})[doc_id] = lines
+            for term in set(tokenize(scan["document"]["path"])):
+                path_postings.setdefault(term, []).append(doc_id)
+            for field, frequencies in scan["fields"].items():
+                for term, frequency in frequencies.items():
+                    field_postings[field].setdefault(term, {})[doc_id] = frequency
+
+        return cls(codebase_path, documents, postings, path_postings, field_postings)
+
+    @classmethod
+    def build(cls, codebase_path: str) -> "CodebaseIndex":
+        """Scan every Python file in the codebase across worker processes"""
+        # Imported here: the scanner builds on this module
+        from services.parallel_scan import build_indexes
+
+        index, _, _ = build_indexes(codebase_path, symbols=False)
+        return index
+
+    @classmethod
+    def merge(cls, codebase_path: str, partials: Iterable["CodebaseIndex"]) -> "CodebaseIndex":
+        """Concatenate indexes built over disjoint file shards, renumbering doc ids"""
+        documents: List[Optional[Dict[str, Any]]] = []
+        postings: Dict[str, Dict[int, List[int]]] = {}
+        path_postings: Dict[str, List[int]] = {}
+        field_postings: Dict[str, Dict[str, Dict[int, int]]] = {SYMBOL_FIELD: {}, DOCSTRING_FIELD: {}}
+
+        for partial in partials:
+            offset = len(documents)
+            documents.extend(partial.documents)
+            for term, docs in partial.postings.items():
+                target = postings.setdefault(term, {})
+                for doc_id, lines in docs.items():
+                    target[doc_id + offset] = lines
+            for term, docs in partial.path_postings.items():
+                path_postings.setdefault(term, []).extend(doc_id + offset for doc_id in docs)
+            for field, field_terms in partial.field_postings.items():
+                for term, docs in field_terms.items():
+                    target = field_postings[field].setdefault(term, {})
+                    for doc_id, frequency in docs.items():
+                        target[doc_id + offset] = frequency
+
+        return cls(codebase_path, documents, postings, path_postings, field_postings)
+
+    def save(self, index_dir: Optional[str] = None) -> str:
+        """Write the index atomically to `index_dir` and return the file path"""
+        index_dir = index_dir or index_dir_for(self.codebase_path)
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, TEXT_INDEX_FILENAME)
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        write_index_file(
+            temp_path,
+            INDEX_FORMAT_VERSION,
+            self.documents,
+            {
+                "body": (LINES, self.postings),
+                "path": (IDS, self.path_postings),
+                **{field: (COUNTS, field_terms) for field, field_terms in self.field_postings.items()}
+            },
+            length_fields=["body", SYMBOL_FIELD, DOCSTRING_FIELD],
+            metadata={"codebase_path": self.codebase_path}
+        )
+        os.replace(temp_path, path)
+
+        legacy_path = os.path.join(index_dir, LEGACY_TEXT_INDEX_FILENAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        return path
+
+    @classmethod
+    def load(cls, codebase_path: str, index_dir: Optional[str] = None) -> Optional["CodebaseIndex"]:
+        """Open a persisted index memory-mapped, or None if it is missing, outdated or corrupt
+
+        Postings and document records are read from the mapped file on
+        access instead of being deserialized up front; the checksum is
+        verified on open unless CODEBASE_INDEX_VERIFY is false.
+        """
+        path = os.path.join(index_dir or index_dir_for(codebase_path), TEXT_INDEX_FILENAME)
+        if not os.path.exists(path):
+            return None
+        try:
+            mapped = MappedIndexFile(path, INDEX_FORMAT_VERSION, verify=env_flag("CODEBASE_INDEX_VERIFY", True))
+        except Exception as e:
+            print(f"Ignoring codebase index {path}: {str(e)}")
+            return None
+
+        field_postings = {field: mapped.tables[field] for field in (SYMBOL_FIELD, DOCSTRING_FIELD)}
+        return cls(codebase_path, mapped.documents, mapped.tables["body"], mapped.tables["path"], field_postings, mapped)
+
+    @classmethod
+    def load_or_build(cls, codebase_path: str, index_dir: Optional[str] = None) -> "CodebaseIndex":
+        index = cls.load(codebase_path, index_dir)
+        if index is None:
+            index = cls.build(codebase_path)
+            try:
+                index.save(index_dir)
+            except Exception as e:
+                print(f"Failed to persist codebase index: {str(e)}")
+        return index
+
+    def refresh(self) -> Tuple["CodebaseIndex", Dict[str, Any]]:
+        """Re-tokenize only added, changed or removed files
+
+        Files whose mtime and size are unchanged are skipped; otherwise a
+        blake2 content hash decides whether the file really changed. Returns
+        the new index (or this one if nothing changed) and refresh stats.
+        """
+        started = time.perf_counter()
+        current_paths = walk_python_files(self.codebase_path)
+        known = {doc["path"]: doc_id for doc_id, doc in enumerate(self.documents) if doc is not None}
+
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0, "touched": 0}
+        documents = list(self.documents)
+        stale_ids = set()
+        scans: Dict[int, Dict[str, Any]] = {}
+
+        for relative_path in current_paths:
+            doc_id = known.pop(relative_path, None)
+            if doc_id is not None:
+                doc = documents[doc_id]
+                try:
+                    stat = os.stat(os.path.join(self.codebase_path, relative_path))
+                except OSError:
+                    known[relative_path] = doc_id
+                    continue
+                if stat.st_mtime == doc["mtime"] and stat.st_size == doc["size"]:
+                    stats["unchanged"] += 1
+                    continue
+
+            scan = scan_file(self.codebase_path, relative_path)
+            if doc_id is None:
+                if scan is not None:
+                    scans[len(documents)] = scan
+                    documents.append(scan["document"])
+                    stats["added"] += 1
+            elif scan is None:
+                known[relative_path] = doc_id
+            elif scan["document"]["hash"] == documents[doc_id].get("hash"):
+                # Touched but identical: only the metadata moves forward
+                documents[doc_id] = scan["document"]
+                stats["touched"] += 1
+            else:
+                stale_ids.add(doc_id)
+                scans[doc_id] = scan
+                documents[doc_id] = scan["document"]
+                stats["changed"] += 1
+
+        # Anything left in `known` no longer exists on disk
+        for doc_id in known.values():
+            stale_ids.add(doc_id)
+            documents[doc_id] = None
+            stats["removed"] += 1
+
+        if not scans and not stale_ids:
+            if stats["touched"]:
+                refreshed = CodebaseIndex(self.codebase_path, documents, self.postings,
+                                          self.path_postings, self.field_postings)
+            else:
+                refreshed = self
+        else:
+            # Copy-on-write: only posting lists that reference stale docs are rebuilt
+            postings = _without_docs(self.postings, stale_ids)
+            field_postings = {
+                field: _without_docs(field_terms, stale_ids)
+                for field, field_terms in self.field_postings.items()
+            }
+            stale_path_terms = {term for doc_id in stale_ids for term in tokenize(self.documents[doc_id]["path"])}
+            path_postings = _without_docs(self.path_postings, stale_ids, stale_path_terms)
+
+            for doc_id, scan in scans.items():
+                _add_doc(postings, doc_id, scan["terms"])
+                for field, frequencies in scan["fields"].items():
+                    _add_doc(field_postings[field], doc_id, frequencies)
+                path_terms = set(tokenize(scan["document"]["path"]))
+                for term in path_terms:
+                    path_postings[term] = sorted(path_postings.get(term, []) + [doc_id])
+                if isinstance(path_postings, PostingsOverlay):
+                    path_postings.doc_terms[doc_id] = list(path_terms)
+
+            refreshed = CodebaseIndex(self.codebase_path, documents, postings, path_postings, field_postings)
+            tombstones = sum(1 for doc in documents if doc is None)
+            if documents and tombstones / len(documents) > COMPACT_TOMBSTONE_RATIO:
+                refreshed = refreshed.compact()
+
+        stats["seconds"] = round(time.perf_counter() - started, 4)
+        return refreshed, stats
+
+    def compact(self) -> "CodebaseIndex":
+        """Drop tombstones and renumber documents"""
+        remap = {}
+        documents = []
+        for doc_id, doc in enumerate(self.documents):
+            if doc is not None:
+                remap[doc_id] = len(documents)
+                documents.append(doc)
+
+        postings = {
+            term: {remap[doc_id]: lines for doc_id, lines in docs.items() if doc_id in remap}
+            for term, docs in self.postings.items()
+        }
+        path_postings = {
+            term: [remap[doc_id] for doc_id in docs if doc_id in remap]
+            for term, docs in self.path_postings.items()
+        }
+        field_postings = {
+            field: {
+                term: {remap[doc_id]: frequency for doc_id, frequency in docs.items() if doc_id in remap}
+                for term, docs in field_terms.items()
+            }
+            for field, field_terms in self.field_postings.items()
+        }
+        return CodebaseIndex(self.codebase_path, documents, postings, path_postings, field_postings)
+
+    @property
+    def _terms(self) -> Sequence[str]:
+        """Sorted content terms, built on the first prefix lookup"""
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted_terms(self.postings)
+        return self._sorted_terms
+
+    @property
+    def _path_terms(self) -> Sequence[str]:
+        if self._sorted_path_terms is None:
+            self._sorted_path_terms = sorted_terms(self.path_postings)
+        return self._sorted_path_terms
+
+    def fingerprint(self) -> str:
+        """Digest of the indexed paths and content hashes, identifying this revision of the codebase"""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for doc in self.documents:
+                if doc is not None:
+                    digest.update(f"{doc['path']}\0{doc['hash']}\n".encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def close(self):
+        """Unmap the index file; refreshed indexes built on top of it become unusable too"""
+        if self.mapped is not None:
+            self.mapped.close()
+
+    def path_of(self, doc_id: int) -> str:
+        return self.documents[doc_id]["path"]
+
+    @staticmethod
+    def _expand(terms: Sequence[str], token: str) -> List[str]:
+        """Exact term plus every term it is a prefix of"""
+        matches = []
+        for i in range(bisect.bisect_left(terms, token), len(terms)):
+            term = terms[i]
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def content_matches(self, keyword: str, max_line: Optional[int] = None) -> Dict[int, int]:
+        """Documents whose content contains the keyword, with occurrence counts
+
+        Multi-word keywords require every word to appear. `max_line` restricts
+        matches to the first lines of each file.
+        """
+        result: Optional[Dict[int, int]] = None
+        for token in set(tokenize(keyword)):
+            counts: Dict[int, int] = {}
+            for term in self._expand(self._terms, token):
+                for doc_id, lines in self.postings[term].items():
+                    hits = len(lines) if max_line is None else bisect.bisect_right(lines, max_line)
+                    if hits:
+                        counts[doc_id] = counts.get(doc_id, 0) + hits
+            result = counts if result is None else {
+                doc_id: min(count, counts[doc_id]) for doc_id, count in result.items() if doc_id in counts
+            }
+        return result or {}
+
+    def path_matches(self, keyword: str) -> set:
+        """Documents whose relative path contains the keyword"""
+        result: Optional[set] = None
+        for token in set(tokenize(keyword)):
+            docs = set()
+            for term in self._expand(self._path_terms, token):
+                docs.update(self.path_postings[term])
+            result = docs if result is None else result & docs
+        return result or set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": sum(1 for doc in self.documents if doc is not None),
+            "terms": len(self.postings),
+            "path_terms": len(self.path_postings),
+            **{f"{field}_terms": len(field_terms) for field, field_terms in self.field_postings.items()}
+        }
+
+
+def benchmark(codebase_path: str, keywords: List[str], repeat: int = 5) -> Dict[str, float]:
+    """Compare a full rescan (os.walk + read + substring) with index lookups"""
+    def rescan():
+        scores = {}
+        for relative_path in walk_python_files(codebase_path):
+            try:
+                with open(os.path.join(codebase_path, relative_path), 'r', encoding='utf-8') as f:
+                    content_sample = ' '.join(f.readlines()[:30]).lower()
+            except Exception:
+                continue
+            score = sum(2 for keyword in keywords if keyword in content_sample)
+            score += sum(5 for keyword in keywords if keyword in relative_path.lower())
+            if score:
+                scores[relative_path] = score
+        return scores
+
+    def lookup():
+        scores: Dict[int, int] = {}
+        for keyword in keywords:
+            for doc_id in index.content_matches(keyword, max_line=30):
+                scores[doc_id] = scores.get(doc_id, 0) + 2
+            for doc_id in index.path_matches(keyword):
+                scores[doc_id] = scores.get(doc_id, 0) + 5
+        return scores
+
+    started = time.perf_counter()
+    index = CodebaseIndex.build(codebase_path)
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rescan()
+    rescan_seconds = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        lookup()
+    lookup_seconds = (time.perf_counter() - started) / repeat
+
+    return {
+        "files": len(index.documents),
+        "build_seconds": round(build_seconds, 4),
+        "rescan_seconds": round(rescan_seconds, 4),
+        "index_lookup_seconds": round(lookup_seconds, 6),
+        "speedup": round(rescan_seconds / lookup_seconds, 1) if lookup_seconds else float("inf")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, refresh or benchmark the codebase index")
+    parser.add_argument("command", choices=["build", "refresh", "benchmark"])
+    parser.add_argument("--codebase", required=True, help="Path to the codebase to index")
+    parser.add_argument("--index-dir", help="Where to store the index (default: CODEBASE_INDEX_DIR)")
+    parser.add_argument("--keywords", default="agent,server,tool,async,response,security",
+                        help="Comma-separated keywords for the benchmark")
+    parser.add_argument("--repeat", type=int, default=env_int("CODEBASE_INDEX_BENCH_REPEAT", 5))
+    parser.add_argument("--workers", type=int, help="Scanner processes (default: INDEX_BUILD_WORKERS or CPU count)")
+    parser.add_argument("--chunk-size", type=int, help="Files per scanner task (default: INDEX_BUILD_CHUNK_SIZE or 64)")
+    args = parser.parse_args()
+
+    # Imported here: the symbol index and scanner build on this module
+    from services.symbol_index import SymbolIndex
+    from services.parallel_scan import build_indexes
+
+    existing = CodebaseIndex.load(args.codebase, args.index_dir) if args.command == "refresh" else None
+    symbols = SymbolIndex.load(args.codebase, args.index_dir) if args.command == "refresh" else None
+    if existing is not None:
+        index, stats = existing.refresh()
+        print(f"Refreshed index: {json.dumps(stats)}")
+        print(f"Saved index to {index.save(args.index_dir)}")
+        symbols = symbols.sync(index) if symbols is not None else SymbolIndex.build(args.codebase)
+        print(f"Saved symbol index to {symbols.save(args.index_dir)}")
+    elif args.command in ("build", "refresh"):
+        index, symbols, stats = build_indexes(args.codebase, workers=args.workers, chunk_size=args.chunk_size)
+        print(json.dumps(stats, indent=2))
+        print(f"Saved index to {index.save(args.index_dir)}")
+        print(f"Saved symbol index to {symbols.save(args.index_dir)}")
+    else:
+        keywords = [k.strip().lower() for k in args.keywords.split(",") if k.strip()]
+        print(json.dumps(benchmark(args.codebase, keywords, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
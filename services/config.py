@@ -0,0 +1,27 @@
+import os
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        print(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        print(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """Read a boolean setting from the environment"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
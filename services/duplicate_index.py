@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Set
+
+from models.issue import GitHubIssue
+from services.config import env_int, env_float
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Mersenne prime for the universal hash permutations; values stay below 2**62
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_SIZE = 5
+PERMUTATION_SEED = 1
+# Counting the stored issues is linear, so the size bound is checked every this many writes
+EVICTION_CHECK_INTERVAL = 256
+
+
+def normalize_issue_text(issue: GitHubIssue) -> str:
+    """Lowercased title and body with punctuation and whitespace runs collapsed"""
+    text = f"{issue.title}\n{issue.body or ''}".lower()
+    return " ".join(re.sub(r"[^a-z0-9_]+", " ", text).split())
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """CRC32 hashes of the character n-grams of the text"""
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8")) & MERSENNE_PRIME} if text else set()
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) & MERSENNE_PRIME for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures: the minimum of `num_perm` universal hashes over a shingle set
+
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of their shingle sets. Permutations come from a fixed seed so
+    signatures stay comparable across processes and restarts.
+    """
+
+    def __init__(self, num_perm: int):
+        self.num_perm = num_perm
+        self.a: List[int] = []
+        self.b: List[int] = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"minhash:{PERMUTATION_SEED}:{i}".encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            self.a.append(1 + (value >> 32) % (MERSENNE_PRIME - 1))
+            self.b.append((value & 0xFFFFFFFF) % MERSENNE_PRIME)
+        if NUMPY_AVAILABLE:
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+
+    def signature(self, values: Set[int]) -> List[int]:
+        if not values:
+            return [MERSENNE_PRIME] * self.num_perm
+        if NUMPY_AVAILABLE:
+            x = np.fromiter(values, dtype=np.uint64, count=len(values))[None, :]
+            return ((self._a * x + self._b) % MERSENNE_PRIME).min(axis=1).tolist()
+        return [min((a * x + b) % MERSENNE_PRIME for x in values) for a, b in zip(self.a, self.b)]
+
+
+def estimate_similarity(first: List[int], second: List[int]) -> float:
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+@dataclass
+class DuplicateMatch:
+    """A previously analyzed issue whose text is a near-duplicate of the query"""
+    key: str
+    github_url: str
+    title: str
+    similarity: float
+    analysis_data: Dict[str, Any]
+
+    def summary(self, reused_analysis: bool) -> Dict[str, Any]:
+        return {
+            "issue": self.key,
+            "github_url": self.github_url,
+            "title": self.title,
+            "similarity": round(self.similarity, 3),
+            "reused_analysis": reused_analysis
+        }
+
+
+class DuplicateIssueIndex:
+    """Persistent MinHash LSH index of analyzed issues and their analysis
+
+    Signatures are split into `bands`; issues sharing any band bucket are
+    candidates, so a lookup is one indexed query per band no matter how many
+    issues are stored, and only the few candidates have their signatures
+    compared. Buckets are scoped to the repository, since an analysis only
+    applies to its own codebase. With b bands of r rows, pairs above about
+    (1/b)**(1/r) Jaccard similarity become candidates.
+    """
+
+    def __init__(self, path: Optional[str] = None, num_perm: Optional[int] = None,
+                 bands: Optional[int] = None, threshold: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.path = path or os.getenv("DUPLICATE_INDEX_PATH", ".cache/duplicate_issues.sqlite3")
+        num_perm = num_perm if num_perm is not None else env_int("DUPLICATE_NUM_PERM", 128)
+        self.bands = max(1, bands if bands is not None else env_int("DUPLICATE_LSH_BANDS", 32))
+        self.rows = max(1, num_perm // self.bands)
+        self.hasher = MinHasher(self.bands * self.rows)
+        self.threshold = threshold if threshold is not None else env_float("DUPLICATE_THRESHOLD", 0.7)
+        self.max_entries = max_entries if max_entries is not None else env_int("DUPLICATE_MAX_ENTRIES", 500000)
+        self._signature = struct.Struct(f"<{self.hasher.num_perm}I")
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "matches": 0, "candidates": 0, "writes": 0, "evictions": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS issues (
+                    key TEXT PRIMARY KEY,
+                    repo TEXT NOT NULL,
+                    github_url TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    num_perm INTEGER NOT NULL,
+                    signature BLOB NOT NULL,
+                    analysis_json TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    bucket INTEGER NOT NULL,
+                    key TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket)")
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets (key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS issues_created_at ON issues (created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def signature(self, issue: GitHubIssue) -> List[int]:
+        return self.hasher.signature(shingles(normalize_issue_text(issue)))
+
+    def band_buckets(self, repo: str, signature: List[int]) -> List[int]:
+        """Signed 64-bit bucket id per band, scoped to the repository and signature layout"""
+        buckets = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(
+                f"{repo}|{self.hasher.num_perm}|{band}|{','.join(map(str, rows))}".encode(), digest_size=8
+            ).digest()
+            buckets.append(int.from_bytes(digest, "little", signed=True))
+        return buckets
+
+    def find(self, repo: str, issue: GitHubIssue, exclude: Optional[str] = None) -> Optional[DuplicateMatch]:
+        """Most similar stored issue of the repo at or above the threshold, if any"""
+        signature = self.signature(issue)
+        buckets = self.band_buckets(repo, signature)
+        self._count("lookups")
+
+        with closing(self._connect()) as conn:
+            placeholders = ",".join("?" * len(buckets))
+            keys = {row[0] for row in conn.execute(
+                f"SELECT DISTINCT key FROM buckets WHERE bucket IN ({placeholders})", buckets
+            )}
+            keys.discard(exclude)
+            if not keys:
+                return None
+            self._count("candidates", len(keys))
+
+            best = None
+            for key, github_url, title, num_perm, blob in conn.execute(
+                f"SELECT key, github_url, title, num_perm, signature FROM issues WHERE key IN ({','.join('?' * len(keys))})",
+                list(keys)
+            ):
+                if num_perm != self.hasher.num_perm:
+                    continue
+                similarity = estimate_similarity(signature, list(self._signature.unpack(blob)))
+                if similarity >= self.threshold and (best is None or similarity > best[0]):
+                    best = (similarity, key, github_url, title)
+            if best is None:
+                return None
+            analysis_json = conn.execute("SELECT analysis_json FROM issues WHERE key = ?", (best[1],)).fetchone()[0]
+
+        self._count("matches")
+        return DuplicateMatch(
+            key=best[1],
+            github_url=best[2],
+            title=best[3],
+            similarity=best[0],
+            analysis_data=json.loads(analysis_json)
+        )
+
+    def add(self, key: str, repo: str, github_url: str, issue: GitHubIssue, analysis_data: Dict[str, Any]):
+        """Store an issue's signature and analysis, replacing an earlier revision of it"""
+        signature = self.signature(issue)
+        buckets = self.band_buckets(repo, signature)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM buckets WHERE key = ?", (key,))
+            conn.execute(
+                """INSERT OR REPLACE INTO issues
+                   (key, repo, github_url, title, num_perm, signature, analysis_json, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, repo, github_url, issue.title, self.hasher.num_perm, self._signature.pack(*signature),
+                 json.dumps(analysis_data, default=str), time.time())
+            )
+            conn.executemany("INSERT INTO buckets (bucket, key) VALUES (?, ?)", [(bucket, key) for bucket in buckets])
+
+            if self.max_entries > 0 and self._counters["writes"] % EVICTION_CHECK_INTERVAL == 0:
+                excess = conn.execute("SELECT COUNT(*) FROM issues").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    oldest = [row[0] for row in conn.execute(
+                        "SELECT key FROM issues ORDER BY created_at LIMIT ?", (excess,)
+                    )]
+                    conn.executemany("DELETE FROM buckets WHERE key = ?", [(old,) for old in oldest])
+                    conn.executemany("DELETE FROM issues WHERE key = ?", [(old,) for old in oldest])
+                    self._count("evictions", len(oldest))
+        self._count("writes")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        try:
+            with closing(self._connect()) as conn:
+                entries = conn.execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {
+            "enabled": True,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "num_perm": self.hasher.num_perm,
+            "bands": self.bands,
+            "rows": self.rows,
+            "threshold": self.threshold,
+            **counters
+        }
@@ -1,8 +1,20 @@
+import asyncio
 import httpx
 import os
 import re
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, AsyncIterator
 from models.issue import GitHubIssue, GitHubUser, GitHubLabel, GitHubComment
+from services.config import env_int, env_flag
+from services.http_client import github_client_session
+from services.issue_cache import IssueCache, CachedIssue
+from services.rate_limiter import GitHubRateLimiter
+
+# GitHub's maximum page size for list endpoints
+COMMENTS_PER_PAGE = 100
+
+# Characters GitHub allows in owner and repository names
+GITHUB_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
 
 try:
     import upsonic
@@ -10,40 +22,317 @@ try:
 except ImportError:
     UPSONIC_AVAILABLE = False
 
+
+async def gather_or_cancel(*awaitables):
+    """Run awaitables concurrently, cancelling the others as soon as one fails"""
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def is_github_name(name: Optional[str]) -> bool:
+    """Whether `name` is a valid GitHub owner or repository name (never `.` or `..`)"""
+    return bool(name) and name not in (".", "..") and GITHUB_NAME_PATTERN.match(name) is not None
+
+
+def parse_github_url(url: str) -> tuple[str, str, int]:
+    """Parse GitHub URL to extract owner, repo, and issue number"""
+    pattern = r"https://github\.com/([^/]+)/([^/]+)/issues/(\d+)"
+    match = re.match(pattern, url)
+    if not match:
+        raise ValueError("Invalid GitHub issue URL format")
+
+    owner, repo, issue_number = match.groups()
+    if not (is_github_name(owner) and is_github_name(repo)):
+        raise ValueError("Invalid GitHub owner or repository name")
+    return owner, repo, int(issue_number)
+
+
+def parse_link_header(value: Optional[str]) -> Dict[str, str]:
+    """Parse a GitHub `Link` header into a rel -> URL mapping"""
+    links = {}
+    for part in (value or "").split(","):
+        match = re.match(r'\s*<([^>]+)>\s*;\s*rel="([^"]+)"', part)
+        if match:
+            links[match.group(2)] = match.group(1)
+    return links
+
+
+async def iter_raw_comments(client: httpx.AsyncClient, comments_url: str, headers: Dict[str, str],
+                            max_comments: Optional[int] = None, max_bytes: Optional[int] = None,
+                            page_concurrency: int = 4) -> AsyncIterator[Dict[str, Any]]:
+    """Stream raw comment JSON across all pages of an issue's comments
+
+    The first page is fetched alone; once its `Link: rel="last"` header reveals
+    the page count, the remaining pages are requested concurrently and yielded
+    in order. Iteration stops at `max_comments` comments or `max_bytes` of
+    comment bodies, and closing the generator early cancels pending pages.
+    """
+    if max_comments is not None and max_comments <= 0:
+        return
+
+    per_page = min(COMMENTS_PER_PAGE, max_comments) if max_comments else COMMENTS_PER_PAGE
+    semaphore = asyncio.Semaphore(max(1, page_concurrency))
+
+    async def get_page(url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        async with semaphore:
+            response = await client.get(url, headers=headers, params=params)
+        response.raise_for_status()
+        return response
+
+    yielded = 0
+    used_bytes = 0
+    pending: List[asyncio.Task] = []
+    try:
+        response = await get_page(comments_url, {"per_page": per_page, "page": 1})
+        links = parse_link_header(response.headers.get("link"))
+
+        if "last" in links:
+            last_url = httpx.URL(links["last"])
+            last_page = int(last_url.params.get("page", 1))
+            if max_comments:
+                last_page = min(last_page, -(-max_comments // per_page))
+            pending = [
+                asyncio.ensure_future(get_page(str(last_url.copy_set_param("page", page))))
+                for page in range(2, last_page + 1)
+            ]
+
+        while True:
+            for comment in response.json():
+                size = len((comment.get("body") or "").encode("utf-8"))
+                if max_bytes is not None and used_bytes + size > max_bytes:
+                    return
+                used_bytes += size
+                yielded += 1
+                yield comment
+                if max_comments is not None and yielded >= max_comments:
+                    return
+
+            if pending:
+                response = await pending.pop(0)
+            elif "last" not in links and "next" in links:
+                # No page count available, fall back to following `next`
+                response = await get_page(links["next"])
+                links = parse_link_header(response.headers.get("link"))
+            else:
+                return
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def get_issue_response(client: httpx.AsyncClient, issue_url: str,
+                             headers: Dict[str, str]) -> httpx.Response:
+    """GET an issue, raising for errors but passing 304 Not Modified through"""
+    response = await client.get(issue_url, headers=headers)
+    if response.status_code != 304:
+        response.raise_for_status()
+    return response
+
+
+async def collect_comments(client: httpx.AsyncClient, comments_url: str, headers: Dict[str, str],
+                           max_comments: Optional[int] = None,
+                           max_bytes: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Gather raw comment JSON up to the given caps"""
+    return [
+        comment async for comment in iter_raw_comments(
+            client, comments_url, headers, max_comments, max_bytes
+        )
+    ]
+
+
+async def fetch_issue_payload(client: httpx.AsyncClient, base_url: str, headers: Dict[str, str],
+                              owner: str, repo: str, issue_number: int,
+                              max_comments: Optional[int] = None,
+                              max_bytes: Optional[int] = None) -> tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Fetch raw issue and comments JSON concurrently"""
+    issue_url = f"{base_url}/repos/{owner}/{repo}/issues/{issue_number}"
+    issue_response, comments_data = await gather_or_cancel(
+        get_issue_response(client, issue_url, headers),
+        collect_comments(client, f"{issue_url}/comments", headers, max_comments, max_bytes)
+    )
+    return issue_response.json(), comments_data
+
+
+def parse_user(user_data: Dict[str, Any]) -> GitHubUser:
+    """Convert GitHub user JSON to our model"""
+    return GitHubUser(
+        login=user_data["login"],
+        id=user_data["id"],
+        avatar_url=user_data["avatar_url"],
+        html_url=user_data["html_url"]
+    )
+
+
+def parse_comment(comment: Dict[str, Any]) -> GitHubComment:
+    """Convert GitHub comment JSON to our model"""
+    return GitHubComment(
+        id=comment["id"],
+        user=parse_user(comment["user"]),
+        body=comment["body"],
+        created_at=comment["created_at"],
+        updated_at=comment["updated_at"]
+    )
+
+
+def parse_issue(issue_data: Dict[str, Any], comments: List[GitHubComment]) -> GitHubIssue:
+    """Convert GitHub issue JSON and parsed comments to our model"""
+    labels = [
+        GitHubLabel(
+            name=label["name"],
+            color=label["color"],
+            description=label.get("description")
+        ) for label in issue_data.get("labels", [])
+    ]
+
+    return GitHubIssue(
+        id=issue_data["id"],
+        number=issue_data["number"],
+        title=issue_data["title"],
+        body=issue_data.get("body"),
+        user=parse_user(issue_data["user"]),
+        labels=labels,
+        state=issue_data["state"],
+        created_at=issue_data["created_at"],
+        updated_at=issue_data["updated_at"],
+        html_url=issue_data["html_url"],
+        comments=comments
+    )
+
+
+# Issue, labels, author and the first N comments in a single round trip
+ISSUE_GRAPHQL_QUERY = """
+query($owner: String!, $repo: String!, $number: Int!, $comments: Int!) {
+  repository(owner: $owner, name: $repo) {
+    issue(number: $number) {
+      databaseId
+      number
+      title
+      body
+      state
+      createdAt
+      updatedAt
+      url
+      author { ...ActorFields }
+      labels(first: 100) { nodes { name color description } }
+      comments(first: $comments) {
+        nodes { databaseId body createdAt updatedAt author { ...ActorFields } }
+      }
+    }
+  }
+}
+
+fragment ActorFields on Actor {
+  login
+  avatarUrl
+  url
+  ... on User { databaseId }
+  ... on Bot { databaseId }
+  ... on Mannequin { databaseId }
+  ... on Organization { databaseId }
+}
+"""
+
+# GraphQL connections return at most 100 nodes per page
+GRAPHQL_MAX_COMMENTS = 100
+
+
+class GitHubGraphQLError(Exception):
+    """Raised when the GraphQL API returns errors or no issue"""
+
+
+def parse_graphql_user(actor: Optional[Dict[str, Any]]) -> GitHubUser:
+    """Convert a GraphQL actor to our user model; deleted accounts map to `ghost`"""
+    if not actor:
+        return GitHubUser(login="ghost", id=0, avatar_url="", html_url="https://github.com/ghost")
+    return GitHubUser(
+        login=actor["login"],
+        id=actor.get("databaseId") or 0,
+        avatar_url=actor.get("avatarUrl", ""),
+        html_url=actor.get("url", "")
+    )
+
+
+def parse_graphql_issue(issue_node: Dict[str, Any], max_bytes: Optional[int] = None) -> GitHubIssue:
+    """Map a GraphQL issue node onto the REST-shaped GitHubIssue model"""
+    comments = []
+    used_bytes = 0
+    for node in (issue_node.get("comments") or {}).get("nodes") or []:
+        size = len((node.get("body") or "").encode("utf-8"))
+        if max_bytes is not None and used_bytes + size > max_bytes:
+            break
+        used_bytes += size
+        comments.append(GitHubComment(
+            id=node.get("databaseId") or 0,
+            user=parse_graphql_user(node.get("author")),
+            body=node.get("body") or "",
+            created_at=node["createdAt"],
+            updated_at=node["updatedAt"]
+        ))
+
+    labels = [
+        GitHubLabel(
+            name=label["name"],
+            color=label["color"],
+            description=label.get("description")
+        ) for label in (issue_node.get("labels") or {}).get("nodes") or []
+    ]
+
+    return GitHubIssue(
+        id=issue_node.get("databaseId") or 0,
+        number=issue_node["number"],
+        title=issue_node["title"],
+        body=issue_node.get("body"),
+        user=parse_graphql_user(issue_node.get("author")),
+        labels=labels,
+        state=issue_node["state"].lower(),
+        created_at=issue_node["createdAt"],
+        updated_at=issue_node["updatedAt"],
+        html_url=issue_node["url"],
+        comments=comments
+    )
+
+
 # Custom GitHub Tool for Upsonic
 class GitHubTool:
     """Custom tool for GitHub API operations"""
 
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.token = os.getenv("GITHUB_TOKEN")
         self.base_url = "https://api.github.com"
+        # Shared pooled client, normally injected by the app lifespan
+        self.client = client
+        self.max_comments = env_int("GITHUB_MAX_COMMENTS", 300)
+        self.max_comment_bytes = env_int("GITHUB_MAX_COMMENT_BYTES", 256 * 1024)
         self.headers = {
             "Authorization": f"Bearer {self.token}",
             "Accept": "application/vnd.github+json",
             "X-GitHub-Api-Version": "2022-11-28"
         }
 
+    def parse_github_url(self, url: str) -> tuple[str, str, int]:
+        """Parse GitHub URL to extract owner, repo, and issue number"""
+        return parse_github_url(url)
+
     async def fetch_github_issue(self, github_url: str) -> Dict[str, Any]:
         """Fetch GitHub issue data and return structured information"""
         try:
             owner, repo, issue_number = self.parse_github_url(github_url)
 
-            async with httpx.AsyncClient() as client:
-                # Fetch issue details
-                issue_response = await client.get(
-                    f"{self.base_url}/repos/{owner}/{repo}/issues/{issue_number}",
-                    headers=self.headers
+            async with github_client_session(self.client) as client:
+                # Fetch issue details and comments concurrently
+                issue_data, comments_data = await fetch_issue_payload(
+                    client, self.base_url, self.headers, owner, repo, issue_number,
+                    max_comments=self.max_comments,
+                    max_bytes=self.max_comment_bytes
                 )
-                issue_response.raise_for_status()
-                issue_data = issue_response.json()
-
-                # Fetch comments
-                comments_response = await client.get(
-                    f"{self.base_url}/repos/{owner}/{repo}/issues/{issue_number}/comments",
-                    headers=self.headers
-                )
-                comments_response.raise_for_status()
-                comments_data = comments_response.json()
 
                 return {
                     "issue": issue_data,
@@ -125,92 +414,123 @@ if UPSONIC_AVAILABLE:
 
 # Legacy GitHubService class for backward compatibility
 class GitHubService:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, cache: Optional[IssueCache] = None,
+                 rate_limiter: Optional[GitHubRateLimiter] = None):
         self.token = os.getenv("GITHUB_TOKEN")
         self.base_url = "https://api.github.com"
+        # Shared pooled client, normally injected by the app lifespan
+        self.client = client
+        # Central scheduler for every GitHub call made by this service
+        self.rate_limiter = rate_limiter or GitHubRateLimiter()
+        # Caps keep huge threads from blowing up memory or prompt size
+        self.max_comments = env_int("GITHUB_MAX_COMMENTS", 300)
+        self.max_comment_bytes = env_int("GITHUB_MAX_COMMENT_BYTES", 256 * 1024)
+        # "rest" (default) or "graphql"; can be overridden per request
+        self.fetch_mode = os.getenv("GITHUB_FETCH_MODE", "rest").lower()
         self.headers = {
             "Authorization": f"Bearer {self.token}",
             "Accept": "application/vnd.github+json",
             "X-GitHub-Api-Version": "2022-11-28"
         }
+        # Conditional-request cache; 304 responses are served from here
+        self.cache = cache
+        if self.cache is None and env_flag("GITHUB_CACHE_ENABLED", True):
+            try:
+                self.cache = IssueCache()
+            except Exception as e:
+                print(f"Issue cache unavailable: {str(e)}")
     
     def parse_github_url(self, url: str) -> tuple[str, str, int]:
         """Parse GitHub URL to extract owner, repo, and issue number"""
-        pattern = r"https://github\.com/([^/]+)/([^/]+)/issues/(\d+)"
-        match = re.match(pattern, url)
-        if not match:
-            raise ValueError("Invalid GitHub issue URL format")
-        
-        owner, repo, issue_number = match.groups()
-        return owner, repo, int(issue_number)
+        return parse_github_url(url)
     
-    async def fetch_issue(self, github_url: str) -> GitHubIssue:
-        """Fetch issue data from GitHub API"""
+    async def iter_comments(self, owner: str, repo: str, issue_number: int,
+                            max_comments: Optional[int] = None, max_bytes: Optional[int] = None,
+                            client: Optional[httpx.AsyncClient] = None) -> AsyncIterator[GitHubComment]:
+        """Stream an issue's comments page by page, stopping at the configured caps"""
+        async with github_client_session(client or self.client, self.rate_limiter) as session:
+            comments = iter_raw_comments(
+                session,
+                f"{self.base_url}/repos/{owner}/{repo}/issues/{issue_number}/comments",
+                self.headers,
+                max_comments=self.max_comments if max_comments is None else max_comments,
+                max_bytes=self.max_comment_bytes if max_bytes is None else max_bytes
+            )
+            try:
+                async for comment in comments:
+                    yield parse_comment(comment)
+            finally:
+                await comments.aclose()
+
+    async def fetch_comments(self, owner: str, repo: str, issue_number: int,
+                             max_comments: Optional[int] = None, max_bytes: Optional[int] = None,
+                             client: Optional[httpx.AsyncClient] = None) -> List[GitHubComment]:
+        """Gather an issue's comments from `iter_comments` up to the given caps"""
+        return [
+            comment async for comment in self.iter_comments(
+                owner, repo, issue_number, max_comments, max_bytes, client
+            )
+        ]
+
+    async def fetch_issue(self, github_url: str, max_comments: Optional[int] = None,
+                          max_bytes: Optional[int] = None, mode: Optional[str] = None) -> GitHubIssue:
+        """Fetch issue data from GitHub API
+
+        `max_comments` / `max_bytes` bound how much of the comment thread is
+        fetched; callers that only need a few comments can stop early. Cached
+        issues are revalidated with a conditional request and served from the
+        cache when GitHub answers 304 Not Modified. `mode` selects the "rest"
+        or "graphql" fetch path, defaulting to GITHUB_FETCH_MODE.
+        """
         try:
             owner, repo, issue_number = self.parse_github_url(github_url)
+            max_comments = self.max_comments if max_comments is None else max_comments
+            max_bytes = self.max_comment_bytes if max_bytes is None else max_bytes
+
+            started = time.perf_counter()
+            mode = (mode or self.fetch_mode).lower()
+            if mode == "graphql":
+                if self.token:
+                    return await self.fetch_issue_graphql(owner, repo, issue_number, max_comments, max_bytes)
+                print("GraphQL fetch requires GITHUB_TOKEN, falling back to REST")
+
+            issue_url = f"{self.base_url}/repos/{owner}/{repo}/issues/{issue_number}"
+
+            cached = await self._cache_lookup(owner, repo, issue_number, max_comments)
             
-            async with httpx.AsyncClient() as client:
-                # Fetch issue details
-                issue_response = await client.get(
-                    f"{self.base_url}/repos/{owner}/{repo}/issues/{issue_number}",
-                    headers=self.headers
-                )
-                issue_response.raise_for_status()
-                issue_data = issue_response.json()
-                
-                # Fetch comments
-                comments_response = await client.get(
-                    f"{self.base_url}/repos/{owner}/{repo}/issues/{issue_number}/comments",
-                    headers=self.headers
-                )
-                comments_response.raise_for_status()
-                comments_data = comments_response.json()
+            async with github_client_session(self.client, self.rate_limiter) as client:
+                if cached:
+                    # Revalidate first; comments only change along with the issue
+                    issue_response = await get_issue_response(
+                        client, issue_url, {**self.headers, **cached.conditional_headers()}
+                    )
+                    if issue_response.status_code == 304:
+                        self.cache.record_hit()
+                        await asyncio.to_thread(self.cache.mark_validated, owner, repo, issue_number)
+                        issue = cached.issue
+                        if max_comments is not None:
+                            issue = issue.model_copy(update={"comments": issue.comments[:max_comments]})
+                        print(f"Served issue from cache (304) in {(time.perf_counter() - started) * 1000:.0f}ms")
+                        return issue
+
+                    comments = await self.fetch_comments(
+                        owner, repo, issue_number, max_comments, max_bytes, client
+                    )
+                else:
+                    # Fetch issue details and comments concurrently
+                    issue_response, comments = await gather_or_cancel(
+                        get_issue_response(client, issue_url, self.headers),
+                        self.fetch_comments(owner, repo, issue_number, max_comments, max_bytes, client)
+                    )
+
+                if self.cache:
+                    self.cache.record_miss(revalidated=cached is not None)
                 
                 # Convert to our models
-                user = GitHubUser(
-                    login=issue_data["user"]["login"],
-                    id=issue_data["user"]["id"],
-                    avatar_url=issue_data["user"]["avatar_url"],
-                    html_url=issue_data["user"]["html_url"]
-                )
-                
-                labels = [
-                    GitHubLabel(
-                        name=label["name"],
-                        color=label["color"],
-                        description=label.get("description")
-                    ) for label in issue_data.get("labels", [])
-                ]
-                
-                comments = [
-                    GitHubComment(
-                        id=comment["id"],
-                        user=GitHubUser(
-                            login=comment["user"]["login"],
-                            id=comment["user"]["id"],
-                            avatar_url=comment["user"]["avatar_url"],
-                            html_url=comment["user"]["html_url"]
-                        ),
-                        body=comment["body"],
-                        created_at=comment["created_at"],
-                        updated_at=comment["updated_at"]
-                    ) for comment in comments_data
-                ]
-                
-                issue = GitHubIssue(
-                    id=issue_data["id"],
-                    number=issue_data["number"],
-                    title=issue_data["title"],
-                    body=issue_data.get("body"),
-                    user=user,
-                    labels=labels,
-                    state=issue_data["state"],
-                    created_at=issue_data["created_at"],
-                    updated_at=issue_data["updated_at"],
-                    html_url=issue_data["html_url"],
-                    comments=comments
-                )
-                
+                issue = parse_issue(issue_response.json(), comments)
+
+                await self._cache_store(owner, repo, issue_number, issue, issue_response, max_comments, max_bytes)
+                print(f"Fetched issue via REST in {(time.perf_counter() - started) * 1000:.0f}ms")
                 return issue
                 
         except httpx.HTTPStatusError as e:
@@ -219,3 +539,77 @@ class GitHubService:
         except Exception as e:
             print(f"Error fetching GitHub issue: {str(e)}")
             raise
+
+    async def _cache_lookup(self, owner: str, repo: str, issue_number: int,
+                            max_comments: Optional[int]) -> Optional[CachedIssue]:
+        """Find a cached issue that holds enough comments for this request"""
+        if not self.cache:
+            return None
+        try:
+            cached = await asyncio.to_thread(self.cache.get, owner, repo, issue_number)
+        except Exception as e:
+            print(f"Issue cache lookup failed: {str(e)}")
+            return None
+        if cached and cached.covers(max_comments):
+            return cached
+        return None
+
+    async def _cache_store(self, owner: str, repo: str, issue_number: int, issue: GitHubIssue,
+                           response: httpx.Response, max_comments: Optional[int],
+                           max_bytes: Optional[int] = None):
+        """Remember an issue along with its ETag / Last-Modified validators"""
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if not self.cache or not (etag or last_modified):
+            return
+        # The issue reports its total comment count; fewer comments than the
+        # request allowed means the byte cap cut the thread short
+        total = response.json().get("comments")
+        expected = total if max_comments is None or total is None else min(total, max_comments)
+        truncated = max_bytes is not None and expected is not None and len(issue.comments) < expected
+        try:
+            await asyncio.to_thread(
+                self.cache.put, owner, repo, issue_number, issue, etag, last_modified, max_comments, truncated
+            )
+        except Exception as e:
+            print(f"Issue cache write failed: {str(e)}")
+
+    async def fetch_issue_graphql(self, owner: str, repo: str, issue_number: int,
+                                  max_comments: Optional[int] = None,
+                                  max_bytes: Optional[int] = None) -> GitHubIssue:
+        """Fetch issue, labels, author and the first N comments in one GraphQL query
+
+        GraphQL responses carry no ETag, so this path bypasses the issue cache.
+        At most 100 comments are returned.
+        """
+        comment_count = GRAPHQL_MAX_COMMENTS if max_comments is None else min(max_comments, GRAPHQL_MAX_COMMENTS)
+        started = time.perf_counter()
+
+        async with github_client_session(self.client, self.rate_limiter) as client:
+            response = await client.post(
+                f"{self.base_url}/graphql",
+                headers=self.headers,
+                json={
+                    "query": ISSUE_GRAPHQL_QUERY,
+                    "variables": {
+                        "owner": owner,
+                        "repo": repo,
+                        "number": issue_number,
+                        "comments": max(comment_count, 0)
+                    }
+                }
+            )
+            response.raise_for_status()
+            payload = response.json()
+
+        if payload.get("errors"):
+            messages = "; ".join(error.get("message", "unknown error") for error in payload["errors"])
+            raise GitHubGraphQLError(f"GraphQL query failed: {messages}")
+
+        issue_node = ((payload.get("data") or {}).get("repository") or {}).get("issue")
+        if not issue_node:
+            raise GitHubGraphQLError(f"Issue {owner}/{repo}#{issue_number} not found")
+
+        issue = parse_graphql_issue(issue_node, max_bytes)
+        print(f"Fetched issue via GraphQL in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return issue
@@ -0,0 +1,54 @@
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from services.config import env_float, env_int, env_flag
+from services.rate_limiter import GitHubRateLimiter, RateLimitedTransport
+
+# HTTP/2 needs the optional `h2` package (installed via `httpx[http2]`)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def create_github_client(rate_limiter: Optional[GitHubRateLimiter] = None,
+                         transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Create a pooled, keep-alive HTTP client for the GitHub API
+
+    Pool limits and timeouts are configurable through environment variables so
+    the client can be sized for the expected request volume. When a rate
+    limiter is given, every request made through the client is scheduled by it.
+    """
+    limits = httpx.Limits(
+        max_connections=env_int("GITHUB_HTTP_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=env_int("GITHUB_HTTP_MAX_KEEPALIVE", 10),
+        keepalive_expiry=env_float("GITHUB_HTTP_KEEPALIVE_EXPIRY", 30.0)
+    )
+    timeout = httpx.Timeout(
+        env_float("GITHUB_HTTP_TIMEOUT", 10.0),
+        connect=env_float("GITHUB_HTTP_CONNECT_TIMEOUT", 5.0)
+    )
+
+    http2 = env_flag("GITHUB_HTTP2", True)
+    if http2 and not HTTP2_AVAILABLE:
+        print("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+    if rate_limiter is not None:
+        transport = RateLimitedTransport(transport, rate_limiter)
+
+    return httpx.AsyncClient(timeout=timeout, transport=transport)
+
+
+@asynccontextmanager
+async def github_client_session(client: Optional[httpx.AsyncClient],
+                                rate_limiter: Optional[GitHubRateLimiter] = None) -> AsyncIterator[httpx.AsyncClient]:
+    """Yield the shared client, or a short-lived one when none has been configured"""
+    if client is not None and not client.is_closed:
+        yield client
+        return
+
+    async with create_github_client(rate_limiter) as temporary_client:
+        yield temporary_client
@@ -0,0 +1,440 @@
+import bisect
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import List, Dict, Any, Optional, Tuple
+
+# Binary index file layout
+#
+#   header     magic, format version, byte order, directory length,
+#              blake2b checksum of everything after the header, body length
+#   directory  JSON: section offsets, table sizes, document field names
+#   sections   8-byte aligned; per table a sorted term dictionary (uint32
+#              offsets + UTF-8 blob), varint postings (uint64 offsets +
+#              blob) and per-document term ordinals (uint64 offsets + varint
+#              blob), plus a fixed-width document table and a path pool
+#
+# Files are opened with mmap and read in place: a lookup binary-searches the
+# term dictionary and decodes only that term's postings, and processes that
+# open the same file share its pages through the OS page cache. The
+# per-document term ordinals let a refresh find the posting lists of a changed
+# file without decoding the others.
+MAGIC = b"CBINDEX\x00"
+HEADER = struct.Struct("<8sHBxI16sQ")
+BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+ALIGNMENT = 8
+
+# Posting value kinds: {doc_id: [line, ...]}, [doc_id, ...] and {doc_id: count}
+LINES = "lines"
+IDS = "ids"
+COUNTS = "counts"
+
+
+class IndexFormatError(ValueError):
+    """A binary index file is corrupt, truncated or from another format version"""
+
+
+def encode_varint(value: int, out: bytearray):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def encode_postings(kind: str, docs: Any) -> bytearray:
+    """Delta + varint encoding of one term's postings, doc ids ascending"""
+    out = bytearray()
+    previous = 0
+    for doc_id in sorted(docs):
+        encode_varint(doc_id - previous, out)
+        previous = doc_id
+        if kind == LINES:
+            lines = docs[doc_id]
+            encode_varint(len(lines), out)
+            last = 0
+            for line in lines:
+                encode_varint(line - last, out)
+                last = line
+        elif kind == COUNTS:
+            encode_varint(docs[doc_id], out)
+    return out
+
+
+def encode_ordinals(ordinals: List[int]) -> bytearray:
+    """Delta + varint encoding of ascending term ordinals"""
+    out = bytearray()
+    previous = 0
+    for ordinal in ordinals:
+        encode_varint(ordinal - previous, out)
+        previous = ordinal
+    return out
+
+
+def decode_postings(kind: str, data) -> Any:
+    values = decode_varints(data)
+    if kind == IDS:
+        ids, doc_id = [], 0
+        for delta in values:
+            doc_id += delta
+            ids.append(doc_id)
+        return ids
+
+    docs: Dict[int, Any] = {}
+    doc_id = i = 0
+    while i < len(values):
+        doc_id += values[i]
+        if kind == COUNTS:
+            docs[doc_id] = values[i + 1]
+            i += 2
+            continue
+        count = values[i + 1]
+        lines, line = [], 0
+        for delta in values[i + 2:i + 2 + count]:
+            line += delta
+            lines.append(line)
+        docs[doc_id] = lines
+        i += 2 + count
+    return docs
+
+
+def _doc_struct(length_fields: List[str]) -> struct.Struct:
+    # live flag, path offset and length in the pool, mtime, size, content hash, field lengths
+    return struct.Struct(f"<BIIdQ16s{len(length_fields)}I")
+
+
+class _Sections:
+    """Accumulates 8-byte aligned sections and records where each one starts"""
+
+    def __init__(self):
+        self.body = bytearray()
+        self.offsets: Dict[str, List[int]] = {}
+
+    def add(self, name: str, data):
+        self.body.extend(b"\x00" * (-len(self.body) % ALIGNMENT))
+        self.offsets[name] = [len(self.body), len(data)]
+        self.body.extend(data)
+
+
+def write_index_file(path: str, version: int, documents: List[Optional[Dict[str, Any]]],
+                     tables: Dict[str, Tuple[str, Mapping]], length_fields: List[str],
+                     metadata: Optional[Dict[str, Any]] = None):
+    """Write documents and posting tables to `path` in the binary format
+
+    `tables` maps a table name to (kind, {term: postings}).
+    """
+    sections = _Sections()
+
+    doc_struct = _doc_struct(length_fields)
+    records = bytearray()
+    pool = bytearray()
+    for doc in documents:
+        if doc is None:
+            records.extend(doc_struct.pack(0, 0, 0, 0.0, 0, b"\x00" * 16, *([0] * len(length_fields))))
+            continue
+        encoded = doc["path"].encode("utf-8")
+        records.extend(doc_struct.pack(
+            1, len(pool), len(encoded), doc["mtime"], doc["size"], bytes.fromhex(doc["hash"]),
+            *(doc["lengths"][field] for field in length_fields)
+        ))
+        pool.extend(encoded)
+    sections.add("documents", records)
+    sections.add("paths", pool)
+
+    table_info = {}
+    for name, (kind, postings) in tables.items():
+        terms = sorted(postings)
+        term_offsets, term_blob = array("I", [0]), bytearray()
+        posting_offsets, posting_blob = array("Q", [0]), bytearray()
+        doc_terms: List[List[int]] = [[] for _ in documents]
+        for ordinal, term in enumerate(terms):
+            docs = postings[term]
+            term_blob.extend(term.encode("utf-8"))
+            term_offsets.append(len(term_blob))
+            posting_blob.extend(encode_postings(kind, docs))
+            posting_offsets.append(len(posting_blob))
+            for doc_id in docs:
+                doc_terms[doc_id].append(ordinal)
+
+        doc_offsets, doc_blob = array("Q", [0]), bytearray()
+        for ordinals in doc_terms:
+            doc_blob.extend(encode_ordinals(ordinals))
+            doc_offsets.append(len(doc_blob))
+
+        sections.add(f"{name}.term_offsets", term_offsets.tobytes())
+        sections.add(f"{name}.terms", term_blob)
+        sections.add(f"{name}.posting_offsets", posting_offsets.tobytes())
+        sections.add(f"{name}.postings", posting_blob)
+        sections.add(f"{name}.doc_offsets", doc_offsets.tobytes())
+        sections.add(f"{name}.doc_terms", doc_blob)
+        table_info[name] = {"kind": kind, "terms": len(terms)}
+
+    directory = json.dumps({
+        "metadata": metadata or {},
+        "documents": len(documents),
+        "length_fields": length_fields,
+        "tables": table_info,
+        "sections": sections.offsets
+    }, separators=(",", ":")).encode("utf-8")
+    directory += b" " * (-len(directory) % ALIGNMENT)
+
+    body = directory + sections.body
+    checksum = hashlib.blake2b(body, digest_size=16).digest()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, BYTE_ORDER, len(directory), checksum, len(body)))
+        f.write(body)
+
+
+class TermList(Sequence):
+    """Sorted terms of a table, decoded one at a time straight from the mapped file"""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def position(self, term: str) -> Optional[int]:
+        i = bisect.bisect_left(self, term)
+        return i if i < len(self) and self[i] == term else None
+
+
+class MappedPostings(Mapping):
+    """term -> postings over a mapped table; only the requested term is decoded"""
+
+    def __init__(self, kind: str, terms: TermList, offsets: memoryview, blob: memoryview,
+                 doc_offsets: memoryview, doc_blob: memoryview):
+        self.kind = kind
+        self.terms = terms
+        self.offsets = offsets
+        self.blob = blob
+        self.doc_offsets = doc_offsets
+        self.doc_blob = doc_blob
+
+    def __getitem__(self, term: str) -> Any:
+        i = self.terms.position(term)
+        if i is None:
+            raise KeyError(term)
+        return decode_postings(self.kind, self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def __contains__(self, term) -> bool:
+        return isinstance(term, str) and self.terms.position(term) is not None
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def terms_of(self, doc_ids) -> set:
+        """Terms whose postings include any of `doc_ids`, read from the per-document term lists"""
+        terms = set()
+        for doc_id in doc_ids:
+            if not 0 <= doc_id < len(self.doc_offsets) - 1:
+                continue
+            ordinal = 0
+            for delta in decode_varints(self.doc_blob[self.doc_offsets[doc_id]:self.doc_offsets[doc_id + 1]]):
+                ordinal += delta
+                terms.add(self.terms[ordinal])
+        return terms
+
+
+class PostingsOverlay(MutableMapping):
+    """Copy-on-write view of a mapped table: changed terms in memory, the rest read in place
+
+    Refreshing an index replaces only the posting lists of changed files;
+    every other term keeps reading from the mapped file. The terms of the
+    documents changed here are tracked so later refreshes need not scan the
+    table either.
+    """
+
+    def __init__(self, base: Mapping):
+        if isinstance(base, PostingsOverlay):
+            # Stack on the mapped table itself rather than on another overlay
+            self.base = base.base
+            self.updated: Dict[str, Any] = dict(base.updated)
+            self.removed = set(base.removed)
+            self.doc_terms: Dict[int, List[str]] = dict(base.doc_terms)
+        else:
+            self.base = base
+            self.updated = {}
+            self.removed = set()
+            self.doc_terms = {}
+        self._terms: Optional[List[str]] = None
+
+    def __getitem__(self, term: str) -> Any:
+        if term in self.updated:
+            return self.updated[term]
+        if term in self.removed:
+            raise KeyError(term)
+        return self.base[term]
+
+    def __setitem__(self, term: str, value: Any):
+        self.updated[term] = value
+        self.removed.discard(term)
+        self._terms = None
+
+    def __delitem__(self, term: str):
+        if term not in self:
+            raise KeyError(term)
+        self.updated.pop(term, None)
+        if term in self.base:
+            self.removed.add(term)
+        self._terms = None
+
+    def __contains__(self, term) -> bool:
+        return term in self.updated or (term not in self.removed and term in self.base)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    @property
+    def terms(self) -> List[str]:
+        """Sorted terms, built on first use"""
+        if self._terms is None:
+            base_terms = (term for term in self.base if term not in self.removed and term not in self.updated)
+            self._terms = sorted([*base_terms, *self.updated])
+        return self._terms
+
+    def terms_of(self, doc_ids) -> set:
+        terms = set()
+        unchanged = []
+        for doc_id in doc_ids:
+            if doc_id in self.doc_terms:
+                terms.update(self.doc_terms[doc_id])
+            else:
+                unchanged.append(doc_id)
+        return terms | self.base.terms_of(unchanged) if unchanged else terms
+
+
+class MappedDocuments(Sequence):
+    """Document records (None for tombstones), decoded on first access"""
+
+    def __init__(self, records: memoryview, pool: memoryview, count: int, length_fields: List[str]):
+        self.records = records
+        self.pool = pool
+        self.count = count
+        self.length_fields = length_fields
+        self.struct = _doc_struct(length_fields)
+        self._decoded: List[Any] = [None] * count
+        self._done = bytearray(count)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        if not self._done[i]:
+            live, offset, length, mtime, size, digest, *lengths = self.struct.unpack_from(self.records, i * self.struct.size)
+            self._decoded[i] = {
+                "path": str(self.pool[offset:offset + length], "utf-8"),
+                "mtime": mtime,
+                "size": size,
+                "hash": digest.hex(),
+                "lengths": dict(zip(self.length_fields, lengths))
+            } if live else None
+            self._done[i] = 1
+        return self._decoded[i]
+
+
+class MappedIndexFile:
+    """An index file opened with mmap; tables and documents read in place"""
+
+    def __init__(self, path: str, version: int, verify: bool = True):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if len(buffer) < HEADER.size:
+            raise IndexFormatError(f"{path} is truncated")
+
+        magic, file_version, byte_order, directory_length, checksum, body_length = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise IndexFormatError(f"{path} is not a binary index file")
+        if file_version != version:
+            raise IndexFormatError(f"{path} has format version {file_version}, expected {version}")
+        if byte_order != BYTE_ORDER:
+            raise IndexFormatError(f"{path} was written on a machine with another byte order")
+        body = buffer[HEADER.size:]
+        if len(body) != body_length:
+            raise IndexFormatError(f"{path} is truncated")
+        if verify and hashlib.blake2b(body, digest_size=16).digest() != checksum:
+            raise IndexFormatError(f"{path} failed its checksum")
+
+        directory = json.loads(bytes(body[:directory_length]))
+        sections_start = directory_length
+
+        # Every view kept by the tables, released on close so the mapping can be unmapped
+        self._views = [buffer, body]
+
+        def section(name: str, format: Optional[str] = None) -> memoryview:
+            offset, length = directory["sections"][name]
+            view = body[sections_start + offset:sections_start + offset + length]
+            if format is not None:
+                self._views.append(view)
+                view = view.cast(format)
+            self._views.append(view)
+            return view
+
+        self.metadata: Dict[str, Any] = directory["metadata"]
+        self.documents = MappedDocuments(
+            section("documents"), section("paths"), directory["documents"], directory["length_fields"]
+        )
+        self.tables: Dict[str, MappedPostings] = {}
+        for name, info in directory["tables"].items():
+            terms = TermList(section(f"{name}.term_offsets", "I"), section(f"{name}.terms"))
+            self.tables[name] = MappedPostings(
+                info["kind"], terms, section(f"{name}.posting_offsets", "Q"), section(f"{name}.postings"),
+                section(f"{name}.doc_offsets", "Q"), section(f"{name}.doc_terms")
+            )
+        self.size = len(buffer)
+
+    def close(self):
+        """Unmap the file; its tables and documents must no longer be used"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A lookup still holds a slice; the mapping goes away with it
+            pass
+
+
+def sorted_terms(postings: Mapping) -> Sequence:
+    """Sorted term sequence of a posting table, without copying mapped tables"""
+    if isinstance(postings, (MappedPostings, PostingsOverlay)):
+        return postings.terms
+    return sorted(postings)
+
@@ -0,0 +1,89 @@
+import asyncio
+import importlib.util
+import time
+from typing import Optional, Dict, Any
+
+from services.config import env_float, env_flag
+
+# File watching needs the optional `watchfiles` package; polling works without it
+WATCHFILES_AVAILABLE = importlib.util.find_spec("watchfiles") is not None
+
+
+class IndexRefresher:
+    """Keeps a CodebaseAnalyzer's index in sync with the files on disk
+
+    Refreshes run on a fixed interval, or on file change events when
+    `watchfiles` is installed and watching is enabled. Each refresh only
+    re-tokenizes changed files and runs in a worker thread, so requests are
+    never blocked while it runs.
+    """
+
+    def __init__(self, analyzer, interval: Optional[float] = None, watch: Optional[bool] = None,
+                 debounce: Optional[float] = None):
+        self.analyzer = analyzer
+        self.interval = interval if interval is not None else env_float("CODEBASE_INDEX_REFRESH_SECONDS", 300.0)
+        self.watch = watch if watch is not None else env_flag("CODEBASE_INDEX_WATCH", False)
+        # Bursts of change events within this window trigger one refresh
+        self.debounce = debounce if debounce is not None else env_float("CODEBASE_INDEX_WATCH_DEBOUNCE", 2.0)
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_stats: Optional[Dict[str, Any]] = None
+
+        if self.watch and not WATCHFILES_AVAILABLE:
+            print("Index watching requested but 'watchfiles' is not installed, falling back to polling")
+            self.watch = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.watch or self.interval > 0
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._watch() if self.watch else self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self) -> Optional[Dict[str, Any]]:
+        """Run one incremental refresh off the event loop"""
+        try:
+            stats = await asyncio.to_thread(self.analyzer.refresh_index)
+        except Exception as e:
+            self.failures += 1
+            print(f"Codebase index refresh failed: {str(e)}")
+            return None
+
+        self.refreshes += 1
+        self.last_refresh_at = time.time()
+        self.last_stats = stats
+        if any(stats.get(key) for key in ("added", "changed", "removed")):
+            print(f"Refreshed codebase index: {stats}")
+        return stats
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.refresh()
+
+    async def _watch(self):
+        from watchfiles import awatch
+
+        async for changes in awatch(self.analyzer.codebase_path, debounce=int(self.debounce * 1000)):
+            if any(path.endswith(".py") for _, path in changes):
+                await self.refresh()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "mode": "watch" if self.watch else "poll",
+            "interval_seconds": self.interval,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_refresh_at": self.last_refresh_at,
+            "last_refresh": self.last_stats
+        }
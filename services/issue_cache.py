@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+
+from models.issue import GitHubIssue
+from services.config import env_int
+
+# Stored comment_limit for entries that hold the complete thread
+UNLIMITED_COMMENTS = -1
+
+
+@dataclass
+class CachedIssue:
+    """A cached issue together with the HTTP validators GitHub returned for it"""
+    issue: GitHubIssue
+    etag: Optional[str]
+    last_modified: Optional[str]
+    comment_limit: int
+    validated_at: float
+    # The byte cap stopped the comment fetch before comment_limit was reached
+    truncated: bool = False
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Headers that turn the next issue fetch into a conditional request"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def covers(self, comment_limit: Optional[int]) -> bool:
+        """Whether this entry holds at least as many comments as requested"""
+        if self.truncated:
+            return comment_limit is not None and len(self.issue.comments) >= comment_limit
+        if self.comment_limit == UNLIMITED_COMMENTS:
+            return True
+        return comment_limit is not None and self.comment_limit >= comment_limit
+
+
+class IssueCache:
+    """Persistent SQLite cache of parsed GitHub issues keyed by owner/repo/number
+
+    Entries expire `ttl_seconds` after they were last validated against GitHub,
+    and the least recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.path = path or os.getenv("GITHUB_CACHE_PATH", ".cache/github_issues.sqlite3")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else env_int("GITHUB_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+        self.max_entries = max_entries if max_entries is not None else env_int("GITHUB_CACHE_MAX_ENTRIES", 1000)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0, "expirations": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS issues (
+                    key TEXT PRIMARY KEY,
+                    issue_json TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    comment_limit INTEGER NOT NULL,
+                    validated_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    truncated INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(issues)")}
+            if "truncated" not in columns:
+                conn.execute("ALTER TABLE issues ADD COLUMN truncated INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS issues_accessed_at ON issues (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    @staticmethod
+    def make_key(owner: str, repo: str, issue_number: int) -> str:
+        return f"{owner.lower()}/{repo.lower()}#{issue_number}"
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def get(self, owner: str, repo: str, issue_number: int) -> Optional[CachedIssue]:
+        """Return the cached entry, dropping it if its TTL has passed"""
+        key = self.make_key(owner, repo, issue_number)
+        now = time.time()
+
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT issue_json, etag, last_modified, comment_limit, validated_at, truncated FROM issues WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if self.ttl_seconds > 0 and now - row[4] > self.ttl_seconds:
+                conn.execute("DELETE FROM issues WHERE key = ?", (key,))
+                self._count("expirations")
+                return None
+
+            conn.execute("UPDATE issues SET accessed_at = ? WHERE key = ?", (now, key))
+
+        try:
+            issue = GitHubIssue.model_validate_json(row[0])
+        except Exception as e:
+            print(f"Discarding unreadable cache entry {key}: {str(e)}")
+            self.delete(owner, repo, issue_number)
+            return None
+
+        return CachedIssue(
+            issue=issue,
+            etag=row[1],
+            last_modified=row[2],
+            comment_limit=row[3],
+            validated_at=row[4],
+            truncated=bool(row[5])
+        )
+
+    def put(self, owner: str, repo: str, issue_number: int, issue: GitHubIssue,
+            etag: Optional[str], last_modified: Optional[str], comment_limit: Optional[int],
+            truncated: bool = False):
+        """Store a freshly fetched issue and evict least recently used entries
+
+        `truncated` marks an entry whose comments were cut short by the byte
+        cap, so it only covers requests for as many comments as it holds.
+        """
+        key = self.make_key(owner, repo, issue_number)
+        now = time.time()
+        limit = UNLIMITED_COMMENTS if comment_limit is None else comment_limit
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO issues
+                   (key, issue_json, etag, last_modified, comment_limit, validated_at, accessed_at, truncated)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (key, issue.model_dump_json(), etag, last_modified, limit, now, now, int(truncated))
+            )
+            if self.max_entries > 0:
+                evicted = conn.execute(
+                    """DELETE FROM issues WHERE key IN (
+                           SELECT key FROM issues ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                       )""",
+                    (self.max_entries,)
+                ).rowcount
+                if evicted > 0:
+                    self._count("evictions", evicted)
+
+    def mark_validated(self, owner: str, repo: str, issue_number: int):
+        """Restart the TTL of an entry GitHub confirmed as unchanged"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE issues SET validated_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, self.make_key(owner, repo, issue_number))
+            )
+
+    def delete(self, owner: str, repo: str, issue_number: int):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM issues WHERE key = ?", (self.make_key(owner, repo, issue_number),))
+
+    def record_hit(self):
+        self._count("hits")
+
+    def record_miss(self, revalidated: bool = False):
+        self._count("misses")
+        if revalidated:
+            self._count("revalidated")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size for the health endpoint"""
+        with self._lock:
+            counters = dict(self._counters)
+        try:
+            with closing(self._connect()) as conn:
+                entries = conn.execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": True,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            **counters
+        }
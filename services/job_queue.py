@@ -0,0 +1,373 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import Optional, List, Dict, Any, Callable, Awaitable
+
+from services.config import env_int, env_float
+
+# Job lifecycle states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when the queue already holds the configured maximum of jobs"""
+
+
+class JobStore(ABC):
+    """Persistence backend for jobs; subclasses decide where records live"""
+
+    @abstractmethod
+    def create(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a new queued job and return it"""
+
+    @abstractmethod
+    def update(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None, owner: Optional[str] = None):
+        """Set a job's status, result and error; with `owner`, only while that worker holds it"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job record, or None if it does not exist"""
+
+    @abstractmethod
+    def list_unfinished(self) -> List[Dict[str, Any]]:
+        """Queued and running jobs, oldest first"""
+
+    @abstractmethod
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Atomically move a queued job to running for `owner`; False if it was not queued"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, owner: str):
+        """Mark a running job as still alive"""
+
+    @abstractmethod
+    def release(self, owner: str) -> int:
+        """Re-queue the running jobs of a stopping worker pool"""
+
+    @abstractmethod
+    def requeue_stale(self, older_than: float) -> int:
+        """Re-queue running jobs whose owner has not sent a heartbeat since `older_than`"""
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local job store; jobs are lost on restart"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        job = {
+            "job_id": job_id,
+            "status": JOB_QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "owner": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        return dict(job)
+
+    def update(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None, owner: Optional[str] = None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and (owner is None or job["owner"] == owner):
+                job.update(status=status, result=result, error=error, updated_at=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(job) for job in self._jobs.values()
+                if job["status"] in (JOB_QUEUED, JOB_RUNNING)
+            ]
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] != JOB_QUEUED:
+                return False
+            job.update(status=JOB_RUNNING, owner=owner, updated_at=time.time())
+            return True
+
+    def heartbeat(self, job_id: str, owner: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and job["status"] == JOB_RUNNING and job["owner"] == owner:
+                job["updated_at"] = time.time()
+
+    def release(self, owner: str) -> int:
+        return self._requeue(lambda job: job["owner"] == owner)
+
+    def requeue_stale(self, older_than: float) -> int:
+        return self._requeue(lambda job: job["updated_at"] < older_than)
+
+    def _requeue(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job["status"] == JOB_RUNNING and predicate(job)]
+            for job in jobs:
+                job.update(status=JOB_QUEUED, owner=None, updated_at=time.time())
+            return len(jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite job store so queued and finished jobs survive restarts"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("JOB_STORE_PATH", ".cache/jobs.sqlite3")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    owner TEXT
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    @staticmethod
+    def _row_to_job(row) -> Dict[str, Any]:
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "payload": json.loads(row[2]),
+            "result": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6]
+        }
+
+    def create(self, job_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, json.dumps(payload), now, now)
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None, owner: Optional[str] = None):
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?"
+        params = [status, json.dumps(result) if result is not None else None, error, time.time(), job_id]
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(query, params)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT job_id, status, payload, result, error, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_unfinished(self) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                """SELECT job_id, status, payload, result, error, created_at, updated_at
+                   FROM jobs WHERE status IN (?, ?) ORDER BY created_at""",
+                (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        # A single conditional UPDATE, so only one process can win a queued job
+        with closing(self._connect()) as conn, conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (JOB_RUNNING, owner, time.time(), job_id, JOB_QUEUED)
+            ).rowcount
+        return claimed == 1
+
+    def heartbeat(self, job_id: str, owner: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = ? AND owner = ?",
+                (time.time(), job_id, JOB_RUNNING, owner)
+            )
+
+    def release(self, owner: str) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE status = ? AND owner = ?",
+                (JOB_QUEUED, time.time(), JOB_RUNNING, owner)
+            ).rowcount
+
+    def requeue_stale(self, older_than: float) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (JOB_QUEUED, time.time(), JOB_RUNNING, older_than)
+            ).rowcount
+
+
+def create_job_store() -> JobStore:
+    """Build the job store selected by JOB_STORE ("sqlite" or "memory")"""
+    backend = os.getenv("JOB_STORE", "sqlite").lower()
+    if backend == "memory":
+        return InMemoryJobStore()
+    if backend != "sqlite":
+        print(f"Unknown JOB_STORE '{backend}', using sqlite")
+    return SQLiteJobStore()
+
+
+class JobQueue:
+    """In-process asyncio worker pool for long-running pipeline jobs
+
+    `handler` receives a job's payload and returns a JSON-serializable result.
+    Workers claim a job atomically in the store before running it, so when
+    several processes share a store (uvicorn workers, or a restart
+    overlapping a live process) each job runs once. Running jobs send a
+    heartbeat; on start, queued jobs are picked up and running jobs whose
+    heartbeat is older than `stale_after` seconds are re-queued, and on stop
+    the pool hands its running jobs back to the queue.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 store: Optional[JobStore] = None, workers: Optional[int] = None,
+                 max_queue_depth: Optional[int] = None, stale_after: Optional[float] = None):
+        self.handler = handler
+        self.store = store or create_job_store()
+        self.workers = workers if workers is not None else env_int("JOB_WORKERS", 2)
+        self.max_queue_depth = max_queue_depth if max_queue_depth is not None else env_int("JOB_MAX_QUEUE_DEPTH", 100)
+        self.stale_after = stale_after if stale_after is not None else env_float("JOB_STALE_SECONDS", 600.0)
+        # Identifies this worker pool's claims in a store shared between processes
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.lost_claims = 0
+
+    async def start(self):
+        """Re-queue stale running jobs, pick up queued ones and start the workers"""
+        stale = await asyncio.to_thread(self.store.requeue_stale, time.time() - self.stale_after)
+        if stale:
+            print(f"Re-queued {stale} jobs whose worker stopped responding")
+        for job in await asyncio.to_thread(self.store.list_unfinished):
+            # Jobs another live process is running stay with it
+            if job["status"] == JOB_QUEUED:
+                self._queue.put_nowait(job["job_id"])
+        if self._queue.qsize():
+            print(f"Picked up {self._queue.qsize()} queued jobs")
+
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))]
+
+    async def stop(self):
+        """Cancel the workers and re-queue their interrupted jobs for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            released = await asyncio.to_thread(self.store.release, self.owner)
+        except Exception as e:
+            print(f"Failed to re-queue interrupted jobs: {str(e)}")
+            return
+        if released:
+            print(f"Re-queued {released} interrupted jobs")
+
+    async def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist and enqueue a job, returning its record"""
+        if self._queue.qsize() >= self.max_queue_depth:
+            raise JobQueueFullError(f"Job queue is full ({self.max_queue_depth} jobs waiting)")
+
+        job = await asyncio.to_thread(self.store.create, uuid.uuid4().hex, payload)
+        self._queue.put_nowait(job["job_id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = await asyncio.to_thread(self.store.get, job_id)
+                if not job or job["status"] != JOB_QUEUED:
+                    continue
+                if not await asyncio.to_thread(self.store.claim, job_id, self.owner):
+                    # Another worker or process claimed it first
+                    self.lost_claims += 1
+                    continue
+
+                self.running += 1
+                heartbeat = asyncio.create_task(self._heartbeat(job_id))
+                try:
+                    result = await self.handler(job["payload"])
+                    await asyncio.to_thread(self.store.update, job_id, JOB_SUCCEEDED, result, None, self.owner)
+                    self.completed += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Job {job_id} failed: {str(e)}")
+                    await asyncio.to_thread(self.store.update, job_id, JOB_FAILED, None, str(e), self.owner)
+                    self.failed += 1
+                finally:
+                    heartbeat.cancel()
+                    self.running -= 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker error for {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id: str):
+        """Refresh a running job's claim so other processes do not treat it as stale"""
+        while True:
+            await asyncio.sleep(max(1.0, self.stale_after / 3))
+            try:
+                await asyncio.to_thread(self.store.heartbeat, job_id, self.owner)
+            except Exception as e:
+                print(f"Job heartbeat failed for {job_id}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Worker and queue metrics for the health endpoint"""
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "lost_claims": self.lost_claims
+        }
@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Optional, Dict, Any, List
+
+from services.config import env_int, env_flag
+
+# Model the analysis and PRD agents run on
+DEFAULT_LLM_MODEL = "openai/gpt-4o-mini"
+
+
+def normalize_description(description: str) -> str:
+    """Task description with whitespace runs collapsed, so indentation changes keep the key"""
+    return " ".join(str(description).split())
+
+
+def tool_names(task: Any) -> List[str]:
+    names = []
+    for tool in getattr(task, "tools", None) or []:
+        if isinstance(tool, str):
+            names.append(tool)
+        else:
+            names.append(getattr(tool, "__name__", None) or type(tool).__name__)
+    return sorted(names)
+
+
+def task_cache_key(model_name: str, task: Any, codebase: Optional[Dict[str, str]] = None) -> str:
+    """Content address of a task execution: model, normalized description, tools and response format
+
+    Tools read the codebase, so for tasks that use them the key also covers
+    `codebase`: its path and index fingerprint.
+    """
+    response_format = getattr(task, "response_format", None)
+    tools = tool_names(task)
+    payload = json.dumps({
+        "model": model_name,
+        "description": normalize_description(getattr(task, "description", "")),
+        "tools": tools,
+        "response_format": getattr(response_format, "__name__", str(response_format)),
+        "codebase": codebase if tools else None
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def task_usage(task: Any) -> Dict[str, Optional[float]]:
+    """Cost and token counts the task recorded for its execution, where available"""
+    usage = {}
+    for field, attribute in (("cost", "total_cost"), ("input_tokens", "total_input_token"),
+                             ("output_tokens", "total_output_token")):
+        try:
+            value = getattr(task, attribute, None)
+        except Exception:
+            value = None
+        usage[field] = value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    return usage
+
+
+class LLMResponseCache:
+    """Persistent SQLite cache of LLM task responses keyed by their content address
+
+    Identical tasks for the same model (same issue revision, same prompt,
+    same tools) are answered from the cache instead of calling the model.
+    Each entry records the latency and, where the task reports it, the cost
+    and token counts of the call it replaces. The cache is bounded by the
+    total size of stored responses, evicting the least recently used
+    entries first; entries expire after `ttl_seconds` when it is positive.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None):
+        self.path = path or os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3")
+        self.max_bytes = max_bytes if max_bytes is not None else env_int("LLM_CACHE_MAX_MB", 64) * 1024 * 1024
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else env_int("LLM_CACHE_TTL_SECONDS", 0)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expirations": 0}
+        self._saved = {"latency_ms": 0.0, "cost": 0.0}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    latency_ms REAL NOT NULL,
+                    cost REAL,
+                    input_tokens INTEGER,
+                    output_tokens INTEGER,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response and its metadata, dropping it if its TTL has passed"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                """SELECT model, response, latency_ms, cost, input_tokens, output_tokens, hits, created_at
+                   FROM responses WHERE key = ?""",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+
+            if self.ttl_seconds > 0 and now - row[7] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count("expirations")
+                self._count("misses")
+                return None
+
+            conn.execute("UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+
+        self._count("hits")
+        with self._lock:
+            self._saved["latency_ms"] += row[2]
+            self._saved["cost"] += row[3] or 0.0
+        return {
+            "model": row[0],
+            "response": row[1],
+            "latency_ms": row[2],
+            "cost": row[3],
+            "input_tokens": row[4],
+            "output_tokens": row[5],
+            "hits": row[6] + 1,
+            "created_at": row[7]
+        }
+
+    def put(self, key: str, model: str, response: str, latency_ms: float,
+            cost: Optional[float] = None, input_tokens: Optional[int] = None,
+            output_tokens: Optional[int] = None):
+        """Store a response and evict least recently used entries beyond the size bound"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO responses
+                   (key, model, response, size, latency_ms, cost, input_tokens, output_tokens, hits, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)""",
+                (key, model, response, size, latency_ms, cost, input_tokens, output_tokens, now, now)
+            )
+            if self.max_bytes > 0:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                evicted = []
+                if total > self.max_bytes:
+                    for old_key, old_size in conn.execute(
+                        "SELECT key, size FROM responses WHERE key != ? ORDER BY accessed_at", (key,)
+                    ):
+                        evicted.append((old_key,))
+                        total -= old_size
+                        if total <= self.max_bytes:
+                            break
+                    conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+                if evicted:
+                    self._count("evictions", len(evicted))
+        self._count("writes")
+
+    async def do_async(self, agent: Any, task: Any, model: Any, model_name: str,
+                       codebase: Optional[Dict[str, str]] = None) -> Any:
+        """`agent.do_async(task, model=model)`, answered from the cache when the same task ran before
+
+        Tasks with tools are cached only when `codebase` identifies what their tools read.
+        """
+        if tool_names(task) and codebase is None:
+            return await agent.do_async(task, model=model)
+        key = task_cache_key(model_name, task, codebase)
+        entry = await asyncio.to_thread(self.get, key)
+        if entry is not None:
+            print(f"LLM cache hit ({model_name}), saved {entry['latency_ms']:.0f}ms")
+            return entry["response"]
+
+        started = time.perf_counter()
+        result = await agent.do_async(task, model=model)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        # Only text responses are stored; structured ones are returned uncached
+        if isinstance(result, str):
+            try:
+                await asyncio.to_thread(self.put, key, model_name, result, latency_ms, **task_usage(task))
+            except Exception as e:
+                print(f"Failed to cache LLM response: {str(e)}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, current size and savings for the health endpoint"""
+        with self._lock:
+            counters = dict(self._counters)
+            saved = dict(self._saved)
+        try:
+            with closing(self._connect()) as conn:
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        except sqlite3.Error:
+            entries = size = None
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": True,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            "saved_latency_ms": round(saved["latency_ms"], 2),
+            "saved_cost": round(saved["cost"], 6),
+            **counters
+        }
+
+
+_shared_cache: Optional[LLMResponseCache] = None
+_shared_cache_failed = False
+_shared_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide LLM response cache, or None when disabled or unavailable"""
+    global _shared_cache, _shared_cache_failed
+    if not env_flag("LLM_CACHE_ENABLED", True):
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None and not _shared_cache_failed:
+            try:
+                _shared_cache = LLMResponseCache()
+            except Exception as e:
+                print(f"LLM response cache unavailable: {str(e)}")
+                _shared_cache_failed = True
+        return _shared_cache
+
+
+async def run_task(agent: Any, task: Any, model: Any, model_name: str,
+                   cache: Optional[LLMResponseCache] = None, codebase: Optional[Dict[str, str]] = None) -> Any:
+    """Execute a task, through the response cache when one is given
+
+    `codebase` ({"path", "index"}) names the checkout and index revision the task's tools read.
+    """
+    if cache is None:
+        return await agent.do_async(task, model=model)
+    return await cache.do_async(agent, task, model, model_name, codebase)
@@ -0,0 +1,100 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from services.config import env_int
+from services.codebase_index import CodebaseIndex, walk_python_files, read_file, scan_source
+from services.symbol_index import SymbolIndex, parse_symbols
+
+
+def scan_chunk(codebase_path: str, relative_paths: List[str], text: bool = True,
+               symbols: bool = True) -> Dict[str, Any]:
+    """Read each file once, then tokenize and/or parse it into partial tables
+
+    Module-level so it can run in worker processes; the partial text index
+    uses doc ids local to the chunk and is renumbered when merged.
+    """
+    scans = []
+    symbol_records = []
+    total_bytes = 0
+
+    for relative_path in relative_paths:
+        source = read_file(codebase_path, relative_path)
+        if source is None:
+            continue
+        raw, stat = source
+        total_bytes += len(raw)
+        if text:
+            scans.append(scan_source(relative_path, raw, stat))
+        if symbols:
+            symbol_records.append(parse_symbols(relative_path, raw))
+
+    return {
+        "text": CodebaseIndex.from_scans(codebase_path, scans) if text else None,
+        "symbols": symbol_records,
+        "files": len(relative_paths),
+        "bytes": total_bytes
+    }
+
+
+def build_indexes(codebase_path: str, text: bool = True, symbols: bool = True,
+                  workers: Optional[int] = None, chunk_size: Optional[int] = None
+                  ) -> Tuple[Optional[CodebaseIndex], Optional[SymbolIndex], Dict[str, Any]]:
+    """Build the text and/or symbol index in one pass over the codebase
+
+    Files are found with an os.scandir walk and sharded into chunks of
+    `chunk_size` (INDEX_BUILD_CHUNK_SIZE) across `workers` processes
+    (INDEX_BUILD_WORKERS, default: CPU count). Each worker returns partial
+    postings and symbol tables, merged here in chunk order. Returns both
+    indexes and throughput stats.
+    """
+    workers = workers if workers is not None else env_int("INDEX_BUILD_WORKERS", os.cpu_count() or 1)
+    chunk_size = max(1, chunk_size if chunk_size is not None else env_int("INDEX_BUILD_CHUNK_SIZE", 64))
+
+    started = time.perf_counter()
+    relative_paths = walk_python_files(codebase_path)
+    walk_seconds = time.perf_counter() - started
+
+    chunks = [relative_paths[i:i + chunk_size] for i in range(0, len(relative_paths), chunk_size)]
+    workers = max(1, min(workers, len(chunks)))
+    partials = None
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                partials = list(pool.map(
+                    scan_chunk,
+                    [codebase_path] * len(chunks), chunks, [text] * len(chunks), [symbols] * len(chunks)
+                ))
+        except Exception as e:
+            print(f"Parallel scan failed, scanning serially: {str(e)}")
+            workers = 1
+    if partials is None:
+        partials = [scan_chunk(codebase_path, chunk, text, symbols) for chunk in chunks]
+    scan_seconds = time.perf_counter() - started - walk_seconds
+
+    text_index = CodebaseIndex.merge(codebase_path, (p["text"] for p in partials)) if text else None
+    symbol_index = SymbolIndex(
+        codebase_path, {record["path"]: record for p in partials for record in p["symbols"]}
+    ) if symbols else None
+
+    seconds = time.perf_counter() - started
+    total_bytes = sum(p["bytes"] for p in partials)
+    stats = {
+        "files": len(relative_paths),
+        "bytes": total_bytes,
+        "workers": workers,
+        "chunks": len(chunks),
+        "chunk_size": chunk_size,
+        "walk_seconds": round(walk_seconds, 4),
+        "scan_seconds": round(scan_seconds, 4),
+        "merge_seconds": round(seconds - walk_seconds - scan_seconds, 4),
+        "seconds": round(seconds, 4),
+        "files_per_second": round(len(relative_paths) / seconds, 1) if seconds else 0.0,
+        "mb_per_second": round(total_bytes / (1024 * 1024) / seconds, 2) if seconds else 0.0
+    }
+
+    built = [name for name, enabled in (("text", text), ("symbol", symbols)) if enabled]
+    print(f"Built {' and '.join(built)} index for {stats['files']} files with {workers} workers "
+          f"in {stats['seconds']:.2f}s ({stats['files_per_second']} files/s, {stats['mb_per_second']} MB/s)")
+    return text_index, symbol_index, stats
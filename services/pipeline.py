@@ -0,0 +1,120 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple, List
+
+# Called with (step name, result) as each step finishes
+StepCallback = Callable[[str, Any], None]
+
+
+class PipelineExecutor:
+    """Runs async steps as a dependency DAG
+
+    Every step starts as soon as the steps it depends on have finished, and
+    receives their results as keyword arguments. Per-step timings are
+    recorded, and the critical path is the chain of steps that each waited
+    on the latest-finishing dependency. With enough overlap, end-to-end
+    latency approaches that chain's length rather than the sum of all steps.
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], *deps: str) -> "PipelineExecutor":
+        if name in self.steps:
+            raise ValueError(f"Duplicate pipeline step: {name}")
+        self.steps[name] = (func, deps)
+        return self
+
+    def _check(self):
+        """Reject unknown dependencies and cycles before anything runs"""
+        state: Dict[str, int] = {}
+
+        def visit(name: str, chain: Tuple[str, ...]):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Pipeline cycle: {' -> '.join(chain + (name,))}")
+            state[name] = 1
+            for dep in self.steps[name][1]:
+                if dep not in self.steps:
+                    raise ValueError(f"Pipeline step {name} depends on unknown step {dep}")
+                visit(dep, chain + (name,))
+            state[name] = 2
+
+        for name in self.steps:
+            visit(name, ())
+
+    async def run(self, on_step: Optional[StepCallback] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Run every step and return (results by step name, timing trace)
+
+        The first failing step cancels the steps still running and its
+        exception is raised.
+        """
+        self._check()
+        started = time.perf_counter()
+        timings: Dict[str, Dict[str, float]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(name: str):
+            func, deps = self.steps[name]
+            inputs = {dep: await tasks[dep] for dep in deps}
+            step_started = time.perf_counter()
+            result = await func(**inputs)
+            timings[name] = {"start": step_started - started, "end": time.perf_counter() - started}
+            if on_step is not None:
+                on_step(name, result)
+            return result
+
+        for name in self.steps:
+            tasks[name] = asyncio.create_task(run_step(name), name=f"pipeline:{name}")
+
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            # The caller gave up: stop the steps too, so none outlives the run
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        # Steps waiting on a failed step re-raise its exception; retrieve them all
+        errors = [task.exception() for task in tasks.values() if task in done and not task.cancelled()]
+        error = next((error for error in errors if error is not None), None)
+        if error is not None:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise error
+
+        results = {name: task.result() for name, task in tasks.items()}
+        return results, self.trace(timings, time.perf_counter() - started)
+
+    def critical_path(self, timings: Dict[str, Dict[str, float]]) -> List[str]:
+        """Steps from the last to finish back through each one's latest-finishing dependency"""
+        if not timings:
+            return []
+        path = [max(timings, key=lambda name: timings[name]["end"])]
+        while True:
+            deps = self.steps[path[-1]][1]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda dep: timings[dep]["end"]))
+        return list(reversed(path))
+
+    def trace(self, timings: Dict[str, Dict[str, float]], total: float) -> Dict[str, Any]:
+        path = self.critical_path(timings)
+        durations = {name: timing["end"] - timing["start"] for name, timing in timings.items()}
+        return {
+            "total_ms": round(total * 1000, 2),
+            "sequential_ms": round(sum(durations.values()) * 1000, 2),
+            "critical_path": path,
+            "critical_path_ms": round(sum(durations[name] for name in path) * 1000, 2),
+            "steps": {
+                name: {
+                    "deps": list(self.steps[name][1]),
+                    "start_ms": round(timing["start"] * 1000, 2),
+                    "end_ms": round(timing["end"] * 1000, 2),
+                    "duration_ms": round(durations[name] * 1000, 2)
+                }
+                for name, timing in sorted(timings.items(), key=lambda item: item[1]["start"])
+            }
+        }
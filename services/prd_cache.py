@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Optional, Dict, Any
+
+from models.issue import GitHubIssue
+from models.prd import PRDDocument
+from services.config import env_int
+
+
+def text_digest(text: str) -> str:
+    """Stand-in for long prompt text in a cache key"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def prd_cache_key(issue: GitHubIssue, analysis_data: Dict[str, Any]) -> str:
+    """Hash of everything the PRD prompt is built from
+
+    A new issue revision (title, body, labels, state, comments), a
+    different set of relevant files or changed code excerpts give a new key.
+    """
+    payload = json.dumps({
+        "title": issue.title,
+        "body": issue.body or "",
+        "labels": sorted(label.name for label in issue.labels),
+        "state": issue.state,
+        "comments": [[comment.user.login, text_digest(comment.body or "")] for comment in issue.comments],
+        "relevant_files": analysis_data.get("relevant_files", []),
+        "analysis": analysis_data.get("analysis", ""),
+        "code_snippets": [
+            [snippet["path"], snippet["start_line"], snippet["end_line"], text_digest(snippet["text"])]
+            for snippet in analysis_data.get("code_snippets") or []
+        ]
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PRDCache:
+    """Persistent SQLite cache of LLM-written PRDs keyed by their inputs
+
+    Lets an LLM PRD that finished after its request was answered with the
+    template PRD serve the next request for the same issue revision.
+    Entries expire `ttl_seconds` after they were written, and the least
+    recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.path = path or os.getenv("PRD_CACHE_PATH", ".cache/prds.sqlite3")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else env_int("PRD_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+        self.max_entries = max_entries if max_entries is not None else env_int("PRD_CACHE_MAX_ENTRIES", 1000)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expirations": 0}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS prds (
+                    key TEXT PRIMARY KEY,
+                    prd_json TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS prds_accessed_at ON prds (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def get(self, key: str) -> Optional[PRDDocument]:
+        """Return the cached PRD, dropping it if its TTL has passed"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT prd_json, created_at FROM prds WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+
+            if self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM prds WHERE key = ?", (key,))
+                self._count("expirations")
+                self._count("misses")
+                return None
+
+            conn.execute("UPDATE prds SET accessed_at = ? WHERE key = ?", (now, key))
+
+        try:
+            prd = PRDDocument.model_validate_json(row[0])
+        except Exception as e:
+            print(f"Discarding unreadable PRD cache entry {key}: {str(e)}")
+            self.delete(key)
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return prd
+
+    def put(self, key: str, prd: PRDDocument):
+        """Store an LLM-written PRD and evict least recently used entries"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prds (key, prd_json, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, prd.model_dump_json(), now, now)
+            )
+            if self.max_entries > 0:
+                evicted = conn.execute(
+                    """DELETE FROM prds WHERE key IN (
+                           SELECT key FROM prds ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                       )""",
+                    (self.max_entries,)
+                ).rowcount
+                if evicted > 0:
+                    self._count("evictions", evicted)
+        self._count("writes")
+
+    def delete(self, key: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM prds WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size for the health endpoint"""
+        with self._lock:
+            counters = dict(self._counters)
+        try:
+            with closing(self._connect()) as conn:
+                entries = conn.execute("SELECT COUNT(*) FROM prds").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": True,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            **counters
+        }
@@ -1,6 +1,13 @@
-from typing import Dict, Any, List
+import asyncio
+import time
+from typing import Dict, Any, List, Optional, Tuple
 from models.issue import GitHubIssue
-from models.prd import PRDDocument, TechnicalRequirement, FileModification, UseCase
+from models.prd import PRDDocument, TechnicalRequirement, FileModification, UseCase, LineRange
+from services.config import env_int, env_float, env_flag
+from services.llm_cache import LLMResponseCache, DEFAULT_LLM_MODEL, get_llm_cache, run_task
+from services.prompt_builder import PromptBuilder, get_token_counter, issue_comment_items
+from services.prd_cache import PRDCache, prd_cache_key
+from services.snippets import format_snippets
 
 try:
     import upsonic
@@ -161,10 +168,25 @@ if UPSONIC_AVAILABLE:
 
 
 class PRDGenerator:
-    def __init__(self):
+    def __init__(self, cache: Optional[PRDCache] = None, latency_budget: Optional[float] = None):
         self.agent = None
         self.prd_tool = None
+        self.model_name = DEFAULT_LLM_MODEL
         self.setup_agent()
+        self.llm_cache: Optional[LLMResponseCache] = get_llm_cache() if self.agent else None
+
+        # Seconds the LLM PRD may take before the template PRD is served instead (0 waits indefinitely)
+        self.latency_budget = latency_budget if latency_budget is not None else env_float("PRD_LATENCY_BUDGET_SECONDS", 0.0)
+        self.cache = cache
+        if self.cache is None and self.agent and env_flag("PRD_CACHE_ENABLED", True):
+            try:
+                self.cache = PRDCache()
+            except Exception as e:
+                print(f"PRD cache unavailable: {str(e)}")
+        # LLM PRDs still being generated, shared by requests for the same issue revision:
+        # cache key -> (task, the copy of the analysis data it writes to)
+        self._pending: Dict[str, Tuple[asyncio.Task, Dict[str, Any]]] = {}
+        self.deadline_misses = 0
 
     def setup_agent(self):
         """Initialize Upsonic agent for PRD generation"""
@@ -176,25 +198,128 @@ class PRDGenerator:
         try:
             self.agent = upsonic.Agent()
             # Configure model provider for the agent
-            self.model = upsonic.models.ModelFactory.create('openai/gpt-4o-mini')
+            self.model = upsonic.models.ModelFactory.create(self.model_name)
             self.prd_tool = PRDTool()  # Decorated tools are auto-discovered
         except Exception as e:
             print(f"Error setting up PRD generator agent: {str(e)}")
             self.agent = None
             self.model = None
     
-    async def generate_prd(self, issue: GitHubIssue, analysis_data: Dict[str, Any]) -> PRDDocument:
-        """Generate comprehensive PRD document using AI-powered workflow"""
+    async def generate_prd(self, issue: GitHubIssue, analysis_data: Dict[str, Any],
+                           sections: Optional[Dict[str, Any]] = None) -> PRDDocument:
+        """Generate comprehensive PRD document using AI-powered workflow
+
+        `sections` are the analysis-independent sections from
+        generate_issue_sections, when the caller computed them ahead of the
+        codebase analysis.
+        """
         try:
             if self.agent:
                 # Try AI-powered PRD generation first
-                return await self.generate_prd_with_agent(issue, analysis_data)
+                prd = await self.generate_prd_within_budget(issue, analysis_data, sections)
             else:
-                return self.generate_prd_template_based(issue, analysis_data)
+                prd = self.generate_prd_template_based(issue, analysis_data, sections)
         except Exception as e:
             print(f"Error in AI-powered PRD generation: {str(e)}")
             # Fallback to template-based generation
-            return self.generate_prd_template_based(issue, analysis_data)
+            prd = self.generate_prd_template_based(issue, analysis_data, sections)
+            prd.degraded = True
+
+        # Agent-written modifications get the same symbol line ranges
+        self.attach_line_ranges(prd.file_modifications, analysis_data)
+        return prd
+
+    async def generate_prd_within_budget(self, issue: GitHubIssue, analysis_data: Dict[str, Any],
+                                         sections: Optional[Dict[str, Any]] = None) -> PRDDocument:
+        """LLM PRD from the cache, or raced against the template PRD under the latency budget
+
+        With a budget, the template PRD is built while the LLM call runs. If
+        the LLM misses the deadline the template PRD is returned flagged
+        `degraded`, and the LLM call keeps running in the background and
+        writes its PRD to the cache for the next request.
+        """
+        started = time.perf_counter()
+        key = prd_cache_key(issue, analysis_data)
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                print(f"Serving cached LLM PRD for: {issue.title}")
+                return cached
+
+        pending = self._pending.get(key)
+        if pending is None:
+            # A copy: the background call may outlive this request, and both add keys to it
+            task_data = dict(analysis_data)
+            task = asyncio.create_task(self._generate_and_cache(key, issue, task_data))
+            task.add_done_callback(lambda done: self._finish_pending(key, done))
+            self._pending[key] = (task, task_data)
+        else:
+            task, task_data = pending
+
+        # Shielded: a cancelled request must not abort the LLM call it shares
+        if self.latency_budget <= 0:
+            prd = await asyncio.shield(task)
+            self._merge_prompt_tokens(analysis_data, task_data)
+            return prd
+
+        template = await asyncio.to_thread(self.generate_prd_template_based, issue, analysis_data, sections)
+        remaining = self.latency_budget - (time.perf_counter() - started)
+        done, _ = await asyncio.wait({task}, timeout=max(0.0, remaining))
+        if task in done:
+            # A failed call was already logged when it finished
+            if task.exception() is None:
+                self._merge_prompt_tokens(analysis_data, task_data)
+                return task.result()
+        else:
+            self.deadline_misses += 1
+            print(f"LLM PRD missed the {self.latency_budget}s latency budget, serving the template PRD")
+        template.degraded = True
+        return template
+
+    async def _generate_and_cache(self, key: str, issue: GitHubIssue, analysis_data: Dict[str, Any]) -> PRDDocument:
+        prd = await self.generate_prd_with_agent(issue, analysis_data)
+        if self.cache:
+            try:
+                await asyncio.to_thread(self.cache.put, key, prd)
+            except Exception as e:
+                print(f"Failed to cache LLM PRD: {str(e)}")
+        return prd
+
+    @staticmethod
+    def _merge_prompt_tokens(analysis_data: Dict[str, Any], task_data: Dict[str, Any]):
+        """Report the PRD prompt size of the served LLM PRD in this request's analysis data"""
+        prd_report = (task_data.get('prompt_tokens') or {}).get('prd')
+        if prd_report is not None:
+            analysis_data['prompt_tokens'] = {**(analysis_data.get('prompt_tokens') or {}), "prd": prd_report}
+
+    def _finish_pending(self, key: str, task: asyncio.Task):
+        self._pending.pop(key, None)
+        # Retrieve the error of calls nobody waited for, such as ones that missed the deadline
+        if not task.cancelled() and task.exception() is not None:
+            print(f"LLM PRD generation failed: {str(task.exception())}")
+
+    async def stop(self):
+        """Cancel LLM PRDs still running in the background"""
+        pending = [task for task, _ in self._pending.values()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "agent" if self.agent else "template",
+            "latency_budget_seconds": self.latency_budget,
+            "deadline_misses": self.deadline_misses,
+            "background_generations": len(self._pending),
+            "cache": self.cache.stats() if self.cache else {"enabled": False}
+        }
+
+    def attach_line_ranges(self, modifications: List[FileModification], analysis_data: Dict[str, Any]):
+        """Fill in symbol line ranges found by the codebase analysis"""
+        symbol_locations = analysis_data.get('symbol_locations') or {}
+        for modification in modifications:
+            if not modification.line_ranges and modification.file_path in symbol_locations:
+                modification.line_ranges = [LineRange(**line_range) for line_range in symbol_locations[modification.file_path]]
 
     def _convert_task_result_to_prd(self, task_result, issue: GitHubIssue, analysis_data: Dict[str, Any]) -> PRDDocument:
         """Convert Task result to PRDDocument"""
@@ -266,22 +391,29 @@ class PRDGenerator:
         
         relevant_files = analysis_data.get('relevant_files', [])
         relevant_files_str = ', '.join(relevant_files) if relevant_files else 'No specific files identified'
+        code_snippets = analysis_data.get('code_snippets') or []
+
+        # The description is capped at half the budget; beyond that the lowest
+        # priority content is cut first: comments, code excerpts, analysis, description
+        counter = get_token_counter(self.model_name)
+        budget = env_int("PROMPT_TOKEN_BUDGET_PRD", 8000)
+        builder = PromptBuilder(budget, counter)
+        builder.add("task", "Create a comprehensive Project Requirements Document (PRD) for this GitHub issue.", 0)
+        builder.add("issue", f"""Issue Details:
+- Title: {issue.title}
+- Labels: {', '.join([label.name for label in issue.labels])}
+- State: {issue.state}""", 0)
+        builder.add("description", issue.body or 'No description provided', 1, header="Description:\n",
+                    min_tokens=64, max_tokens=budget // 2)
+        builder.add("analysis", analysis_data.get('analysis', 'No analysis available'), 2, header="Code Analysis:\n")
+        builder.add("relevant_files", f"Relevant Files Identified:\n{relevant_files_str}", 0)
+        builder.add_items(
+            "code_excerpts", [format_snippets([snippet]) for snippet in code_snippets], 3,
+            header="Relevant Code Excerpts:\n", separator="\n\n"
+        )
+        builder.add_items("comments", issue_comment_items(issue, counter), 4, header="Comments:\n")
 
         prd_prompt = f"""
-        Create a comprehensive Project Requirements Document (PRD) for this GitHub issue.
-
-        Issue Details:
-        - Title: {issue.title}
-        - Description: {issue.body or 'No description provided'}
-        - Labels: {', '.join([label.name for label in issue.labels])}
-        - State: {issue.state}
-
-        Code Analysis:
-        {analysis_data.get('analysis', 'No analysis available')}
-
-        Relevant Files Identified:
-        {relevant_files_str}
-
         CRITICAL: You MUST return ONLY a valid JSON object with this exact structure (no other text):
 
         {{
@@ -349,50 +481,61 @@ class PRDGenerator:
 
         The file_modifications array MUST contain entries for the relevant files identified in the analysis. Focus on practical, actionable suggestions for each file.
         """
-        
+        builder.add("output_format", prd_prompt, 0)
+        description, prompt_report = builder.render()
+        print(f"PRD prompt: {prompt_report['tokens']}/{prompt_report['budget']} tokens")
+        analysis_data['prompt_tokens'] = {**(analysis_data.get('prompt_tokens') or {}), "prd": prompt_report}
+
         # Create a task for PRD generation
         prd_task = upsonic.Task(
-            description=prd_prompt,
+            description=description,
             response_format=str
         )
 
         # Execute task
-        prd_content = await self.agent.do_async(prd_task, model=self.model)
+        prd_content = await run_task(self.agent, prd_task, self.model, self.model_name, self.llm_cache)
 
 
         # Parse the generated content into structured PRD
         return self.parse_generated_prd(prd_content, issue, analysis_data)
     
-    def generate_prd_template_based(self, issue: GitHubIssue, analysis_data: Dict[str, Any]) -> PRDDocument:
-        """Generate PRD using template-based approach"""
+    def generate_issue_sections(self, issue: GitHubIssue) -> Dict[str, Any]:
+        """PRD sections that depend only on the issue, not on the codebase analysis"""
 
         # Determine issue type and priority
         issue_type = self.determine_issue_type(issue)
         priority = self.determine_priority(issue)
 
-        # Generate title and overview
-        title = f"PRD: {issue.title}"
-        overview = self.generate_overview(issue, issue_type)
+        return {
+            "issue_type": issue_type,
+            "priority": priority,
+            "title": f"PRD: {issue.title}",
+            "overview": self.generate_overview(issue, issue_type),
+            "use_cases": self.generate_use_cases(issue, issue_type),
+            "constraints": self.generate_constraints(issue, issue_type)
+        }
+
+    def generate_prd_template_based(self, issue: GitHubIssue, analysis_data: Dict[str, Any],
+                                    sections: Optional[Dict[str, Any]] = None) -> PRDDocument:
+        """Generate PRD using template-based approach"""
+
+        # Title, overview, use cases and constraints
+        if sections is None:
+            sections = self.generate_issue_sections(issue)
 
         # Generate problem statement
         problem_statement = self.generate_problem_statement(issue, analysis_data)
 
-        # Generate use cases
-        use_cases = self.generate_use_cases(issue, issue_type)
-
         # Generate file modifications with issue context
         file_modifications = self.generate_file_modifications(issue, analysis_data)
 
-        # Generate constraints
-        constraints = self.generate_constraints(issue, issue_type)
-
         return PRDDocument(
-            title=title,
-            overview=overview,
+            title=sections["title"],
+            overview=sections["overview"],
             problem_statement=problem_statement,
-            use_cases=use_cases,
+            use_cases=sections["use_cases"],
             file_modifications=file_modifications,
-            constraints=constraints,
+            constraints=sections["constraints"],
             original_issue_json=issue.to_simplified_dict()
         )
     
@@ -530,6 +673,8 @@ class PRDGenerator:
     def generate_file_modifications(self, issue: GitHubIssue, analysis_data: Dict[str, Any]) -> List[FileModification]:
         """Generate specific file modification suggestions"""
         modifications = []
+        # Issues can have no description
+        body_lower = (issue.body or "").lower()
 
         relevant_files = analysis_data.get('relevant_files', [])
 
@@ -537,7 +682,7 @@ class PRDGenerator:
         core_files_map = {}
 
         # Tool/standalone function issues
-        if 'standalone' in issue.body.lower() or 'toolkit' in issue.body.lower():
+        if 'standalone' in body_lower or 'toolkit' in body_lower:
             core_files_map.update({
                 'src/upsonic/tools/__init__.py': {
                     'reason': 'Primary import path fix needed',
@@ -554,7 +699,7 @@ class PRDGenerator:
             })
 
         # Pricing issues
-        if 'pricing' in issue.body.lower() or 'dynamic' in issue.body.lower():
+        if 'pricing' in body_lower or 'dynamic' in body_lower:
             core_files_map.update({
                 'src/upsonic/models/providers.py': {
                     'reason': 'Model pricing data management',
@@ -567,7 +712,7 @@ class PRDGenerator:
             })
 
         # Security issues
-        if 'security' in issue.body.lower() or 'vulnerabilit' in issue.body.lower():
+        if 'security' in body_lower or 'vulnerabilit' in body_lower:
             core_files_map.update({
                 'SECURITY.md': {
                     'reason': 'Security policy documentation',
@@ -580,7 +725,7 @@ class PRDGenerator:
             })
 
         # Web API / FastAPI async issues
-        if 'hang' in issue.body.lower() or 'forever' in issue.body.lower() or 'fastapi' in issue.body.lower():
+        if 'hang' in body_lower or 'forever' in body_lower or 'fastapi' in body_lower:
             core_files_map.update({
                 'src/upsonic/agent/agent.py': {
                     'reason': 'Agent async/sync method implementation',
@@ -593,7 +738,7 @@ class PRDGenerator:
             })
 
         # Process/ServerManager issues
-        if 'process' in issue.body.lower() or 'termination' in issue.body.lower() or 'servermanager' in issue.body.lower():
+        if 'process' in body_lower or 'termination' in body_lower or 'servermanager' in body_lower:
             core_files_map.update({
                 'src/upsonic/server/level_two/server/server.py': {
                     'reason': 'ServerManager process termination logic',
@@ -606,7 +751,7 @@ class PRDGenerator:
             })
 
         # Pickle deserialization security issues
-        if 'pickle' in issue.body.lower() or 'deserialization' in issue.body.lower() or 'rce' in issue.body.lower():
+        if 'pickle' in body_lower or 'deserialization' in body_lower or 'rce' in body_lower:
             core_files_map.update({
                 'src/upsonic/server/level_two/server/server.py': {
                     'reason': 'get_temporary_memory function security',
@@ -623,7 +768,7 @@ class PRDGenerator:
             })
 
         # Documentation issues
-        if 'contributing' in issue.body.lower() or 'code_of_conduct' in issue.body.lower():
+        if 'contributing' in body_lower or 'code_of_conduct' in body_lower:
             core_files_map.update({
                 'CONTRIBUTING.md': {
                     'reason': 'Community contribution guidelines',
@@ -655,44 +800,55 @@ class PRDGenerator:
                 suggested_changes=file_info['changes']
             ))
 
+        # Relevant files that define symbols the issue names
+        symbol_locations = analysis_data.get('symbol_locations') or {}
+        suggested = {modification.file_path for modification in modifications}
+        for file_path in [f for f in relevant_files if f in symbol_locations and f not in suggested][:3]:
+            symbols = ', '.join(line_range['symbol'] for line_range in symbol_locations[file_path])
+            modifications.append(FileModification(
+                file_path=file_path,
+                reason=f"Defines {symbols}, referenced in the issue",
+                suggested_changes=f"Review the implementation of {symbols} and apply the changes needed to resolve the issue."
+            ))
+
         # Add context-aware documentation suggestions
-        if 'standalone' in issue.body.lower() or 'toolkit' in issue.body.lower():
+        if 'standalone' in body_lower or 'toolkit' in body_lower:
             modifications.append(FileModification(
                 file_path="README.md or docs/examples/",
                 reason="Documentation and examples need correct import paths",
                 suggested_changes="Replace any instances of 'from upsonic.tools.decorators import tool' with 'from upsonic.tools.tool import tool' in documentation and example code."
             ))
-        elif 'pricing' in issue.body.lower() or 'dynamic' in issue.body.lower():
+        elif 'pricing' in body_lower or 'dynamic' in body_lower:
             modifications.append(FileModification(
                 file_path="README.md",
                 reason="Documentation needs dynamic pricing examples",
                 suggested_changes="Add examples showing dynamic pricing integration with OpenRouter API, caching mechanisms, and real-time model availability detection."
             ))
-        elif 'hang' in issue.body.lower() or 'forever' in issue.body.lower() or 'fastapi' in issue.body.lower():
+        elif 'hang' in body_lower or 'forever' in body_lower or 'fastapi' in body_lower:
             modifications.append(FileModification(
                 file_path="examples/fastapi_async_example.py",
                 reason="FastAPI async integration example",
                 suggested_changes="Create example showing proper async FastAPI integration using agent.do_async() instead of blocking agent.do() calls."
             ))
-        elif 'process' in issue.body.lower() or 'termination' in issue.body.lower() or 'servermanager' in issue.body.lower():
+        elif 'process' in body_lower or 'termination' in body_lower or 'servermanager' in body_lower:
             modifications.append(FileModification(
                 file_path="docs/server_management.md",
                 reason="Server process management documentation",
                 suggested_changes="Document proper server shutdown procedures, process tree cleanup, and resource management best practices."
             ))
-        elif 'pickle' in issue.body.lower() or 'deserialization' in issue.body.lower() or 'rce' in issue.body.lower():
+        elif 'pickle' in body_lower or 'deserialization' in body_lower or 'rce' in body_lower:
             modifications.append(FileModification(
                 file_path="SECURITY.md",
                 reason="Security vulnerability documentation",
                 suggested_changes="Document security measures against pickle deserialization attacks, input validation requirements, and secure coding practices."
             ))
-        elif 'security' in issue.body.lower() or 'vulnerabilit' in issue.body.lower():
+        elif 'security' in body_lower or 'vulnerabilit' in body_lower:
             modifications.append(FileModification(
                 file_path="SECURITY.md",
                 reason="Security policy documentation",
                 suggested_changes="Create SECURITY.md with vulnerability reporting guidelines, private disclosure process, and security contact information."
             ))
-        elif 'contributing' in issue.body.lower() or 'code_of_conduct' in issue.body.lower():
+        elif 'contributing' in body_lower or 'code_of_conduct' in body_lower:
             modifications.append(FileModification(
                 file_path="CONTRIBUTING.md",
                 reason="Community contribution guidelines",
@@ -700,43 +856,46 @@ class PRDGenerator:
             ))
 
         # Add context-aware test case suggestions
-        if 'standalone' in issue.body.lower() or 'toolkit' in issue.body.lower():
+        if 'standalone' in body_lower or 'toolkit' in body_lower:
             modifications.append(FileModification(
                 file_path="tests/test_tool_function_standalone.py",
                 reason="Add test case for standalone tool functions",
                 suggested_changes="Create test case that verifies @tool decorated functions can be used directly in Task.tools without Toolkit wrapper class."
             ))
-        elif 'pricing' in issue.body.lower() or 'dynamic' in issue.body.lower():
+        elif 'pricing' in body_lower or 'dynamic' in body_lower:
             modifications.append(FileModification(
                 file_path="tests/test_dynamic_pricing.py",
                 reason="Add test case for dynamic pricing system",
                 suggested_changes="Create tests for OpenRouter API integration, caching mechanisms, and real-time pricing validation."
             ))
-        elif 'hang' in issue.body.lower() or 'forever' in issue.body.lower() or 'fastapi' in issue.body.lower():
+        elif 'hang' in body_lower or 'forever' in body_lower or 'fastapi' in body_lower:
             modifications.append(FileModification(
                 file_path="tests/test_fastapi_integration.py",
                 reason="Add test case for FastAPI async integration",
                 suggested_changes="Create tests for async FastAPI endpoints using agent.do_async() method and proper async handling."
             ))
-        elif 'process' in issue.body.lower() or 'termination' in issue.body.lower() or 'servermanager' in issue.body.lower():
+        elif 'process' in body_lower or 'termination' in body_lower or 'servermanager' in body_lower:
             modifications.append(FileModification(
                 file_path="tests/test_server_process_termination.py",
                 reason="Add test case for server process termination",
                 suggested_changes="Create tests for proper child process cleanup in ServerManager.stop() method and process tree termination."
             ))
-        elif 'pickle' in issue.body.lower() or 'deserialization' in issue.body.lower() or 'rce' in issue.body.lower():
+        elif 'pickle' in body_lower or 'deserialization' in body_lower or 'rce' in body_lower:
             modifications.append(FileModification(
                 file_path="tests/test_secure_deserialization.py",
                 reason="Add test case for secure deserialization",
                 suggested_changes="Create tests for safe pickle/cloudpickle deserialization, input validation, and RCE prevention mechanisms."
             ))
-        elif 'security' in issue.body.lower() or 'vulnerabilit' in issue.body.lower():
+        elif 'security' in body_lower or 'vulnerabilit' in body_lower:
             modifications.append(FileModification(
                 file_path="tests/test_security_engine.py",
                 reason="Add test case for security vulnerability detection",
                 suggested_changes="Create tests for security policy enforcement and vulnerability detection mechanisms."
             ))
 
+        # Point at the exact definitions the issue refers to
+        self.attach_line_ranges(modifications, analysis_data)
+
         return modifications
     
     def generate_constraints(self, issue: GitHubIssue, issue_type: str) -> List[str]:
@@ -0,0 +1,185 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+from models.issue import GitHubIssue
+
+# Exact token counts need the optional `tiktoken` package; without it tokens are estimated
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+TRUNCATION_MARKER = "\n[... truncated]"
+# Each comment is cut to this many tokens before the section budget applies
+COMMENT_TOKEN_LIMIT = 256
+FALLBACK_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Token counts and truncation with the model's tiktoken encoding, or ~4 characters per token"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.encoding = None
+        if TIKTOKEN_AVAILABLE:
+            try:
+                self.encoding = tiktoken.encoding_for_model((model_name or "").split("/")[-1])
+            except Exception:
+                try:
+                    self.encoding = tiktoken.get_encoding(FALLBACK_ENCODING)
+                except Exception as e:
+                    print(f"tiktoken encoding unavailable, estimating tokens: {str(e)}")
+        self.exact = self.encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return len(text) // CHARS_PER_TOKEN + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of the text within max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        return text[:max(0, (max_tokens - 1) * CHARS_PER_TOKEN)]
+
+
+@lru_cache(maxsize=8)
+def get_token_counter(model_name: Optional[str] = None) -> TokenCounter:
+    """Shared counter per model; loading an encoding is slow"""
+    return TokenCounter(model_name)
+
+
+@dataclass
+class PromptSection:
+    name: str
+    # Whole units kept or dropped together, e.g. one comment or one code excerpt
+    items: List[str]
+    # Lower numbers are kept first; 0 is never truncated or dropped
+    priority: int
+    header: str = ""
+    separator: str = "\n"
+    # A text section cut below this many tokens is dropped instead
+    min_tokens: int = 32
+    # Item sections drop whole items rather than cutting text
+    itemized: bool = False
+    # Cap regardless of the budget left, so one huge section cannot crowd out the rest
+    max_tokens: Optional[int] = None
+    rendered: str = field(default="", init=False)
+
+
+class PromptBuilder:
+    """Assembles a prompt from prioritized sections within a token budget
+
+    Sections are rendered in the order they were added, but the budget is
+    handed out by priority: priority 0 sections (instructions, output format)
+    are always kept, then the others in priority order get what is left.
+    A single-text section that does not fit (or exceeds its own `max_tokens`)
+    is truncated, or dropped when less than its `min_tokens` would remain; an
+    item section keeps whole items in order until the budget runs out. So the
+    lowest-priority content is cut first and the worst-case prompt size is
+    the budget.
+    """
+
+    def __init__(self, budget: int, counter: Optional[TokenCounter] = None):
+        self.budget = budget
+        self.counter = counter or get_token_counter()
+        self.sections: List[PromptSection] = []
+
+    def add(self, name: str, text: Optional[str], priority: int, header: str = "",
+            min_tokens: int = 32, max_tokens: Optional[int] = None) -> "PromptBuilder":
+        if text:
+            self.sections.append(PromptSection(
+                name, [text], priority, header, min_tokens=min_tokens, max_tokens=max_tokens
+            ))
+        return self
+
+    def add_items(self, name: str, items: List[str], priority: int, header: str = "",
+                  separator: str = "\n", max_tokens: Optional[int] = None) -> "PromptBuilder":
+        items = [item for item in items if item]
+        if items:
+            self.sections.append(PromptSection(
+                name, items, priority, header, separator, min_tokens=0, itemized=True, max_tokens=max_tokens
+            ))
+        return self
+
+    def _fit(self, section: PromptSection, remaining: int) -> Tuple[str, Dict[str, Any]]:
+        count = self.counter.count
+        full = section.header + section.separator.join(section.items)
+        original = count(full)
+        report = {"priority": section.priority, "original_tokens": original, "truncated": False, "dropped": False}
+        if section.itemized:
+            report["items"] = len(section.items)
+
+        if section.priority == 0:
+            return full, report
+        if section.max_tokens is not None:
+            remaining = min(remaining, section.max_tokens)
+        if original <= remaining:
+            return full, report
+
+        if section.itemized:
+            kept: List[str] = []
+            for item in section.items:
+                candidate = section.header + section.separator.join(kept + [item])
+                if count(candidate) > remaining:
+                    break
+                kept.append(item)
+            report["items_kept"] = len(kept)
+            if not kept:
+                report["dropped"] = True
+                return "", report
+            report["truncated"] = True
+            return section.header + section.separator.join(kept), report
+
+        available = remaining - count(section.header) - count(TRUNCATION_MARKER)
+        if available < section.min_tokens:
+            report["dropped"] = True
+            return "", report
+        report["truncated"] = True
+        return section.header + self.counter.truncate(section.items[0], available) + TRUNCATION_MARKER, report
+
+    def build(self) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Rendered text per section name ("" when dropped) and a per-section token report"""
+        remaining = self.budget
+        reports: Dict[str, Dict[str, Any]] = {}
+        for section in sorted(self.sections, key=lambda s: s.priority):
+            section.rendered, report = self._fit(section, remaining)
+            report["tokens"] = self.counter.count(section.rendered)
+            remaining -= report["tokens"]
+            reports[section.name] = report
+
+        rendered = {section.name: section.rendered for section in self.sections}
+        used = sum(report["tokens"] for report in reports.values())
+        return rendered, {
+            "budget": self.budget,
+            "tokens": used,
+            "exact": self.counter.exact,
+            "over_budget": used > self.budget,
+            "sections": reports
+        }
+
+    def render(self) -> Tuple[str, Dict[str, Any]]:
+        """The kept sections joined in the order they were added, and the token report"""
+        rendered, report = self.build()
+        return "\n\n".join(rendered[section.name] for section in self.sections if rendered[section.name]), report
+
+
+def issue_comment_items(issue: GitHubIssue, counter: TokenCounter, limit: Optional[int] = None,
+                        max_tokens: int = COMMENT_TOKEN_LIMIT) -> List[str]:
+    """One prompt item per issue comment, each cut to max_tokens"""
+    items = []
+    for comment in issue.comments[:limit]:
+        body = comment.body or ""
+        text = counter.truncate(body, max_tokens)
+        if text != body:
+            text += " [...]"
+        items.append(f"- {comment.user.login}: {text}")
+    return items
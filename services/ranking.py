@@ -0,0 +1,198 @@
+import math
+import time
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from services.codebase_index import CodebaseIndex, SYMBOL_FIELD, DOCSTRING_FIELD, tokenize
+from services.config import env_float
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+PATH_FIELD = "path"
+BODY_FIELD = "body"
+FIELDS = (PATH_FIELD, SYMBOL_FIELD, DOCSTRING_FIELD, BODY_FIELD)
+
+# Tokens shorter than this only match exactly, longer ones also match as a prefix
+MIN_PREFIX_LENGTH = 4
+
+
+def query_terms(index: CodebaseIndex, keywords: Iterable[str]) -> List[str]:
+    """Tokenize keywords and expand longer tokens to the index terms they prefix"""
+    terms = []
+    for keyword in keywords:
+        for token in tokenize(keyword):
+            if len(token) < MIN_PREFIX_LENGTH:
+                expanded = [token] if token in index.postings or token in index.path_postings else []
+            else:
+                expanded = set(CodebaseIndex._expand(index._terms, token))
+                expanded.update(CodebaseIndex._expand(index._path_terms, token))
+            for term in sorted(expanded):
+                if term not in terms:
+                    terms.append(term)
+    return terms
+
+
+class BM25Ranker:
+    """BM25F ranking over the fields of a CodebaseIndex
+
+    Term frequencies from the path, symbol names, docstrings and body are
+    length-normalized per field, weighted and summed before BM25 saturation.
+    Document lengths and length norms are precomputed when the ranker is
+    built and IDF values are cached per query term; with NumPy each query term is scored with array
+    operations over the whole corpus instead of a Python loop over files.
+    """
+
+    def __init__(self, index: CodebaseIndex, k1: Optional[float] = None, b: Optional[float] = None,
+                 weights: Optional[Dict[str, float]] = None):
+        self.index = index
+        self.k1 = k1 if k1 is not None else env_float("BM25_K1", 1.2)
+        self.b = b if b is not None else env_float("BM25_B", 0.75)
+        self.weights = weights or {
+            PATH_FIELD: env_float("BM25_WEIGHT_PATH", 5.0),
+            SYMBOL_FIELD: env_float("BM25_WEIGHT_SYMBOLS", 3.0),
+            DOCSTRING_FIELD: env_float("BM25_WEIGHT_DOCSTRINGS", 1.5),
+            BODY_FIELD: env_float("BM25_WEIGHT_BODY", 1.0)
+        }
+
+        started = time.perf_counter()
+        self.size = len(index.documents)
+        self.live_docs = sum(1 for doc in index.documents if doc is not None)
+
+        lengths = {field: [0.0] * self.size for field in FIELDS}
+        for doc_id, doc in enumerate(index.documents):
+            if doc is None:
+                continue
+            lengths[PATH_FIELD][doc_id] = float(len(tokenize(doc["path"])))
+            for field in (SYMBOL_FIELD, DOCSTRING_FIELD, BODY_FIELD):
+                lengths[field][doc_id] = float(doc["lengths"][field])
+
+        # Per-field length normalization: 1 - b + b * len / avg_len
+        self.norms: Dict[str, Any] = {}
+        for field, values in lengths.items():
+            average = sum(values) / self.live_docs if self.live_docs else 0.0
+            norms = [1 - self.b + self.b * value / average if average else 1.0 for value in values]
+            self.norms[field] = np.asarray(norms, dtype=np.float64) if NUMPY_AVAILABLE else norms
+
+        # term -> BM25 IDF, filled as terms are queried so mapped indexes stay undecoded
+        self.idf: Dict[str, float] = {}
+        self._arrays: Dict[Tuple[str, str], Any] = {}
+        self.build_seconds = time.perf_counter() - started
+
+    def _idf(self, term: str) -> float:
+        """BM25 IDF of a term, with document frequency taken across all fields"""
+        idf = self.idf.get(term)
+        if idf is None:
+            body_docs = self.index.postings.get(term, {})
+            path_docs = self.index.path_postings.get(term, [])
+            if not body_docs and not path_docs:
+                return 0.0
+            if not path_docs:
+                df = len(body_docs)
+            elif not body_docs:
+                df = len(path_docs)
+            else:
+                df = len(body_docs.keys() | set(path_docs))
+            idf = math.log(1 + (self.live_docs - df + 0.5) / (df + 0.5))
+            self.idf[term] = idf
+        return idf
+
+    def _field_postings(self, field: str, term: str) -> Dict[int, Any]:
+        if field == BODY_FIELD:
+            return self.index.postings.get(term, {})
+        if field == PATH_FIELD:
+            return {doc_id: 1 for doc_id in self.index.path_postings.get(term, [])}
+        return self.index.field_postings.get(field, {}).get(term, {})
+
+    @staticmethod
+    def _frequency(value: Any) -> int:
+        # Body postings hold line positions, the other fields hold counts
+        return len(value) if isinstance(value, list) else value
+
+    def _term_arrays(self, field: str, term: str):
+        """Doc ids and term frequencies of one field as arrays, cached per term"""
+        key = (field, term)
+        arrays = self._arrays.get(key)
+        if arrays is None:
+            docs = self._field_postings(field, term)
+            arrays = (
+                np.fromiter(docs.keys(), dtype=np.int64, count=len(docs)),
+                np.fromiter((self._frequency(v) for v in docs.values()), dtype=np.float64, count=len(docs))
+            )
+            self._arrays[key] = arrays
+        return arrays
+
+    def query_terms(self, keywords: Iterable[str]) -> List[str]:
+        return query_terms(self.index, keywords)
+
+    def score(self, keywords: Iterable[str]) -> Dict[int, float]:
+        """BM25F score of every matching document"""
+        terms = self.query_terms(keywords)
+        if not terms or not self.size:
+            return {}
+        if NUMPY_AVAILABLE:
+            return self._score_numpy(terms)
+        return self._score_python(terms)
+
+    def _score_numpy(self, terms: List[str]) -> Dict[int, float]:
+        scores = np.zeros(self.size, dtype=np.float64)
+        pseudo_tf = np.zeros(self.size, dtype=np.float64)
+        for term in terms:
+            pseudo_tf.fill(0.0)
+            for field, weight in self.weights.items():
+                doc_ids, frequencies = self._term_arrays(field, term)
+                if doc_ids.size:
+                    pseudo_tf[doc_ids] += weight * frequencies / self.norms[field][doc_ids]
+            scores += self._idf(term) * pseudo_tf / (self.k1 + pseudo_tf)
+
+        matched = np.nonzero(scores)[0]
+        return {int(doc_id): float(scores[doc_id]) for doc_id in matched}
+
+    def _score_python(self, terms: List[str]) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for term in terms:
+            pseudo_tf: Dict[int, float] = {}
+            for field, weight in self.weights.items():
+                norms = self.norms[field]
+                for doc_id, value in self._field_postings(field, term).items():
+                    pseudo_tf[doc_id] = pseudo_tf.get(doc_id, 0.0) + weight * self._frequency(value) / norms[doc_id]
+            idf = self._idf(term)
+            for doc_id, tf in pseudo_tf.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf / (self.k1 + tf)
+        return scores
+
+    def rank(self, keywords: Iterable[str], limit: Optional[int] = None,
+             doc_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Documents sorted by descending score, optionally restricted to `doc_ids`"""
+        scores = self.score(keywords)
+        if doc_ids is not None:
+            allowed = set(doc_ids)
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id in allowed}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.index.path_of(item[0])))
+        return ranked[:limit] if limit is not None else ranked
+
+    def matched_fields(self, doc_id: int, keywords: Iterable[str]) -> List[str]:
+        """`field:keyword` labels explaining why a document matched"""
+        labels = []
+        for keyword in keywords:
+            terms = self.query_terms([keyword])
+            for field in FIELDS:
+                if any(doc_id in self._field_postings(field, term) for term in terms):
+                    label = f"{field}:{keyword}"
+                    if label not in labels:
+                        labels.append(label)
+        return labels
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self.live_docs,
+            "terms": len(self.index.postings),
+            "numpy": NUMPY_AVAILABLE,
+            "k1": self.k1,
+            "b": self.b,
+            "weights": dict(self.weights),
+            "build_seconds": round(self.build_seconds, 4)
+        }
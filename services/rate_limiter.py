@@ -0,0 +1,209 @@
+import asyncio
+import random
+import time
+from typing import Optional, Dict, Any
+
+import httpx
+
+from services.config import env_float, env_int
+
+
+class GitHubRateLimitError(Exception):
+    """Raised when GitHub keeps rate limiting a request after all retries"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GitHubRateLimiter:
+    """Central token-bucket scheduler for GitHub API calls
+
+    Every request takes a token from a bucket refilled at `rate` per second.
+    The remaining quota reported in `X-RateLimit-*` headers is tracked per
+    resource (core, graphql, ...); once it drops below `low_watermark` the
+    remaining calls are spread evenly until the quota resets. Rate-limited
+    responses are retried honouring `Retry-After`, falling back to jittered
+    exponential backoff for secondary rate limits.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[int] = None,
+                 low_watermark: Optional[int] = None, max_retries: Optional[int] = None,
+                 backoff_base: Optional[float] = None, backoff_max: Optional[float] = None,
+                 max_wait: Optional[float] = None):
+        self.rate = rate if rate is not None else env_float("GITHUB_RATE_LIMIT_RPS", 10.0)
+        self.burst = burst if burst is not None else env_int("GITHUB_RATE_LIMIT_BURST", 20)
+        self.low_watermark = low_watermark if low_watermark is not None else env_int("GITHUB_RATE_LIMIT_LOW_WATERMARK", 100)
+        self.max_retries = max_retries if max_retries is not None else env_int("GITHUB_RATE_LIMIT_MAX_RETRIES", 4)
+        self.backoff_base = backoff_base if backoff_base is not None else env_float("GITHUB_RATE_LIMIT_BACKOFF_BASE", 1.0)
+        self.backoff_max = backoff_max if backoff_max is not None else env_float("GITHUB_RATE_LIMIT_BACKOFF_MAX", 60.0)
+        # Waits longer than this fail fast instead of holding the request open
+        self.max_wait = max_wait if max_wait is not None else env_float("GITHUB_RATE_LIMIT_MAX_WAIT", 120.0)
+
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._quota: Dict[str, Dict[str, float]] = {}
+
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait_observed = 0.0
+        self.retries = 0
+        self.rate_limited_responses = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def _quota_delay(self, resource: str) -> float:
+        """Seconds to wait before spending more of a nearly exhausted quota"""
+        quota = self._quota.get(resource)
+        if not quota:
+            return 0.0
+
+        until_reset = quota["reset"] - time.time()
+        if until_reset <= 0:
+            # Window has rolled over; wait for fresh headers
+            self._quota.pop(resource, None)
+            return 0.0
+        if quota["remaining"] <= 0:
+            return until_reset
+        if quota["remaining"] <= self.low_watermark:
+            return until_reset / quota["remaining"]
+        return 0.0
+
+    async def acquire(self, resource: str = "core"):
+        """Wait for a token and for the quota pacing interval, in FIFO order"""
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        started = time.monotonic()
+        try:
+            async with self._lock:
+                delay = self._quota_delay(resource)
+                if delay > self.max_wait:
+                    raise GitHubRateLimitError(
+                        f"GitHub {resource} quota exhausted, resets in {delay:.0f}s",
+                        retry_after=delay
+                    )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                self._refill(time.monotonic())
+                if self._tokens < 1:
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+                    self._refill(time.monotonic())
+                self._tokens -= 1
+
+                if resource in self._quota:
+                    self._quota[resource]["remaining"] -= 1
+        finally:
+            self.queue_depth -= 1
+
+        waited = time.monotonic() - started
+        self.requests += 1
+        self.total_wait += waited
+        self.max_wait_observed = max(self.max_wait_observed, waited)
+        if waited > 0.001:
+            self.throttled += 1
+
+    def update_from_headers(self, headers: httpx.Headers, default_resource: str = "core"):
+        """Track remaining quota from `X-RateLimit-*` response headers"""
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            resource = headers.get("x-ratelimit-resource", default_resource)
+            self._quota[resource] = {
+                "remaining": float(remaining),
+                "reset": float(reset),
+                "limit": float(headers.get("x-ratelimit-limit", 0))
+            }
+        except ValueError:
+            pass
+
+    def retry_delay(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Delay before retrying a rate-limited response, or None if it was not rate limited"""
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = response.headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+        if response.headers.get("x-ratelimit-remaining") == "0":
+            try:
+                return max(0.0, float(response.headers.get("x-ratelimit-reset", 0)) - time.time())
+            except ValueError:
+                pass
+
+        if response.status_code == 429 or "rate limit" in response.text.lower():
+            # Secondary rate limit without guidance: full-jitter exponential backoff
+            return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+        # A plain 403 (permissions, SSO, ...) is not retryable
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, wait-time and quota metrics for the health endpoint"""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "avg_wait_seconds": round(self.total_wait / self.requests, 4) if self.requests else 0.0,
+            "max_wait_seconds": round(self.max_wait_observed, 4),
+            "retries": self.retries,
+            "rate_limited_responses": self.rate_limited_responses,
+            "tokens_available": round(self._tokens, 2),
+            "quota": {resource: dict(values) for resource, values in self._quota.items()}
+        }
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that routes every request through a GitHubRateLimiter"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, rate_limiter: GitHubRateLimiter):
+        self.transport = transport
+        self.rate_limiter = rate_limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        resource = "graphql" if request.url.path.rstrip("/").endswith("/graphql") else "core"
+        attempt = 0
+
+        while True:
+            await self.rate_limiter.acquire(resource)
+            response = await self.transport.handle_async_request(request)
+            self.rate_limiter.update_from_headers(response.headers, resource)
+
+            if response.status_code not in (403, 429):
+                return response
+
+            await response.aread()
+            delay = self.rate_limiter.retry_delay(response, attempt)
+            if delay is None:
+                return response
+
+            # The rate-limited response is dropped either way; release its connection
+            await response.aclose()
+            self.rate_limiter.rate_limited_responses += 1
+            if attempt >= self.rate_limiter.max_retries or delay > self.rate_limiter.max_wait:
+                raise GitHubRateLimitError(
+                    f"GitHub rate limit hit for {request.url.path} after {attempt + 1} attempts",
+                    retry_after=delay
+                )
+
+            attempt += 1
+            self.rate_limiter.retries += 1
+            print(f"GitHub rate limited ({response.status_code}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Iterable, Optional
+
+from services.config import env_int
+from services.codebase_analyzer import CodebaseAnalyzer, DEFAULT_CODEBASE_PATH
+from services.github_service import is_github_name
+from services.index_refresher import IndexRefresher
+
+# gzip-compressed JSON indexes take roughly this many times their file size
+# once loaded as Python objects; other index files are memory-mapped
+GZIP_JSON_EXPANSION = 12
+
+
+def parse_repo_map(value: str) -> Dict[str, str]:
+    """`owner/repo=/path/to/checkout` pairs separated by commas or semicolons"""
+    repos = {}
+    for entry in value.replace(";", ",").split(","):
+        if "=" not in entry:
+            continue
+        name, path = entry.split("=", 1)
+        name, path = name.strip().lower(), path.strip()
+        if name.count("/") == 1 and path:
+            repos[name] = os.path.expanduser(path)
+        else:
+            print(f"Ignoring invalid CODEBASE_REPOS entry: {entry.strip()}")
+    return repos
+
+
+def file_resident_bytes(path: str) -> int:
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    return size * GZIP_JSON_EXPANSION if path.endswith(".gz") else size
+
+
+def estimate_index_bytes(paths: Iterable[str]) -> int:
+    """Approximate resident size of loaded indexes from their files (or directories of files)"""
+    total = 0
+    for path in paths:
+        if not os.path.isdir(path):
+            total += file_resident_bytes(path)
+            continue
+        for root, _, files in os.walk(path):
+            total += sum(file_resident_bytes(os.path.join(root, name)) for name in files)
+    return total
+
+
+class RepoRegistry:
+    """Maps `owner/repo` to a local checkout and keeps its analyzer resident
+
+    Checkouts come from an explicit map (CODEBASE_REPOS) or a directory of
+    clones (CODEBASE_REPOS_ROOT, as <root>/<owner>/<repo> or <root>/<repo>);
+    unknown repos use the default checkout (CODEBASE_PATH). Analyzers and
+    their indexes are loaded on first use and kept in an LRU bounded by a
+    repo count and an estimated memory budget. The least recently used repo
+    is evicted first, and the repo being served is never evicted.
+
+    Indexes are loaded in a worker thread before an analyzer is handed out,
+    and each repo's size is estimated once at that point. Callers hold an
+    analyzer through `lease`; an evicted analyzer is closed, unmapping its
+    index files, when its last lease ends.
+    """
+
+    def __init__(self, repos: Optional[Dict[str, str]] = None, root: Optional[str] = None,
+                 default_path: Optional[str] = None, max_repos: Optional[int] = None,
+                 memory_budget_mb: Optional[int] = None):
+        self.repos = {name.lower(): path for name, path in (repos or {}).items()}
+        self.root = root
+        self.default_path = default_path or DEFAULT_CODEBASE_PATH
+        self.max_repos = max(1, max_repos if max_repos is not None else env_int("CODEBASE_REGISTRY_MAX_REPOS", 8))
+        budget_mb = memory_budget_mb if memory_budget_mb is not None else env_int("CODEBASE_REGISTRY_MEMORY_MB", 1024)
+        self.memory_budget = budget_mb * 1024 * 1024
+
+        # checkout path -> {"analyzer", "refresher", "repos", "loaded_at", "bytes", "leases", "evicted"},
+        # least recently used first
+        self._resident: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "RepoRegistry":
+        return cls(
+            repos=parse_repo_map(os.getenv("CODEBASE_REPOS", "")),
+            root=os.getenv("CODEBASE_REPOS_ROOT") or None,
+            default_path=os.getenv("CODEBASE_PATH") or None
+        )
+
+    def resolve(self, owner: str, repo: str) -> str:
+        """Local checkout for a repository, falling back to the default codebase
+
+        Raises ValueError for names GitHub would not accept, so an issue URL
+        cannot point the registry at a path outside the repos root.
+        """
+        if not (is_github_name(owner) and is_github_name(repo)):
+            raise ValueError(f"Invalid GitHub repository: {owner}/{repo}")
+        name = f"{owner}/{repo}".lower()
+        if name in self.repos:
+            return self.repos[name]
+        if self.root:
+            root = os.path.realpath(self.root)
+            for candidate in (os.path.join(self.root, owner, repo), os.path.join(self.root, repo)):
+                # Symlinks in the root must not lead out of it either
+                real = os.path.realpath(candidate)
+                if os.path.isdir(candidate) and os.path.commonpath([root, real]) == root and real != root:
+                    return candidate
+        return self.default_path
+
+    def preloadable(self, owner: str, repo: str) -> bool:
+        """Whether a repository's analyzer may load before its issue is fetched
+
+        Only repos that are resident or explicitly configured qualify; any
+        other name has to be confirmed by GitHub first, so an unknown or
+        invalid URL cannot make the server build indexes.
+        """
+        try:
+            codebase_path = self.resolve(owner, repo)
+        except ValueError:
+            return False
+        return f"{owner}/{repo}".lower() in self.repos or codebase_path in self._resident
+
+    def peek(self, codebase_path: Optional[str] = None) -> Optional[CodebaseAnalyzer]:
+        """Resident analyzer for a checkout (default: the default codebase), without loading it"""
+        entry = self._resident.get(codebase_path or self.default_path)
+        return entry["analyzer"] if entry else None
+
+    @asynccontextmanager
+    async def lease(self, owner: Optional[str] = None, repo: Optional[str] = None) -> AsyncIterator[CodebaseAnalyzer]:
+        """Analyzer for a repository, loading its indexes on first use
+
+        The analyzer stays open until the block exits, even if the repo is
+        evicted meanwhile.
+        """
+        entry = await self._acquire(owner, repo)
+        try:
+            yield entry["analyzer"]
+        finally:
+            await self._release(entry)
+
+    async def _acquire(self, owner: Optional[str], repo: Optional[str]) -> Dict[str, Any]:
+        """Resident entry for a repository with a lease taken on it"""
+        codebase_path = self.resolve(owner, repo) if owner and repo else self.default_path
+        entry = self._resident.get(codebase_path)
+        if entry is None:
+            lock = self._loading.setdefault(codebase_path, asyncio.Lock())
+            async with lock:
+                entry = self._resident.get(codebase_path)
+                if entry is None:
+                    # Shielded so a cancelled request does not throw away a half-loaded index
+                    entry = await asyncio.shield(self._load(codebase_path))
+            self._loading.pop(codebase_path, None)
+
+        # Leased before the next await, so a concurrent eviction cannot close it under us
+        entry["leases"] += 1
+        if owner and repo:
+            entry["repos"].add(f"{owner}/{repo}".lower())
+        self._resident.move_to_end(codebase_path)
+        try:
+            await self._evict(keep=codebase_path)
+        except BaseException:
+            await self._release(entry)
+            raise
+        return entry
+
+    async def _release(self, entry: Dict[str, Any]):
+        entry["leases"] -= 1
+        if entry["evicted"] and not entry["leases"]:
+            await self._close(entry)
+
+    async def _load(self, codebase_path: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        # Loading and building indexes reads and decodes files, keep it off the event loop
+        analyzer = await asyncio.to_thread(CodebaseAnalyzer, codebase_path)
+        await asyncio.to_thread(analyzer.warm)
+        size = await asyncio.to_thread(estimate_index_bytes, analyzer.loaded_index_paths())
+        refresher = IndexRefresher(analyzer)
+        await refresher.start()
+
+        entry = {
+            "analyzer": analyzer, "refresher": refresher, "repos": set(), "loaded_at": time.time(),
+            "bytes": size, "leases": 0, "evicted": False
+        }
+        self._resident[codebase_path] = entry
+        self.loads += 1
+        print(f"Loaded codebase {codebase_path} in {time.perf_counter() - started:.2f}s")
+        # The load is shielded and may outlive its caller, so enforce the bounds here too
+        await self._evict(keep=codebase_path)
+        return entry
+
+    async def _evict(self, keep: str):
+        """Drop least recently used repos while over the repo count or memory budget"""
+        while len(self._resident) > 1:
+            over_count = len(self._resident) > self.max_repos
+            if not over_count and self.memory_bytes() <= self.memory_budget:
+                return
+            codebase_path = next(iter(self._resident))
+            if codebase_path == keep:
+                self._resident.move_to_end(codebase_path)
+                codebase_path = next(iter(self._resident))
+            entry = self._resident.pop(codebase_path)
+            entry["evicted"] = True
+            await entry["refresher"].stop()
+            self.evictions += 1
+            print(f"Evicted codebase {codebase_path} from the registry")
+            if not entry["leases"]:
+                await self._close(entry)
+
+    async def _close(self, entry: Dict[str, Any]):
+        await asyncio.to_thread(entry["analyzer"].close)
+
+    def memory_bytes(self) -> int:
+        return sum(entry["bytes"] for entry in self._resident.values())
+
+    async def stop(self):
+        for entry in self._resident.values():
+            await entry["refresher"].stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured_repos": len(self.repos),
+            "repos_root": self.root,
+            "default_path": self.default_path,
+            "resident": {
+                codebase_path: {
+                    "repos": sorted(entry["repos"]),
+                    "estimated_bytes": entry["bytes"],
+                    "leases": entry["leases"],
+                    "index": entry["analyzer"].index.stats() if entry["analyzer"].index else {"loaded": False},
+                    "symbols": entry["analyzer"].symbols.stats() if entry["analyzer"].symbols else {"loaded": False},
+                    "refresher": entry["refresher"].stats()
+                }
+                for codebase_path, entry in self._resident.items()
+            },
+            "max_repos": self.max_repos,
+            "memory_budget_bytes": self.memory_budget,
+            "memory_bytes": self.memory_bytes(),
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
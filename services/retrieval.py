@@ -0,0 +1,206 @@
+import asyncio
+import os
+import time
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple
+
+from services.config import env_int, env_float
+from services.ranking import BM25Ranker
+from services.symbol_index import SymbolIndex
+from services.vector_index import VectorIndex
+
+# A retriever maps a query ({"text", "keywords", "names"}) to ranked hits,
+# best first: [{"path", "score", "evidence": [...]}]
+Retriever = Callable[[Dict[str, Any]], List[Dict[str, Any]]]
+
+LEXICAL = "lexical"
+SYMBOL = "symbol"
+VECTOR = "vector"
+
+
+def lexical_retriever(ranker: BM25Ranker, depth: int) -> Retriever:
+    """BM25F over path, symbol names, docstrings and body"""
+    def retrieve(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {"path": ranker.index.path_of(doc_id), "score": score, "evidence": []}
+            for doc_id, score in ranker.rank(query["keywords"], limit=depth)
+        ]
+    return retrieve
+
+
+def symbol_retriever(symbols: SymbolIndex, depth: int) -> Retriever:
+    """Files defining the names the issue mentions, most definitions first"""
+    def retrieve(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        paths = symbols.definition_paths(query["names"])
+        ranked = sorted(paths.items(), key=lambda item: (-len(item[1]), item[0]))[:depth]
+        return [{"path": path, "score": float(len(defined)), "evidence": defined} for path, defined in ranked]
+    return retrieve
+
+
+def vector_retriever(vectors: VectorIndex, depth: int) -> Retriever:
+    """Files of the code chunks closest to the issue text, scored by their best chunk"""
+    def retrieve(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        hits: Dict[str, Dict[str, Any]] = {}
+        for chunk in vectors.search(query["text"], k=depth):
+            hit = hits.setdefault(chunk["path"], {"path": chunk["path"], "score": chunk["score"], "evidence": []})
+            if chunk["symbol"]:
+                hit["evidence"].append(f"{chunk['symbol']} (lines {chunk['start_line']}-{chunk['end_line']})")
+        return sorted(hits.values(), key=lambda hit: (-hit["score"], hit["path"]))
+    return retrieve
+
+
+def reciprocal_rank_fusion(results: Dict[str, List[Dict[str, Any]]], weights: Dict[str, float],
+                           k: float) -> Dict[str, float]:
+    """sum(weight / (k + rank)) per file; needs no score calibration between retrievers"""
+    fused: Dict[str, float] = {}
+    for name, hits in results.items():
+        weight = weights.get(name, 1.0)
+        for rank, hit in enumerate(hits, start=1):
+            fused[hit["path"]] = fused.get(hit["path"], 0.0) + weight / (k + rank)
+    return fused
+
+
+def linear_fusion(results: Dict[str, List[Dict[str, Any]]], weights: Dict[str, float],
+                  k: float) -> Dict[str, float]:
+    """Weighted sum of min-max normalized scores"""
+    fused: Dict[str, float] = {}
+    for name, hits in results.items():
+        if not hits:
+            continue
+        weight = weights.get(name, 1.0)
+        high = max(hit["score"] for hit in hits)
+        low = min(hit["score"] for hit in hits)
+        for hit in hits:
+            normalized = (hit["score"] - low) / (high - low) if high > low else 1.0
+            fused[hit["path"]] = fused.get(hit["path"], 0.0) + weight * normalized
+    return fused
+
+
+FUSION_METHODS = {
+    "rrf": reciprocal_rank_fusion,
+    "linear": linear_fusion
+}
+
+
+def normalize_path(path: str, codebase_path: str) -> str:
+    """Relative, slash-separated form of a path suggested by the LLM"""
+    path = str(path).strip().strip("`'\"")
+    if os.path.isabs(path):
+        path = os.path.relpath(path, codebase_path)
+    path = path.replace(os.sep, "/")
+    while path.startswith("./"):
+        path = path[2:]
+    return path
+
+
+class HybridRetriever:
+    """Queries several retrievers concurrently and fuses their rankings
+
+    Retrievers run in worker threads; one that fails contributes no hits
+    instead of failing the query. Fusion is reciprocal-rank fusion by
+    default, or a linear blend of normalized scores whose per-retriever
+    weights (HYBRID_WEIGHT_<NAME>) can be fitted offline.
+    """
+
+    def __init__(self, retrievers: Dict[str, Retriever], fusion: Optional[str] = None,
+                 weights: Optional[Dict[str, float]] = None, rrf_k: Optional[float] = None):
+        self.retrievers = retrievers
+        self.fusion = (fusion or os.getenv("HYBRID_FUSION", "rrf")).lower()
+        if self.fusion not in FUSION_METHODS:
+            print(f"Unknown fusion method {self.fusion}, using rrf")
+            self.fusion = "rrf"
+        self.weights = weights or {
+            name: env_float(f"HYBRID_WEIGHT_{name.upper()}", 1.0) for name in retrievers
+        }
+        self.rrf_k = rrf_k if rrf_k is not None else env_float("HYBRID_RRF_K", 60.0)
+
+    @staticmethod
+    def _timed(retriever: Retriever, query: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], float]:
+        started = time.perf_counter()
+        hits = retriever(query)
+        return hits, time.perf_counter() - started
+
+    async def retrieve(self, query: Dict[str, Any], limit: Optional[int] = None) -> Dict[str, Any]:
+        """Fused file ranking with per-retriever latency and any retriever errors"""
+        limit = limit if limit is not None else env_int("HYBRID_RESULT_LIMIT", 20)
+        started = time.perf_counter()
+
+        names = list(self.retrievers)
+        outcomes = await asyncio.gather(
+            *(asyncio.to_thread(self._timed, self.retrievers[name], query) for name in names),
+            return_exceptions=True
+        )
+
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        latency: Dict[str, float] = {}
+        errors: Dict[str, str] = {}
+        for name, outcome in zip(names, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Retriever {name} failed: {str(outcome)}")
+                errors[name] = str(outcome)
+                results[name] = []
+                continue
+            results[name], seconds = outcome
+            latency[name] = round(seconds * 1000, 2)
+
+        fusion_started = time.perf_counter()
+        fused = FUSION_METHODS[self.fusion](results, self.weights, self.rrf_k)
+        ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+        files = []
+        for path, score in ranked:
+            ranks = {}
+            evidence: List[str] = []
+            for name, hits in results.items():
+                for rank, hit in enumerate(hits, start=1):
+                    if hit["path"] == path:
+                        ranks[name] = rank
+                        evidence.extend(item for item in hit["evidence"] if item not in evidence)
+                        break
+            files.append({"path": path, "score": round(score, 6), "ranks": ranks, "evidence": evidence[:5]})
+
+        latency["fusion"] = round((time.perf_counter() - fusion_started) * 1000, 2)
+        latency["total"] = round((time.perf_counter() - started) * 1000, 2)
+        return {"fusion": self.fusion, "files": files, "latency_ms": latency, "errors": errors}
+
+    @staticmethod
+    def verify(candidates: Iterable[str], retrieval: Dict[str, Any], known_paths: Iterable[str],
+               codebase_path: str, limit: int) -> Tuple[List[str], Dict[str, List[str]]]:
+        """Check suggested files against the codebase and the fused ranking
+
+        Suggestions that are not files of the codebase are dropped; the
+        remaining ones keep their order and are topped up to `limit` with the
+        best fused results. Returns the files and a verification report.
+        """
+        known = set(known_paths)
+        retrieved = [entry["path"] for entry in retrieval.get("files", [])]
+        retrieved_set = set(retrieved)
+
+        report: Dict[str, List[str]] = {"confirmed": [], "unranked": [], "rejected": [], "added": []}
+        files: List[str] = []
+        for candidate in candidates:
+            path = normalize_path(candidate, codebase_path)
+            if path in files:
+                continue
+            # Non-Python files (docs, config) are not indexed but may still exist
+            if path not in known and not os.path.isfile(os.path.join(codebase_path, path)):
+                report["rejected"].append(str(candidate))
+                continue
+            files.append(path)
+            report["confirmed" if path in retrieved_set else "unranked"].append(path)
+
+        for path in retrieved:
+            if len(files) >= limit:
+                break
+            if path not in files:
+                files.append(path)
+                report["added"].append(path)
+        return files, report
+
+
+def format_candidates(retrieval: Dict[str, Any], limit: int) -> str:
+    """Compact prompt section listing the best fused files and their evidence"""
+    lines = []
+    for entry in retrieval.get("files", [])[:limit]:
+        evidence = f" - {', '.join(entry['evidence'][:3])}" if entry["evidence"] else ""
+        lines.append(f"- {entry['path']}{evidence}")
+    return "\n".join(lines)
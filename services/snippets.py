@@ -0,0 +1,189 @@
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from services.config import env_int
+from services.codebase_index import CodebaseIndex
+from services.prompt_builder import TokenCounter, get_token_counter
+from services.ranking import query_terms
+from services.symbol_index import SymbolIndex
+
+# Hits on definitions of named symbols outweigh plain keyword mentions
+KEYWORD_HIT_WEIGHT = 1.0
+SYMBOL_HIT_WEIGHT = 3.0
+
+READ_CHUNK_BYTES = 1 << 16
+
+
+def line_offsets(full_path: str) -> array:
+    """Byte offset of the start of every line, plus the file size
+
+    The file is streamed in chunks, so building the table never holds the
+    whole file in memory.
+    """
+    offsets = array("Q", [0])
+    position = 0
+    with open(full_path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            start = chunk.find(b"\n")
+            while start != -1:
+                offsets.append(position + start + 1)
+                start = chunk.find(b"\n", start + 1)
+            position += len(chunk)
+    if offsets[-1] != position:
+        offsets.append(position)
+    return offsets
+
+
+def merge_windows(windows: Iterable[Tuple[int, int, float]],
+                  max_lines: Optional[int] = None) -> List[Tuple[int, int, float]]:
+    """Merge overlapping or adjacent (start, end, score) line windows, summing scores
+
+    A merge that would grow a window past `max_lines` starts a new window
+    after it instead, so dense hits do not swallow a whole file.
+    """
+    merged: List[List[Any]] = []
+    for start, end, score in sorted(windows):
+        if merged and start <= merged[-1][1] + 1:
+            previous = merged[-1]
+            if max_lines is None or max(previous[1], end) - previous[0] + 1 <= max_lines:
+                previous[1] = max(previous[1], end)
+                previous[2] += score
+                continue
+            start = previous[1] + 1
+            if start > end:
+                previous[2] += score
+                continue
+        merged.append([start, end, score])
+    return [(start, end, score) for start, end, score in merged]
+
+
+class SnippetExtractor:
+    """Ranked line windows around keyword and symbol hits, within a token budget
+
+    Hit lines come from the text index postings and the symbol index, so
+    finding them reads no files. Each file's line-offset table is cached
+    (keyed on mtime and size) and only the byte ranges of the selected
+    windows are read. Window sizes are counted with the same token counter
+    as the prompts they go into.
+    """
+
+    def __init__(self, codebase_path: str, index: CodebaseIndex, symbols: Optional[SymbolIndex] = None,
+                 context_lines: Optional[int] = None, max_window_lines: Optional[int] = None,
+                 counter: Optional[TokenCounter] = None):
+        self.codebase_path = codebase_path
+        self.index = index
+        self.symbols = symbols
+        self.counter = counter or get_token_counter()
+        self.context_lines = context_lines if context_lines is not None else env_int("SNIPPET_CONTEXT_LINES", 3)
+        self.max_window_lines = max_window_lines if max_window_lines is not None else env_int("SNIPPET_MAX_WINDOW_LINES", 40)
+        self.doc_ids = {doc["path"]: doc_id for doc_id, doc in enumerate(index.documents) if doc is not None}
+        self._offsets: "OrderedDict[Tuple[str, int, int], array]" = OrderedDict()
+        self._offsets_lock = threading.Lock()
+        self._offset_cache_size = env_int("SNIPPET_OFFSET_CACHE_FILES", 512)
+
+    def hit_windows(self, relative_path: str, terms: List[str], names: Iterable[str]) -> List[Tuple[int, int, float]]:
+        """Scored line windows around the keyword hits and named definitions of one file"""
+        windows = []
+        doc_id = self.doc_ids.get(relative_path)
+        if doc_id is not None:
+            for term in terms:
+                for line in dict.fromkeys(self.index.postings.get(term, {}).get(doc_id, [])):
+                    windows.append((max(1, line - self.context_lines), line + self.context_lines, KEYWORD_HIT_WEIGHT))
+
+        if self.symbols is not None:
+            for symbol in self.symbols.line_ranges(relative_path, names, limit=10):
+                start = max(1, symbol["start_line"] - 1)
+                end = min(symbol["end_line"], start + self.max_window_lines - 1)
+                windows.append((start, end, SYMBOL_HIT_WEIGHT))
+        return merge_windows(windows, self.max_window_lines)
+
+    def _line_offsets(self, relative_path: str) -> Optional[array]:
+        full_path = os.path.join(self.codebase_path, relative_path)
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+        key = (relative_path, stat.st_mtime_ns, stat.st_size)
+        with self._offsets_lock:
+            offsets = self._offsets.get(key)
+            if offsets is not None:
+                self._offsets.move_to_end(key)
+                return offsets
+        try:
+            offsets = line_offsets(full_path)
+        except OSError:
+            return None
+        with self._offsets_lock:
+            self._offsets[key] = offsets
+            while len(self._offsets) > self._offset_cache_size:
+                self._offsets.popitem(last=False)
+        return offsets
+
+    def read_lines(self, relative_path: str, start: int, end: int) -> Optional[Tuple[str, int, int]]:
+        """Text of lines start..end (1-based, inclusive, clamped), read by byte range"""
+        offsets = self._line_offsets(relative_path)
+        if offsets is None or len(offsets) < 2:
+            return None
+        line_count = len(offsets) - 1
+        start, end = max(1, start), min(end, line_count)
+        if start > end:
+            return None
+        with open(os.path.join(self.codebase_path, relative_path), "rb") as f:
+            f.seek(offsets[start - 1])
+            raw = f.read(offsets[end] - offsets[start - 1])
+        return raw.decode("utf-8", errors="replace").rstrip("\n"), start, end
+
+    def extract(self, relative_paths: Iterable[str], keywords: Iterable[str], names: Iterable[str] = (),
+                token_budget: Optional[int] = None, per_file: Optional[int] = None) -> Dict[str, Any]:
+        """Top windows of each file, in file order, until the token budget is spent
+
+        Files are expected best first. Within a file, windows are ranked by
+        hit score; a window that does not fit the remaining budget is skipped
+        so smaller ones further down can still be used.
+        """
+        token_budget = token_budget if token_budget is not None else env_int("SNIPPET_TOKEN_BUDGET", 2000)
+        per_file = per_file if per_file is not None else env_int("SNIPPET_WINDOWS_PER_FILE", 3)
+        # Path-only terms have no line postings and simply find no hits
+        terms = query_terms(self.index, keywords)
+        names = list(names)
+
+        snippets = []
+        used = 0
+        skipped = 0
+        for relative_path in dict.fromkeys(relative_paths):
+            windows = sorted(self.hit_windows(relative_path, terms, names), key=lambda w: (-w[2], w[0]))[:per_file]
+            for start, end, score in sorted(windows):
+                window = self.read_lines(relative_path, start, end)
+                if window is None:
+                    continue
+                text, start, end = window
+                tokens = self.counter.count(text)
+                if used + tokens > token_budget:
+                    skipped += 1
+                    continue
+                used += tokens
+                snippets.append({
+                    "path": relative_path,
+                    "start_line": start,
+                    "end_line": end,
+                    "score": score,
+                    "tokens": tokens,
+                    "text": text
+                })
+
+        return {"snippets": snippets, "tokens": used, "token_budget": token_budget, "skipped": skipped}
+
+
+def format_snippets(snippets: Iterable[Dict[str, Any]]) -> str:
+    """Snippets as fenced code blocks headed by path and line range"""
+    blocks = []
+    for snippet in snippets:
+        blocks.append(f"{snippet['path']} (lines {snippet['start_line']}-{snippet['end_line']}):\n"
+                      f"```python\n{snippet['text']}\n```")
+    return "\n\n".join(blocks)
@@ -0,0 +1,236 @@
+import ast
+import gzip
+import json
+import os
+import re
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from services.codebase_index import CodebaseIndex, index_dir_for, content_hash, read_file
+
+# Bump when the on-disk layout changes; older files are rebuilt
+SYMBOL_INDEX_FORMAT_VERSION = 1
+
+SYMBOL_INDEX_FILENAME = "symbol_index.json.gz"
+
+# Identifiers in issue text: `backticked` spans, snake_case and CamelCase words
+CODE_SPAN_PATTERN = re.compile(r"`([^`\n]+)`")
+IDENTIFIER_PATTERN = re.compile(r"\b(?:[A-Za-z]+_[A-Za-z0-9_]+|[A-Z][a-z0-9]+(?:[A-Z][a-z0-9]*)+)\b")
+DOTTED_NAME_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _decorator_name(node: ast.expr) -> str:
+    if isinstance(node, ast.Call):
+        node = node.func
+    try:
+        return ast.unparse(node)
+    except Exception:
+        return ""
+
+
+# Statement-list fields that can contain definitions or imports; expressions
+# are never visited, which keeps parsing cheap
+STATEMENT_FIELDS = ("body", "orelse", "handlers", "finalbody", "cases")
+
+
+class _SymbolCollector:
+    """Collects definitions with their line spans, and imports"""
+
+    def __init__(self):
+        self.symbols: List[Dict[str, Any]] = []
+        self.imports: List[Dict[str, Any]] = []
+
+    def collect(self, node: ast.AST, scope: Tuple[str, ...] = (), in_class: bool = False):
+        for field in STATEMENT_FIELDS:
+            for child in getattr(node, field, None) or ():
+                if isinstance(child, ast.ClassDef):
+                    self._add(child, "class", scope)
+                    self.collect(child, scope + (child.name,), in_class=True)
+                elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    self._add(child, "method" if in_class else "function", scope)
+                    self.collect(child, scope + (child.name,))
+                elif isinstance(child, ast.Import):
+                    for alias in child.names:
+                        self.imports.append({"module": alias.name, "name": None, "alias": alias.asname, "line": child.lineno})
+                elif isinstance(child, ast.ImportFrom):
+                    module = "." * child.level + (child.module or "")
+                    for alias in child.names:
+                        self.imports.append({"module": module, "name": alias.name, "alias": alias.asname, "line": child.lineno})
+                else:
+                    # if/try/with/for/match blocks keep the enclosing scope
+                    self.collect(child, scope, in_class)
+
+    def _add(self, node, kind: str, scope: Tuple[str, ...]):
+        self.symbols.append({
+            "name": node.name,
+            "qualname": ".".join(scope + (node.name,)),
+            "kind": kind,
+            "start": node.lineno,
+            "end": getattr(node, "end_lineno", None) or node.lineno,
+            "decorators": [name for name in map(_decorator_name, node.decorator_list) if name]
+        })
+
+
+def extract_symbols(codebase_path: str, relative_path: str) -> Optional[Dict[str, Any]]:
+    """Read and parse one file; files that cannot be read are skipped"""
+    source = read_file(codebase_path, relative_path)
+    if source is None:
+        return None
+    return parse_symbols(relative_path, source[0])
+
+
+def parse_symbols(relative_path: str, raw: bytes) -> Dict[str, Any]:
+    """Definitions and imports of one file; files that do not parse have none"""
+    collector = _SymbolCollector()
+    try:
+        collector.collect(ast.parse(raw, filename=relative_path))
+    except (SyntaxError, ValueError, RecursionError):
+        pass
+
+    return {
+        "path": relative_path,
+        "hash": content_hash(raw),
+        "symbols": collector.symbols,
+        "imports": collector.imports
+    }
+
+
+def extract_code_identifiers(text: str) -> List[str]:
+    """Lowercased identifiers mentioned in issue text, e.g. `do_async` or ServerManager"""
+    identifiers = []
+    for span in CODE_SPAN_PATTERN.findall(text or ""):
+        identifiers.extend(DOTTED_NAME_PATTERN.findall(span))
+    identifiers.extend(IDENTIFIER_PATTERN.findall(text or ""))
+
+    result = []
+    for identifier in identifiers:
+        identifier = identifier.lower()
+        if len(identifier) > 2 and identifier not in result:
+            result.append(identifier)
+    return result
+
+
+class SymbolIndex:
+    """AST index of the classes, functions, methods and imports of a codebase
+
+    Built in parallel by the shared scanner (see services.parallel_scan) and
+    persisted next to the text index. Lookups are by lowercased symbol
+    name, so a query for `do_async` finds where it is defined rather than
+    every file that mentions it.
+    """
+
+    def __init__(self, codebase_path: str, files: Dict[str, Dict[str, Any]]):
+        self.codebase_path = codebase_path
+        self.files = files
+        self.definitions: Dict[str, List[Dict[str, Any]]] = {}
+        for path, record in files.items():
+            for symbol in record["symbols"]:
+                self.definitions.setdefault(symbol["name"].lower(), []).append({"path": path, **symbol})
+
+    @classmethod
+    def build(cls, codebase_path: str) -> "SymbolIndex":
+        """Parse every Python file in the codebase across worker processes"""
+        # Imported here: the scanner builds on this module
+        from services.parallel_scan import build_indexes
+
+        _, index, _ = build_indexes(codebase_path, text=False)
+        return index
+
+    def save(self, index_dir: Optional[str] = None) -> str:
+        """Write the index atomically next to the text index and return the file path"""
+        index_dir = index_dir or index_dir_for(self.codebase_path)
+        os.makedirs(index_dir, exist_ok=True)
+        path = os.path.join(index_dir, SYMBOL_INDEX_FILENAME)
+
+        payload = {
+            "version": SYMBOL_INDEX_FORMAT_VERSION,
+            "codebase_path": self.codebase_path,
+            "files": self.files
+        }
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(temp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, codebase_path: str, index_dir: Optional[str] = None) -> Optional["SymbolIndex"]:
+        """Load a persisted index, or None if it is missing or outdated"""
+        path = os.path.join(index_dir or index_dir_for(codebase_path), SYMBOL_INDEX_FILENAME)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception as e:
+            print(f"Failed to load symbol index {path}: {str(e)}")
+            return None
+
+        if payload.get("version") != SYMBOL_INDEX_FORMAT_VERSION:
+            print(f"Ignoring symbol index {path} with outdated format")
+            return None
+        return cls(codebase_path, payload["files"])
+
+    @classmethod
+    def load_or_build(cls, codebase_path: str, index_dir: Optional[str] = None) -> "SymbolIndex":
+        index = cls.load(codebase_path, index_dir)
+        if index is None:
+            index = cls.build(codebase_path)
+            try:
+                index.save(index_dir)
+            except Exception as e:
+                print(f"Failed to persist symbol index: {str(e)}")
+        return index
+
+    def sync(self, text_index: CodebaseIndex) -> "SymbolIndex":
+        """Re-parse files whose content hash differs from the text index
+
+        Returns a new index (or this one when nothing changed), leaving this
+        instance untouched for readers that still hold it.
+        """
+        current = {doc["path"]: doc["hash"] for doc in text_index.documents if doc is not None}
+        stale = [path for path, digest in current.items()
+                 if path not in self.files or self.files[path]["hash"] != digest]
+        removed = [path for path in self.files if path not in current]
+        if not stale and not removed:
+            return self
+
+        files = {path: record for path, record in self.files.items() if path in current}
+        for path in stale:
+            record = extract_symbols(self.codebase_path, path)
+            if record is not None:
+                files[path] = record
+        return SymbolIndex(self.codebase_path, files)
+
+    def find_definitions(self, names: Iterable[str]) -> List[Dict[str, Any]]:
+        """Definition sites of the given symbol names (case-insensitive)"""
+        found = []
+        for name in dict.fromkeys(name.lower() for name in names):
+            found.extend(self.definitions.get(name, []))
+        return found
+
+    def definition_paths(self, names: Iterable[str]) -> Dict[str, List[str]]:
+        """Files defining any of the names, with the qualified names they define"""
+        paths: Dict[str, List[str]] = {}
+        for symbol in self.find_definitions(names):
+            paths.setdefault(symbol["path"], []).append(symbol["qualname"])
+        return paths
+
+    def line_ranges(self, relative_path: str, names: Iterable[str], limit: int = 5) -> List[Dict[str, Any]]:
+        """Line spans of the named symbols defined in one file"""
+        wanted = {name.lower() for name in names}
+        record = self.files.get(relative_path)
+        if not record:
+            return []
+        ranges = [
+            {"symbol": symbol["qualname"], "kind": symbol["kind"], "start_line": symbol["start"], "end_line": symbol["end"]}
+            for symbol in record["symbols"] if symbol["name"].lower() in wanted
+        ]
+        return ranges[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.files),
+            "names": len(self.definitions),
+            "symbols": sum(len(record["symbols"]) for record in self.files.values()),
+            "imports": sum(len(record["imports"]) for record in self.files.values())
+        }
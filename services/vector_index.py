@@ -0,0 +1,295 @@
+import gzip
+import json
+import os
+import re
+import time
+import zlib
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from services.config import env_int
+from services.codebase_index import index_dir_for, read_file, tokenize
+from services.symbol_index import SymbolIndex
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Bump when the on-disk layout or the embedding changes; older files are rebuilt
+VECTOR_INDEX_FORMAT_VERSION = 1
+
+VECTOR_INDEX_DIRNAME = "vector_index"
+VECTORS_FILENAME = "vectors.npy"
+CENTROIDS_FILENAME = "centroids.npy"
+META_FILENAME = "meta.json.gz"
+
+# Chunks longer than this are embedded from their first lines only
+CHUNK_MAX_LINES = 200
+# Module-level chunk: the file header (imports, module docstring, constants)
+MODULE_HEADER_LINES = 40
+
+CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+class HashingEmbedder:
+    """Offline CPU text embedder: signed feature hashing of identifier tokens
+
+    Tokens (with snake_case and CamelCase parts) and adjacent-token bigrams are
+    hashed with crc32 into `dim` buckets, sublinearly scaled, weighted by
+    per-bucket IDF learned from the indexed chunks and L2-normalized, so dot
+    products are cosine similarities.
+    """
+
+    def __init__(self, dim: int, idf: Optional[Any] = None):
+        self.dim = dim
+        self.idf = idf
+
+    def features(self, text: str) -> List[str]:
+        tokens = tokenize(CAMEL_BOUNDARY.sub(" ", text))
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _hash(self, feature: str) -> Tuple[int, float]:
+        value = zlib.crc32(feature.encode("utf-8"))
+        return value % self.dim, 1.0 if (value >> 31) & 1 else -1.0
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None, normalize: bool = True):
+        """Embed texts into a float32 matrix, one batch of rows at a time"""
+        batch_size = batch_size or env_int("VECTOR_INDEX_BATCH_SIZE", 256)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows, columns, signs = [], [], []
+            for offset, text in enumerate(texts[start:start + batch_size]):
+                for feature in self.features(text):
+                    column, sign = self._hash(feature)
+                    rows.append(start + offset)
+                    columns.append(column)
+                    signs.append(sign)
+            if rows:
+                np.add.at(matrix, (np.asarray(rows), np.asarray(columns)), np.asarray(signs, dtype=np.float32))
+
+        # Sublinear term frequency, keeping the hash sign
+        np.multiply(np.sign(matrix), np.log1p(np.abs(matrix)), out=matrix)
+        if self.idf is not None:
+            matrix *= self.idf
+        if normalize:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def fit_idf(self, matrix):
+        """Per-bucket IDF from an unweighted, unnormalized chunk matrix"""
+        df = np.count_nonzero(matrix, axis=0).astype(np.float32)
+        self.idf = (np.log((1 + matrix.shape[0]) / (1 + df)) + 1).astype(np.float32)
+
+
+def _chunk_source(lines: List[str], start: int, end: int) -> str:
+    return "\n".join(lines[start - 1:min(end, start - 1 + CHUNK_MAX_LINES)])
+
+
+def chunk_file(codebase_path: str, record: Dict[str, Any]) -> List[Tuple[Dict[str, Any], str]]:
+    """Split one file into a module-header chunk plus one chunk per class/function/method"""
+    source = read_file(codebase_path, record["path"])
+    if source is None:
+        return []
+    lines = source[0].decode("utf-8", errors="replace").splitlines()
+    path_words = record["path"][:-3].replace(os.sep, " ").replace("/", " ")
+
+    chunks = [({"path": record["path"], "symbol": None, "kind": "module", "start_line": 1,
+                "end_line": min(len(lines), MODULE_HEADER_LINES)},
+               f"{path_words}\n{_chunk_source(lines, 1, MODULE_HEADER_LINES)}")]
+    for symbol in record["symbols"]:
+        chunks.append((
+            {"path": record["path"], "symbol": symbol["qualname"], "kind": symbol["kind"],
+             "start_line": symbol["start"], "end_line": symbol["end"]},
+            f"{path_words} {symbol['qualname']}\n{_chunk_source(lines, symbol['start'], symbol['end'])}"
+        ))
+    return chunks
+
+
+class VectorIndex:
+    """Chunk-level embedding index with an IVF approximate-nearest-neighbour layer
+
+    Vectors live in a float32 .npy file opened memory-mapped, so only the rows
+    of the probed clusters are paged in. Spherical k-means centroids partition
+    the chunks; a query scores the centroids, then only the chunks of the
+    `nprobe` closest clusters by cosine similarity.
+    """
+
+    def __init__(self, codebase_path: str, chunks: List[Dict[str, Any]], vectors, centroids,
+                 list_offsets: List[int], list_order: List[int], embedder: HashingEmbedder, fingerprint: str):
+        self.codebase_path = codebase_path
+        self.chunks = chunks
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_order = np.asarray(list_order, dtype=np.int64)
+        self.embedder = embedder
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, codebase_path: str, symbol_index: SymbolIndex, fingerprint: str,
+              dim: Optional[int] = None) -> "VectorIndex":
+        started = time.perf_counter()
+        dim = dim or env_int("VECTOR_INDEX_DIM", 512)
+        chunks, texts = [], []
+        for path in sorted(symbol_index.files):
+            for chunk, text in chunk_file(codebase_path, symbol_index.files[path]):
+                chunks.append(chunk)
+                texts.append(text)
+
+        embedder = HashingEmbedder(dim)
+        raw = embedder.encode(texts, normalize=False)
+        embedder.fit_idf(raw)
+        vectors = embedder.encode(texts)
+
+        centroids, assignments = cls._kmeans(vectors, env_int("VECTOR_INDEX_LISTS", 0))
+        list_order = np.argsort(assignments, kind="stable")
+        list_offsets = np.searchsorted(assignments[list_order], np.arange(len(centroids) + 1))
+
+        index = cls(codebase_path, chunks, vectors, centroids, list_offsets.tolist(),
+                    list_order.tolist(), embedder, fingerprint)
+        print(f"Built vector index: {len(chunks)} chunks, {len(centroids)} lists, dim {dim} "
+              f"in {time.perf_counter() - started:.2f}s")
+        return index
+
+    @staticmethod
+    def _kmeans(vectors, lists: int, iterations: int = 10):
+        """Spherical k-means; `lists` defaults to about sqrt(chunks)"""
+        count = vectors.shape[0]
+        if count == 0:
+            return np.zeros((0, vectors.shape[1]), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        lists = max(1, min(count, lists or int(np.sqrt(count))))
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(count, size=lists, replace=False)].copy()
+
+        assignments = np.zeros(count, dtype=np.int64)
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for cluster in range(lists):
+                members = vectors[assignments == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[cluster] = centroid / norm if norm else centroid
+        return centroids.astype(np.float32), assignments
+
+    def save(self, index_dir: Optional[str] = None) -> str:
+        """Write vectors, centroids and metadata; metadata is replaced last"""
+        directory = os.path.join(index_dir or index_dir_for(self.codebase_path), VECTOR_INDEX_DIRNAME)
+        os.makedirs(directory, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+
+        for filename, matrix in ((VECTORS_FILENAME, self.vectors), (CENTROIDS_FILENAME, self.centroids)):
+            temp_path = os.path.join(directory, filename + suffix)
+            with open(temp_path, "wb") as f:
+                np.save(f, np.asarray(matrix, dtype=np.float32))
+            os.replace(temp_path, os.path.join(directory, filename))
+
+        payload = {
+            "version": VECTOR_INDEX_FORMAT_VERSION,
+            "fingerprint": self.fingerprint,
+            "dim": self.embedder.dim,
+            "idf": self.embedder.idf.tolist(),
+            "chunks": self.chunks,
+            "list_offsets": self.list_offsets.tolist(),
+            "list_order": self.list_order.tolist()
+        }
+        temp_path = os.path.join(directory, META_FILENAME + suffix)
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(temp_path, os.path.join(directory, META_FILENAME))
+        return directory
+
+    @classmethod
+    def load(cls, codebase_path: str, fingerprint: str, index_dir: Optional[str] = None) -> Optional["VectorIndex"]:
+        """Load a persisted index with memory-mapped vectors, or None if missing or stale"""
+        directory = os.path.join(index_dir or index_dir_for(codebase_path), VECTOR_INDEX_DIRNAME)
+        meta_path = os.path.join(directory, META_FILENAME)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with gzip.open(meta_path, "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+            if payload.get("version") != VECTOR_INDEX_FORMAT_VERSION or payload.get("fingerprint") != fingerprint:
+                return None
+            vectors = np.load(os.path.join(directory, VECTORS_FILENAME), mmap_mode="r")
+            centroids = np.load(os.path.join(directory, CENTROIDS_FILENAME))
+        except Exception as e:
+            print(f"Failed to load vector index {directory}: {str(e)}")
+            return None
+
+        if vectors.shape != (len(payload["chunks"]), payload["dim"]):
+            print(f"Ignoring vector index {directory} with mismatched vectors")
+            return None
+        embedder = HashingEmbedder(payload["dim"], np.asarray(payload["idf"], dtype=np.float32))
+        return cls(codebase_path, payload["chunks"], vectors, centroids,
+                   payload["list_offsets"], payload["list_order"], embedder, payload["fingerprint"])
+
+    @classmethod
+    def load_or_build(cls, codebase_path: str, symbol_index: SymbolIndex, fingerprint: str,
+                      index_dir: Optional[str] = None) -> "VectorIndex":
+        index = cls.load(codebase_path, fingerprint, index_dir)
+        if index is None:
+            index = cls.build(codebase_path, symbol_index, fingerprint)
+            try:
+                index.save(index_dir)
+            except Exception as e:
+                print(f"Failed to persist vector index: {str(e)}")
+        return index
+
+    def encode(self, texts: List[str]):
+        return self.embedder.encode(texts)
+
+    def search(self, text: str, k: int = 10, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Chunks most similar to `text` by cosine similarity"""
+        if not self.chunks:
+            return []
+        query = self.encode([text])[0]
+        if not query.any():
+            return []
+
+        nprobe = nprobe or env_int("VECTOR_INDEX_NPROBE", 4)
+        probed = np.argsort(-(self.centroids @ query))[:nprobe]
+        candidates = np.concatenate([
+            self.list_order[self.list_offsets[cluster]:self.list_offsets[cluster + 1]] for cluster in probed
+        ])
+        if not candidates.size:
+            return []
+
+        candidates.sort()
+        similarities = np.asarray(self.vectors[candidates]) @ query
+        top = np.argsort(-similarities)[:k]
+        return [
+            {**self.chunks[int(candidates[i])], "score": round(float(similarities[i]), 4)}
+            for i in top if similarities[i] > 0
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self.chunks),
+            "dim": self.embedder.dim,
+            "lists": len(self.centroids)
+        }
+
+
+def best_label(embedder: HashingEmbedder, text: str, prototypes: Dict[str, str],
+               threshold: float = 0.0) -> Optional[str]:
+    """Label whose prototype description is most similar to `text`, if above `threshold`"""
+    labels = list(prototypes)
+    vectors = embedder.encode([text] + [prototypes[label] for label in labels])
+    similarities = vectors[1:] @ vectors[0]
+    best = int(np.argmax(similarities))
+    return labels[best] if similarities[best] > threshold else None
+
+
+def salient_terms(chunks: Iterable[Dict[str, Any]], limit: int = 10) -> List[str]:
+    """Most frequent identifier words among the symbols and modules of retrieved chunks"""
+    counts: Dict[str, float] = {}
+    for chunk in chunks:
+        words = tokenize(CAMEL_BOUNDARY.sub(" ", chunk["symbol"] or "")) + tokenize(os.path.basename(chunk["path"])[:-3])
+        for word in set(words):
+            if len(word) > 3 and "_" not in word and not word.startswith("test"):
+                counts[word] = counts.get(word, 0.0) + chunk["score"]
+    return [word for word, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
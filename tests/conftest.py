@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app's packages (models, services) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(monkeypatch, tmp_path):
+    """Keep services from opening the persistent caches under .cache/"""
+    monkeypatch.setenv("GITHUB_CACHE_ENABLED", "false")
+    monkeypatch.setenv("GITHUB_CACHE_PATH", str(tmp_path / "github_issues.sqlite3"))
@@ -0,0 +1,113 @@
+import os
+
+from services import index_format
+from services.codebase_index import CodebaseIndex, scan_file
+from services.index_format import PostingsOverlay
+
+
+FILES = {
+    "agent.py": 'class Agent:\n    """Runs tasks"""\n    def do_async(self):\n        return await_result()\n',
+    "server/manager.py": "def stop_server():\n    terminate_process()\n",
+    "tools/processor.py": "def process_tool(tool):\n    return tool.run()\n",
+    "tasks/task.py": "class Task:\n    description = None\n",
+    "utils/printing.py": "def print_response(response):\n    print(response)\n",
+}
+
+
+def write_codebase(root, files):
+    for relative_path, content in files.items():
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def snapshot(index):
+    """Comparable content of an index, by path instead of doc id"""
+    paths = {doc_id: doc["path"] for doc_id, doc in enumerate(index.documents) if doc is not None}
+
+    def by_path(docs):
+        if isinstance(docs, list):
+            return sorted(paths[doc_id] for doc_id in docs)
+        return {paths[doc_id]: value for doc_id, value in docs.items()}
+
+    return {
+        "body": {term: by_path(docs) for term, docs in index.postings.items()},
+        "path": {term: by_path(docs) for term, docs in index.path_postings.items()},
+        **{field: {term: by_path(docs) for term, docs in field_terms.items()}
+           for field, field_terms in index.field_postings.items()}
+    }
+
+
+def mapped_index(tmp_path):
+    codebase = tmp_path / "codebase"
+    write_codebase(codebase, FILES)
+    index_dir = str(tmp_path / "index")
+    build(codebase, sorted(FILES)).save(index_dir)
+    return codebase, index_dir, CodebaseIndex.load(str(codebase), index_dir)
+
+
+def build(codebase, relative_paths):
+    return CodebaseIndex.from_scans(str(codebase), [scan_file(str(codebase), path) for path in relative_paths])
+
+
+def test_refresh_decodes_only_affected_posting_lists(tmp_path, monkeypatch):
+    codebase, index_dir, index = mapped_index(tmp_path)
+
+    (codebase / "server/manager.py").write_text("def stop_server(timeout):\n    kill_children()\n")
+    os.utime(codebase / "server/manager.py", (1, 1))
+    os.remove(codebase / "tools/processor.py")
+
+    decoded = []
+    original = index_format.decode_postings
+    monkeypatch.setattr(index_format, "decode_postings",
+                        lambda kind, data: decoded.append(kind) or original(kind, data))
+
+    refreshed, stats = index.refresh()
+
+    assert (stats["changed"], stats["removed"]) == (1, 1)
+    assert isinstance(refreshed.postings, PostingsOverlay)
+    # Only terms of the changed and removed files were read back, not the whole table
+    assert decoded.count("lines") == len({"stop", "server", "stop_server", "terminate", "process",
+                                           "terminate_process", "def", "return", "tool", "run", "process_tool"})
+    assert "terminate" not in refreshed.postings
+    assert "tools" not in refreshed.path_postings
+
+    rebuilt = build(codebase, [path for path in sorted(FILES) if path != "tools/processor.py"])
+    assert snapshot(refreshed) == snapshot(rebuilt)
+
+
+def test_refreshed_overlay_saves_and_refreshes_again(tmp_path):
+    codebase, index_dir, index = mapped_index(tmp_path)
+
+    (codebase / "agent.py").write_text("class Agent:\n    def run_task(self):\n        pass\n")
+    os.utime(codebase / "agent.py", (1, 1))
+    once, _ = index.refresh()
+
+    write_codebase(codebase, {"memory/cache.py": "def evict_entry():\n    pass\n"})
+    twice, stats = once.refresh()
+    assert stats["added"] == 1
+    assert twice.content_matches("evict") and twice.content_matches("run_task")
+    assert not twice.content_matches("do_async")
+
+    twice.save(index_dir)
+    reloaded = CodebaseIndex.load(str(codebase), index_dir)
+    assert snapshot(reloaded) == snapshot(twice)
+
+
+def test_close_unmaps_the_index_file(tmp_path):
+    codebase, index_dir, index = mapped_index(tmp_path)
+    assert index.content_matches("agent")
+
+    index.close()
+
+    assert index.mapped._mmap.closed
+
+
+def test_fingerprint_follows_indexed_contents(tmp_path):
+    codebase, index_dir, index = mapped_index(tmp_path)
+    assert index.fingerprint() == build(codebase, sorted(FILES)).fingerprint()
+
+    (codebase / "agent.py").write_text("class Agent:\n    def run_task(self):\n        pass\n")
+    os.utime(codebase / "agent.py", (1, 1))
+    refreshed, _ = index.refresh()
+    assert refreshed.fingerprint() != index.fingerprint()
@@ -0,0 +1,231 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import httpx
+import pytest
+
+from services.github_service import GitHubService, GitHubGraphQLError
+from services.issue_cache import IssueCache
+from services.rate_limiter import GitHubRateLimiter
+
+ISSUE_URL = "https://github.com/octo/demo/issues/7"
+API_ISSUE = "/repos/octo/demo/issues/7"
+
+USER = {"login": "octocat", "id": 1, "avatar_url": "https://avatars.example/1", "html_url": "https://github.com/octocat"}
+
+
+def issue_json(comments: int, body: Optional[str] = "Crash in do_async") -> Dict[str, Any]:
+    return {
+        "id": 700, "number": 7, "title": "Agent crashes", "body": body, "user": USER,
+        "labels": [{"name": "bug", "color": "d73a4a", "description": "Something isn't working"}],
+        "state": "open", "created_at": "2024-05-01T10:00:00Z", "updated_at": "2024-05-02T10:00:00Z",
+        "html_url": "https://github.com/octo/demo/issues/7", "comments": comments
+    }
+
+
+def comment_json(comment_id: int, body: str = "me too") -> Dict[str, Any]:
+    return {"id": comment_id, "user": USER, "body": body,
+            "created_at": "2024-05-01T11:00:00Z", "updated_at": "2024-05-01T11:00:00Z"}
+
+
+class StubGitHub:
+    """Stand-in for the REST API: one issue with paginated comments, ETag revalidation"""
+
+    def __init__(self, comments: List[Dict[str, Any]], etag: str = '"v1"'):
+        self.comments = comments
+        self.etag = etag
+        self.requests: List[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+        if path == API_ISSUE:
+            if request.headers.get("if-none-match") == self.etag:
+                return httpx.Response(304, headers={"ETag": self.etag})
+            return httpx.Response(200, json=issue_json(len(self.comments)), headers={"ETag": self.etag})
+        if path == f"{API_ISSUE}/comments":
+            per_page = int(request.url.params.get("per_page", 30))
+            page = int(request.url.params.get("page", 1))
+            last_page = max(1, -(-len(self.comments) // per_page))
+            headers = {}
+            if last_page > 1:
+                base = f"https://api.github.com{API_ISSUE}/comments?per_page={per_page}"
+                links = [f'<{base}&page={last_page}>; rel="last"']
+                if page < last_page:
+                    links.insert(0, f'<{base}&page={page + 1}>; rel="next"')
+                headers["Link"] = ", ".join(links)
+            return httpx.Response(200, json=self.comments[(page - 1) * per_page:page * per_page], headers=headers)
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    def pages_requested(self) -> List[int]:
+        return sorted(int(request.url.params.get("page", 1)) for request in self.requests
+                      if request.url.path.endswith("/comments"))
+
+
+def make_service(handler, tmp_path, cache: bool = True) -> GitHubService:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return GitHubService(
+        client=client,
+        cache=IssueCache(str(tmp_path / "issues.sqlite3")) if cache else None,
+        rate_limiter=GitHubRateLimiter(rate=1000.0, burst=1000)
+    )
+
+
+def test_etag_304_serves_cached_issue(tmp_path):
+    stub = StubGitHub([comment_json(i) for i in range(3)])
+    service = make_service(stub, tmp_path)
+
+    first = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=10))
+    requests_after_first = len(stub.requests)
+    second = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=10))
+
+    assert second == first
+    # Only the conditional issue request went out; comments came from the cache
+    revalidation = stub.requests[requests_after_first:]
+    assert [request.url.path for request in revalidation] == [API_ISSUE]
+    assert revalidation[0].headers["If-None-Match"] == '"v1"'
+    stats = service.cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_changed_etag_refetches(tmp_path):
+    stub = StubGitHub([comment_json(i) for i in range(2)])
+    service = make_service(stub, tmp_path)
+
+    asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=10))
+    stub.etag = '"v2"'
+    stub.comments.append(comment_json(99, "new comment"))
+    issue = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=10))
+
+    assert [comment.id for comment in issue.comments] == [0, 1, 99]
+    assert service.cache.stats()["revalidated"] == 1
+    assert service.cache.get("octo", "demo", 7).etag == '"v2"'
+
+
+def test_cached_entry_with_fewer_comments_is_not_reused(tmp_path):
+    stub = StubGitHub([comment_json(i) for i in range(5)])
+    service = make_service(stub, tmp_path)
+
+    asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=2))
+    issue = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=5))
+
+    assert len(issue.comments) == 5
+    assert service.cache.stats()["hits"] == 0
+
+
+def test_byte_capped_entry_does_not_cover_larger_request(tmp_path):
+    stub = StubGitHub([comment_json(i, "x" * 100) for i in range(6)])
+    service = make_service(stub, tmp_path)
+
+    capped = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=6, max_bytes=250))
+    entry = service.cache.get("octo", "demo", 7)
+
+    assert len(capped.comments) == 2
+    assert entry.truncated
+    assert entry.covers(2) and not entry.covers(3)
+
+    full = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=6, max_bytes=10_000))
+    assert len(full.comments) == 6
+
+
+def test_comments_paginate_across_pages(tmp_path):
+    stub = StubGitHub([comment_json(i) for i in range(250)])
+    service = make_service(stub, tmp_path, cache=False)
+
+    issue = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=None, max_bytes=None))
+
+    assert [comment.id for comment in issue.comments] == list(range(250))
+    assert stub.pages_requested() == [1, 2, 3]
+
+
+def test_max_comments_stops_page_requests(tmp_path):
+    stub = StubGitHub([comment_json(i) for i in range(250)])
+    service = make_service(stub, tmp_path, cache=False)
+
+    issue = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=3))
+
+    assert [comment.id for comment in issue.comments] == [0, 1, 2]
+    # A 3-comment cap asks for pages of 3 and never requests a second page
+    assert stub.pages_requested() == [1]
+    comment_request = next(request for request in stub.requests if request.url.path.endswith("/comments"))
+    assert comment_request.url.params["per_page"] == "3"
+
+
+def test_max_comments_across_pages(tmp_path):
+    stub = StubGitHub([comment_json(i) for i in range(450)])
+    service = make_service(stub, tmp_path, cache=False)
+
+    issue = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=150))
+
+    assert len(issue.comments) == 150
+    assert stub.pages_requested() == [1, 2]
+
+
+def test_max_bytes_caps_comment_bodies(tmp_path):
+    stub = StubGitHub([comment_json(i, "y" * 40) for i in range(10)])
+    service = make_service(stub, tmp_path, cache=False)
+
+    comments = asyncio.run(service.fetch_comments("octo", "demo", 7, max_comments=10, max_bytes=100))
+
+    assert [comment.id for comment in comments] == [0, 1]
+
+
+# Trimmed response of ISSUE_GRAPHQL_QUERY as recorded from the GraphQL API
+RECORDED_GRAPHQL_RESPONSE = {
+    "data": {
+        "repository": {
+            "issue": {
+                "databaseId": 700,
+                "number": 7,
+                "title": "Agent crashes",
+                "body": None,
+                "state": "OPEN",
+                "createdAt": "2024-05-01T10:00:00Z",
+                "updatedAt": "2024-05-02T10:00:00Z",
+                "url": "https://github.com/octo/demo/issues/7",
+                "author": {"login": "octocat", "avatarUrl": "https://avatars.example/1",
+                           "url": "https://github.com/octocat", "databaseId": 1},
+                "labels": {"nodes": [{"name": "bug", "color": "d73a4a", "description": None}]},
+                "comments": {"nodes": [
+                    {"databaseId": 11, "body": "me too", "createdAt": "2024-05-01T11:00:00Z",
+                     "updatedAt": "2024-05-01T11:00:00Z",
+                     "author": {"login": "hubot", "avatarUrl": "", "url": "https://github.com/hubot", "databaseId": 2}},
+                    {"databaseId": 12, "body": "deleted account", "createdAt": "2024-05-01T12:00:00Z",
+                     "updatedAt": "2024-05-01T12:00:00Z", "author": None}
+                ]}
+            }
+        }
+    }
+}
+
+
+def test_graphql_maps_recorded_response(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    sent: List[Dict[str, Any]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, json=RECORDED_GRAPHQL_RESPONSE)
+
+    service = make_service(handler, tmp_path, cache=False)
+    issue = asyncio.run(service.fetch_issue(ISSUE_URL, max_comments=5, mode="graphql"))
+
+    assert len(sent) == 1
+    assert sent[0]["variables"] == {"owner": "octo", "repo": "demo", "number": 7, "comments": 5}
+    assert issue.state == "open"
+    assert issue.body is None
+    assert [label.name for label in issue.labels] == ["bug"]
+    assert [comment.user.login for comment in issue.comments] == ["hubot", "ghost"]
+
+
+def test_graphql_errors_raise(tmp_path, monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    service = make_service(
+        lambda request: httpx.Response(200, json={"errors": [{"message": "Could not resolve to a Repository"}]}),
+        tmp_path, cache=False
+    )
+
+    with pytest.raises(GitHubGraphQLError):
+        asyncio.run(service.fetch_issue(ISSUE_URL, mode="graphql"))
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import closing
+
+from services.job_queue import JobQueue, SQLiteJobStore, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED
+
+
+def test_shared_store_runs_each_job_once(tmp_path):
+    """Two worker pools on one store, as with two uvicorn workers after a restart"""
+    path = str(tmp_path / "jobs.sqlite3")
+    runs = Counter()
+
+    async def handler(payload):
+        runs[payload["n"]] += 1
+        await asyncio.sleep(0.01)
+        return {"n": payload["n"]}
+
+    async def scenario():
+        store = SQLiteJobStore(path)
+        job_ids = [store.create(f"job-{n}", {"n": n})["job_id"] for n in range(20)]
+
+        # Both processes find the same queued jobs on start
+        first = JobQueue(handler, store=SQLiteJobStore(path), workers=3)
+        second = JobQueue(handler, store=SQLiteJobStore(path), workers=3)
+        await first.start()
+        await second.start()
+        await asyncio.gather(first._queue.join(), second._queue.join())
+        await first.stop()
+        await second.stop()
+        return store, job_ids
+
+    store, job_ids = asyncio.run(scenario())
+
+    assert runs == Counter({n: 1 for n in range(20)})
+    assert all(store.get(job_id)["status"] == JOB_SUCCEEDED for job_id in job_ids)
+
+
+def test_start_leaves_live_running_jobs_and_requeues_stale_ones(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = SQLiteJobStore(path)
+    store.create("live", {"n": 1})
+    store.create("stale", {"n": 2})
+    assert store.claim("live", "other-process")
+    assert store.claim("stale", "dead-process")
+    assert not store.claim("live", "late-comer")
+
+    # The dead process stopped sending heartbeats long ago
+    with closing(store._connect()) as conn, conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = 'stale'", (time.time() - 3600,))
+
+    ran = []
+
+    async def handler(payload):
+        ran.append(payload["n"])
+        return {}
+
+    async def scenario():
+        queue = JobQueue(handler, store=SQLiteJobStore(path), workers=1, stale_after=600)
+        await queue.start()
+        await queue._queue.join()
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+    assert ran == [2]
+    assert store.get("live")["status"] == JOB_RUNNING
+    assert store.get("stale")["status"] == JOB_SUCCEEDED
+
+
+def test_stop_requeues_interrupted_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+
+    async def scenario():
+        running = asyncio.Event()
+
+        async def handler(payload):
+            running.set()
+            await asyncio.sleep(60)
+
+        queue = JobQueue(handler, store=SQLiteJobStore(path), workers=1)
+        await queue.start()
+        job = await queue.submit({"n": 1})
+        await running.wait()
+        await queue.stop()
+        return job["job_id"]
+
+    job_id = asyncio.run(scenario())
+
+    assert SQLiteJobStore(path).get(job_id)["status"] == JOB_QUEUED
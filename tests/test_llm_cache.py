@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.llm_cache import LLMResponseCache, task_cache_key
+
+
+class CountingAgent:
+    def __init__(self):
+        self.calls = 0
+
+    async def do_async(self, task, model=None):
+        self.calls += 1
+        return f"answer {self.calls}"
+
+
+def make_task(tools):
+    return SimpleNamespace(description="Analyze issue #7", tools=tools, response_format=str)
+
+
+def test_tool_task_key_covers_codebase_path_and_index():
+    task = make_task(["CodebaseTool"])
+    base = task_cache_key("model", task, {"path": "/repos/a", "index": "r1"})
+
+    assert task_cache_key("model", task, {"path": "/repos/b", "index": "r1"}) != base
+    assert task_cache_key("model", task, {"path": "/repos/a", "index": "r2"}) != base
+    assert task_cache_key("model", task, {"path": "/repos/a", "index": "r1"}) == base
+
+
+def test_tool_free_task_key_ignores_codebase():
+    task = make_task([])
+
+    assert task_cache_key("model", task, {"path": "/repos/a", "index": "r1"}) == task_cache_key("model", task)
+
+
+def test_tool_task_is_cached_per_index_revision(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "llm.sqlite3"))
+    agent = CountingAgent()
+    task = make_task(["CodebaseTool"])
+
+    async def run(codebase):
+        return await cache.do_async(agent, task, None, "model", codebase)
+
+    first = asyncio.run(run({"path": "/repos/a", "index": "r1"}))
+    assert asyncio.run(run({"path": "/repos/a", "index": "r1"})) == first
+    assert asyncio.run(run({"path": "/repos/a", "index": "r2"})) != first
+    # Without a codebase to key on, a tool task always reaches the model
+    asyncio.run(run(None))
+    asyncio.run(run(None))
+    assert agent.calls == 4
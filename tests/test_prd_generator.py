@@ -0,0 +1,96 @@
+import asyncio
+
+from models.issue import GitHubComment, GitHubIssue, GitHubUser
+from models.prd import PRDDocument
+from services.prd_cache import prd_cache_key
+from services.prd_generator import PRDGenerator
+
+
+def make_issue(body=None):
+    return GitHubIssue(
+        id=700, number=7, title="Agent hangs in FastAPI", body=body,
+        user=GitHubUser(login="octocat", id=1, avatar_url="", html_url=""),
+        state="open", created_at="2024-05-01T10:00:00Z", updated_at="2024-05-02T10:00:00Z",
+        html_url="https://github.com/octo/demo/issues/7"
+    )
+
+
+def make_generator(latency_budget, delay):
+    """Generator with a stand-in LLM call that records its prompt size like the real one"""
+    generator = PRDGenerator(latency_budget=latency_budget)
+    generator.agent = object()
+
+    async def generate_prd_with_agent(issue, analysis_data):
+        await asyncio.sleep(delay)
+        analysis_data['prompt_tokens'] = {**(analysis_data.get('prompt_tokens') or {}), "prd": {"tokens": 42}}
+        return PRDDocument(title="LLM PRD", overview="", problem_statement="", use_cases=[],
+                           file_modifications=[], constraints=[])
+
+    generator.generate_prd_with_agent = generate_prd_with_agent
+    return generator
+
+
+def test_template_prd_handles_issue_without_body():
+    generator = PRDGenerator(latency_budget=0)
+
+    prd = asyncio.run(generator.generate_prd(make_issue(body=None), {"relevant_files": ["src/agent.py"]}))
+
+    assert prd.title
+    assert not prd.degraded
+
+
+def test_late_llm_prd_does_not_mutate_the_request_analysis():
+    generator = make_generator(latency_budget=0.05, delay=0.2)
+    analysis_data = {"relevant_files": [], "prompt_tokens": {"analysis": {"tokens": 7}}}
+
+    async def scenario():
+        prd = await generator.generate_prd_within_budget(make_issue(body=None), analysis_data)
+        snapshot = dict(analysis_data)
+        # Let the background call finish while the response is being serialized
+        await asyncio.sleep(0.3)
+        return prd, snapshot
+
+    prd, snapshot = asyncio.run(scenario())
+
+    assert prd.degraded
+    assert analysis_data == snapshot
+    assert analysis_data["prompt_tokens"] == {"analysis": {"tokens": 7}}
+
+
+def test_llm_prd_within_budget_reports_its_prompt_tokens():
+    generator = make_generator(latency_budget=1.0, delay=0.0)
+    analysis_data = {"relevant_files": [], "prompt_tokens": {"analysis": {"tokens": 7}}}
+
+    prd = asyncio.run(generator.generate_prd_within_budget(make_issue(body="Hangs forever"), analysis_data))
+
+    assert prd.title == "LLM PRD"
+    assert analysis_data["prompt_tokens"] == {"analysis": {"tokens": 7}, "prd": {"tokens": 42}}
+
+
+def snippet(text, start_line=10):
+    return {"path": "src/agent.py", "start_line": start_line, "end_line": start_line + 2, "text": text}
+
+
+def test_prd_cache_key_follows_code_excerpts():
+    issue = make_issue(body="Crash in do_async")
+    base = {"relevant_files": ["src/agent.py"], "code_snippets": [snippet("def do_async(self):\n    pass")]}
+    key = prd_cache_key(issue, base)
+
+    assert prd_cache_key(issue, dict(base)) == key
+    assert prd_cache_key(issue, {**base, "code_snippets": [snippet("def do_async(self):\n    return 1")]}) != key
+    assert prd_cache_key(issue, {**base, "code_snippets": [snippet("def do_async(self):\n    pass", 12)]}) != key
+    assert prd_cache_key(issue, {**base, "code_snippets": []}) != key
+
+
+def test_prd_cache_key_follows_issue_comments():
+    issue = make_issue(body="Crash in do_async")
+    analysis = {"relevant_files": ["src/agent.py"]}
+    key = prd_cache_key(issue, analysis)
+
+    comment = GitHubComment(id=1, user=issue.user, body="Also happens with sync tools",
+                            created_at="2024-05-03T10:00:00Z", updated_at="2024-05-03T10:00:00Z")
+    commented = issue.model_copy(update={"comments": [comment]})
+    assert prd_cache_key(commented, analysis) != key
+
+    edited = issue.model_copy(update={"comments": [comment.model_copy(update={"body": "Only with sync tools"})]})
+    assert prd_cache_key(edited, analysis) not in (key, prd_cache_key(commented, analysis))
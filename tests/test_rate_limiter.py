@@ -0,0 +1,147 @@
+import asyncio
+import time
+from typing import Callable, List
+
+import httpx
+import pytest
+
+from services.http_client import create_github_client
+from services.rate_limiter import GitHubRateLimiter, GitHubRateLimitError
+
+API_URL = "https://api.github.com/repos/octo/demo/issues/1"
+
+
+def make_limiter(**overrides) -> GitHubRateLimiter:
+    settings = {"rate": 1000.0, "burst": 1000, "low_watermark": 0, "max_retries": 3,
+                "backoff_base": 0.01, "backoff_max": 0.05, "max_wait": 5.0}
+    settings.update(overrides)
+    return GitHubRateLimiter(**settings)
+
+
+def stub_github(responses: List[Callable[[], httpx.Response]]):
+    """MockTransport answering with the given responses in order, recording what it sent"""
+    sent: List[httpx.Response] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        response = responses[min(len(sent), len(responses) - 1)]()
+        sent.append(response)
+        return response
+
+    return httpx.MockTransport(handler), sent
+
+
+async def get(transport: httpx.MockTransport, limiter: GitHubRateLimiter, url: str = API_URL) -> httpx.Response:
+    async with create_github_client(rate_limiter=limiter, transport=transport) as client:
+        return await client.get(url)
+
+
+def test_retries_429_after_retry_after():
+    transport, sent = stub_github([
+        lambda: httpx.Response(429, headers={"Retry-After": "0.2"}),
+        lambda: httpx.Response(200, json={"ok": True})
+    ])
+    limiter = make_limiter()
+
+    started = time.monotonic()
+    response = asyncio.run(get(transport, limiter))
+
+    assert response.status_code == 200
+    assert len(sent) == 2
+    assert time.monotonic() - started >= 0.2
+    assert limiter.retries == 1
+    assert limiter.rate_limited_responses == 1
+    # The dropped 429 released its connection
+    assert sent[0].is_closed
+
+
+def test_retries_secondary_rate_limit_403():
+    transport, sent = stub_github([
+        lambda: httpx.Response(403, headers={"Retry-After": "0"},
+                               json={"message": "You have exceeded a secondary rate limit"}),
+        lambda: httpx.Response(200, json={"ok": True})
+    ])
+    limiter = make_limiter()
+
+    response = asyncio.run(get(transport, limiter))
+
+    assert response.status_code == 200
+    assert len(sent) == 2
+    assert sent[0].is_closed
+
+
+def test_plain_403_is_returned_without_retry():
+    transport, sent = stub_github([
+        lambda: httpx.Response(403, json={"message": "Resource not accessible by integration"})
+    ])
+    limiter = make_limiter()
+
+    response = asyncio.run(get(transport, limiter))
+
+    assert response.status_code == 403
+    assert len(sent) == 1
+    assert limiter.retries == 0
+
+
+def test_gives_up_after_max_retries():
+    transport, sent = stub_github([lambda: httpx.Response(429, headers={"Retry-After": "0"})])
+    limiter = make_limiter(max_retries=2)
+
+    with pytest.raises(GitHubRateLimitError):
+        asyncio.run(get(transport, limiter))
+
+    assert len(sent) == 3
+    assert all(response.is_closed for response in sent)
+
+
+def test_retry_after_beyond_max_wait_fails_fast():
+    transport, sent = stub_github([lambda: httpx.Response(429, headers={"Retry-After": "600"})])
+    limiter = make_limiter(max_wait=1.0)
+
+    with pytest.raises(GitHubRateLimitError) as error:
+        asyncio.run(get(transport, limiter))
+
+    assert error.value.retry_after == 600
+    assert len(sent) == 1
+    assert sent[0].is_closed
+
+
+def test_token_bucket_paces_bursts():
+    transport, sent = stub_github([lambda: httpx.Response(200, json={})])
+    limiter = make_limiter(rate=20.0, burst=2)
+
+    async def burst():
+        async with create_github_client(rate_limiter=limiter, transport=transport) as client:
+            await asyncio.gather(*[client.get(API_URL) for _ in range(6)])
+
+    started = time.monotonic()
+    asyncio.run(burst())
+    elapsed = time.monotonic() - started
+
+    # Two requests use the burst, the other four wait 1/20s each
+    assert len(sent) == 6
+    assert elapsed >= 0.19
+    assert limiter.throttled >= 4
+    assert limiter.max_queue_depth >= 4
+
+
+def test_low_quota_spreads_remaining_calls():
+    reset = time.time() + 1.0
+    transport, sent = stub_github([lambda: httpx.Response(200, json={}, headers={
+        "X-RateLimit-Remaining": "4",
+        "X-RateLimit-Reset": str(reset),
+        "X-RateLimit-Resource": "core"
+    })])
+    limiter = make_limiter(low_watermark=10)
+
+    async def two_calls():
+        async with create_github_client(rate_limiter=limiter, transport=transport) as client:
+            await client.get(API_URL)
+            started = time.monotonic()
+            await client.get(API_URL)
+            return time.monotonic() - started
+
+    waited = asyncio.run(two_calls())
+
+    # 4 calls left for about a second: the second call waits about a quarter of it
+    assert waited >= 0.15
+    assert limiter.stats()["quota"]["core"]["remaining"] == 4
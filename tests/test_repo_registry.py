@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from services import repo_registry as registry_module
+from services.github_service import parse_github_url
+from services.repo_registry import RepoRegistry
+
+
+class FakeAnalyzer:
+    """Stands in for CodebaseAnalyzer: records warm-up and close"""
+
+    def __init__(self, codebase_path):
+        self.codebase_path = codebase_path
+        self.index = self.symbols = None
+        self.warmed = False
+        self.closed = False
+
+    def warm(self):
+        self.warmed = True
+
+    def loaded_index_paths(self):
+        return []
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setenv("CODEBASE_INDEX_REFRESH_SECONDS", "0")
+    monkeypatch.setattr(registry_module, "CodebaseAnalyzer", FakeAnalyzer)
+    return RepoRegistry(repos={"octo/a": "/src/a", "octo/b": "/src/b"}, default_path="/src/default",
+                        max_repos=1)
+
+
+def test_lease_warms_indexes_before_handing_out(registry):
+    async def scenario():
+        async with registry.lease("octo", "a") as analyzer:
+            return analyzer
+
+    analyzer = asyncio.run(scenario())
+    assert analyzer.warmed and not analyzer.closed
+
+
+def test_evicted_analyzer_closes_after_its_last_lease(registry):
+    async def scenario():
+        async with registry.lease("octo", "a") as first:
+            async with registry.lease("octo", "b") as second:
+                # Over max_repos: a is evicted but still leased
+                assert registry.peek("/src/a") is None
+                assert not first.closed
+            assert not second.closed
+        assert first.closed
+
+        async with registry.lease("octo", "a") as reloaded:
+            assert reloaded is not first
+        # b was evicted without leases and closed at once
+        assert second.closed
+        return registry.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["evictions"] == 2
+    assert stats["loads"] == 3
+
+
+def test_memory_estimate_is_cached_at_load(registry, monkeypatch):
+    estimates = []
+    monkeypatch.setattr(registry_module, "estimate_index_bytes", lambda paths: estimates.append(paths) or 4096)
+
+    async def scenario():
+        for _ in range(5):
+            async with registry.lease("octo", "a"):
+                assert registry.memory_bytes() == 4096
+
+    asyncio.run(scenario())
+    assert registry.loads == 1
+    assert len(estimates) == 1
+
+
+def test_resolve_rejects_paths_outside_the_repos_root(tmp_path):
+    root = tmp_path / "repos"
+    (root / "octo" / "demo").mkdir(parents=True)
+    (tmp_path / "secrets").mkdir()
+    (root / "octo" / "escape").symlink_to(tmp_path / "secrets")
+    registry = RepoRegistry(root=str(root), default_path="/src/default")
+
+    assert registry.resolve("octo", "demo") == str(root / "octo" / "demo")
+    # A link out of the root falls back to the default checkout
+    assert registry.resolve("octo", "escape") == "/src/default"
+    for owner, repo in (("..", ".."), ("octo", ".."), ("..", "secrets"), ("octo", "demo/../..")):
+        with pytest.raises(ValueError):
+            registry.resolve(owner, repo)
+
+
+@pytest.mark.parametrize("url", [
+    "https://github.com/../../issues/1",
+    "https://github.com/octo/../issues/1",
+    "https://github.com/./demo/issues/1",
+    "https://github.com/oc%2Fto/demo/issues/1",
+])
+def test_parse_github_url_rejects_invalid_names(url):
+    with pytest.raises(ValueError):
+        parse_github_url(url)
+
+
+def test_only_resident_or_configured_repos_preload(registry):
+    assert registry.preloadable("octo", "a")
+    assert not registry.preloadable("octo", "unknown")
+    assert not registry.preloadable("..", "..")
+
+    async def scenario():
+        async with registry.lease("octo", "unknown"):
+            # Unknown repos use the default checkout, which is now resident
+            assert registry.preloadable("octo", "unknown")
+
+    asyncio.run(scenario())
+
+
+def test_load_outliving_its_caller_still_enforces_bounds(registry):
+    async def scenario():
+        async with registry.lease("octo", "a"):
+            pass
+        # The caller is cancelled while the shielded load of b runs on
+        task = asyncio.create_task(registry.lease("octo", "b").__aenter__())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        while registry.loads < 2:
+            await asyncio.sleep(0.01)
+        return registry.stats()
+
+    stats = asyncio.run(scenario())
+    assert list(stats["resident"]) == ["/src/b"]
+    assert stats["evictions"] == 1
@@ -0,0 +1,24 @@
+from services.codebase_index import CodebaseIndex, scan_file
+from services.snippets import SnippetExtractor
+
+
+class WordCounter:
+    """Token counter stub: one token per whitespace-separated word"""
+
+    def count(self, text):
+        return len(text.split())
+
+
+def test_snippets_use_shared_query_expansion_and_token_counter(tmp_path):
+    source = "\n".join(f"value_{i} = {i}" for i in range(30)) + "\ndef process_response(response):\n    return response\n"
+    (tmp_path / "handler.py").write_text(source)
+    index = CodebaseIndex.from_scans(str(tmp_path), [scan_file(str(tmp_path), "handler.py")])
+    extractor = SnippetExtractor(str(tmp_path), index, context_lines=1, counter=WordCounter())
+
+    # "respon" is a prefix of the indexed terms, as in BM25 ranking
+    result = extractor.extract(["handler.py"], ["respon"], token_budget=100)
+
+    assert [(snippet["start_line"], snippet["end_line"]) for snippet in result["snippets"]] == [(30, 32)]
+    snippet = result["snippets"][0]
+    assert snippet["tokens"] == len(snippet["text"].split())
+    assert result["tokens"] == snippet["tokens"]
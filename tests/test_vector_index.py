@@ -0,0 +1,20 @@
+import pytest
+
+from services.vector_index import NUMPY_AVAILABLE, HashingEmbedder, best_label
+from services.codebase_analyzer import CodebaseAnalyzer
+
+pytestmark = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="NumPy is not installed")
+
+DEFAULT_DOMAIN_MIN_SIMILARITY = 0.12
+
+
+@pytest.mark.parametrize("text, domain", [
+    ("Agent hangs forever when calling do_async inside the FastAPI event loop", "async_concurrency"),
+    ("Pickle deserialization allows RCE through the server safety policy", "security"),
+    ("Child processes are not terminated when ServerManager shuts down", "process_management"),
+    ("Typo in README installation section", None),
+    ("Feature request: support for multiple languages", None),
+])
+def test_best_label_needs_minimum_similarity(text, domain):
+    label = best_label(HashingEmbedder(512), text, CodebaseAnalyzer.TECHNICAL_DOMAINS, DEFAULT_DOMAIN_MIN_SIMILARITY)
+    assert label == domain